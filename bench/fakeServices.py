@@ -0,0 +1,180 @@
+import asyncio
+import json
+import re
+import socket
+import threading
+import uuid
+from datetime import datetime
+from aiohttp import web
+
+# Local stand-ins for the OpenAI chat completions API and the Vapi call API,
+# served by aiohttp on their own event loop in a background thread so they
+# don't compete with the app under test for its loop.
+#
+# The fake OpenAI recognises each of the app's prompts by a phrase in it and
+# answers with a small valid response of the right shape.
+
+GRAPHS = [
+    {"title": "My daily steps", "description": "Steps I walk each day", "type": "line", "settings": {}},
+    {"title": "Gym sessions", "description": "Days I went to the gym", "type": "contribution", "settings": {"totalCells": 30}},
+    {"title": "Pages read", "description": "Pages of my book I read", "type": "bar", "settings": {"timeFrame": "week"}},
+]
+PROFILE = {
+    "UserInfo": {"Name": "Sam", "Age": "29"},
+    "Work": {"Job": "Nurse", "Shifts": "Mostly nights"},
+    "FriendsAndFamily": {"Jess": {"Description": "Sam's sister, lives in Brisbane"}},
+}
+PROFILE_PATCH = {"Work": {"Shifts": "Switching to days next month"}}
+
+
+def _callTime(prompt: str):
+    # every next-call prompt includes the call time in the format it wants back
+    match = re.search(r"(\w+day, \w+ \d{1,2}, \d{4} \d{1,2}:\d{2}:\d{2} [AP]M)", prompt)
+    return match.group(1) if match else None
+
+
+def _graphEntries(prompt: str) -> dict:
+    today = datetime.now().strftime("%d/%m/%Y")
+    graphIds = dict.fromkeys(re.findall(r"'id': '([0-9a-f-]{36})'", prompt))
+    return {graphId: [{"date": today, "value": 1000 + index}] for index, graphId in enumerate(graphIds)}
+
+
+def answer(prompt: str) -> str:
+    """
+    The fake completion for one of the app's prompts.
+    """
+    if "return one object with exactly these keys" in prompt:
+        if '"graphEntries"' in prompt:
+            result = {"graphEntries": _graphEntries(prompt), "profilePatch": PROFILE_PATCH, "nextCall": _callTime(prompt)}
+        else:
+            result = {"graphs": GRAPHS, "profile": PROFILE, "nextCall": _callTime(prompt)}
+        return json.dumps(result)
+    if "represent graphs" in prompt:
+        return json.dumps(GRAPHS)
+    if "next entry into each of the graphs" in prompt:
+        return json.dumps(_graphEntries(prompt))
+    if "JSON merge patch" in prompt:
+        return json.dumps(PROFILE_PATCH)
+    if "Create an object that represents the user" in prompt:
+        return json.dumps(PROFILE)
+    if "time that the user wants to have the call next" in prompt:
+        return _callTime(prompt) or "null"
+    return "{}"
+
+
+def _usage(prompt: str, content: str) -> dict:
+    promptTokens, completionTokens = len(prompt) // 4, len(content) // 4
+    return {"prompt_tokens": promptTokens, "completion_tokens": completionTokens,
+            "total_tokens": promptTokens + completionTokens}
+
+
+def createOpenAIApp(latency: float = 1.0, chunkSize: int = 16) -> web.Application:
+    """
+    Non-streamed requests answer after `latency` seconds, streamed ones
+    spread their chunks evenly over the same time.
+    """
+    async def completions(request: web.Request):
+        body = await request.json()
+        prompt = body["messages"][0]["content"]
+        content = answer(prompt)
+        usage = _usage(prompt, content)
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return web.json_response({
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunks = [content[start:start + chunkSize] for start in range(0, len(content), chunkSize)]
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            data = {"choices": [{"index": 0, "delta": {"content": chunk}}]}
+            await response.write(f"data: {json.dumps(data)}\n\n".encode())
+        if body.get("stream_options", {}).get("include_usage"):
+            await response.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+
+def createVapiApp(latency: float = 0.2) -> web.Application:
+    async def createCall(request: web.Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        request.app["calls"] += 1
+        return web.json_response({
+            "id": str(uuid.uuid4()),
+            "status": "scheduled" if "schedulePlan" in body else "queued",
+            "customer": body.get("customer"),
+            "transport": {"callSid": f"CA{uuid.uuid4().hex}"},
+        }, status=201)
+
+    app = web.Application()
+    app["calls"] = 0
+    app.router.add_post("/call/phone", createCall)
+    return app
+
+
+class FakeServices:
+    """
+    Runs the fake OpenAI and Vapi servers on free local ports.
+    `openaiUrl` / `vapiUrl` are set once `start()` returns.
+    """
+
+    def __init__(self, openaiLatency: float = 1.0, vapiLatency: float = 0.2):
+        self.openaiLatency = openaiLatency
+        self.vapiLatency = vapiLatency
+        self.openaiUrl = None
+        self.vapiUrl = None
+        self.vapiApp = None
+        self._loop = None
+        self._runners = []
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-services", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(self._cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _serve(self):
+        self.vapiApp = createVapiApp(self.vapiLatency)
+        self.openaiUrl = await self._listen(createOpenAIApp(self.openaiLatency)) + "/v1"
+        self.vapiUrl = await self._listen(self.vapiApp)
+
+    async def _listen(self, app: web.Application) -> str:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        await web.SockSite(runner, sock).start()
+        self._runners.append(runner)
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+    async def _cleanup(self):
+        for runner in self._runners:
+            await runner.cleanup()
@@ -0,0 +1,249 @@
+import copy
+import re
+import threading
+import time
+import uuid
+
+# In-process stand-in for the supabase-py client, covering the part of the
+# query builder the app uses: select (with embedded one-to-many resources
+# like "graph_data(data)"), insert, upsert, update, delete, eq, in_, lt and
+# the merge_user_data and save_graph_entries RPCs. Every execute() sleeps for `latency` seconds,
+# blocking like the real synchronous client does.
+
+PRIMARY_KEYS = {"webhook_events": "key"}
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.values = None
+        self.filters = []
+
+    def select(self, columns: str = "*"):
+        self.action, self.columns = "select", columns
+        return self
+
+    def insert(self, rows):
+        self.action, self.values = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = None, ignore_duplicates: bool = False):
+        self.action, self.values = "upsert", rows
+        self.conflictColumns = on_conflict.split(",") if on_conflict else ["id"]
+        self.ignoreDuplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict):
+        self.action, self.values = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values: list):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def lt(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) < value)
+        return self
+
+    def execute(self) -> FakeResponse:
+        self.client.sleep()
+        with self.client.lock:
+            return FakeResponse(getattr(self, "_" + self.action)())
+
+    # ---------- Actions ----------
+
+    def _matching(self) -> list:
+        return [row for row in self.client.rows(self.table) if all(f(row) for f in self.filters)]
+
+    def _select(self) -> list:
+        return [self.client.project(self.table, row, self.columns) for row in self._matching()]
+
+    def _insert(self) -> list:
+        rows = self.values if isinstance(self.values, list) else [self.values]
+        key = PRIMARY_KEYS.get(self.table, "id")
+        existing = {row.get(key) for row in self.client.rows(self.table)}
+        inserted = []
+        for row in rows:
+            row = copy.deepcopy(row)
+            if key == "id":
+                row.setdefault("id", str(uuid.uuid4()))
+            if row[key] in existing:
+                raise Exception(f"duplicate key value violates unique constraint (23505) on {self.table}.{key}")
+            existing.add(row[key])
+            row.setdefault("created_at", time.strftime("%Y-%m-%dT%H:%M:%S"))
+            inserted.append(row)
+        self.client.rows(self.table).extend(inserted)
+        return copy.deepcopy(inserted)
+
+    def _upsert(self) -> list:
+        rows = self.values if isinstance(self.values, list) else [self.values]
+        stored = self.client.rows(self.table)
+        result = []
+        columns = self.conflictColumns
+        for row in rows:
+            match = next((
+                current for current in stored
+                if all(row.get(column) is not None and current.get(column) == row[column] for column in columns)
+            ), None)
+            if match:
+                if self.ignoreDuplicates:
+                    continue
+                match.update(copy.deepcopy(row))
+                result.append(copy.deepcopy(match))
+            else:
+                self.values = [row]
+                result.extend(self._insert())
+        return result
+
+    def _update(self) -> list:
+        updated = []
+        for row in self._matching():
+            row.update(copy.deepcopy(self.values))
+            updated.append(copy.deepcopy(row))
+        return updated
+
+    def _delete(self) -> list:
+        deleted = self._matching()
+        deletedIds = {id(row) for row in deleted}
+        self.client.tables[self.table] = [row for row in self.client.rows(self.table) if id(row) not in deletedIds]
+        return copy.deepcopy(deleted)
+
+
+class FakeRpc:
+
+    def __init__(self, client, name: str, params: dict):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        self.client.sleep()
+        handler = getattr(self, "_" + self.name, None)
+        if handler is None:
+            raise Exception(f"Unknown rpc {self.name}")
+        with self.client.lock:
+            return FakeResponse(handler(**self.params))
+
+    def _merge_user_data(self, p_phone_number: str, p_patch: dict):
+        for row in self.client.rows("user_data"):
+            if row["phone_number"] == p_phone_number:
+                row["userdata"] = _mergePatch(row.get("userdata") or {}, p_patch)
+                return copy.deepcopy(row["userdata"])
+        return None
+
+    def _save_graph_entries(self, p_entries: list, p_graph_data: dict):
+        # same effect as migrations/007_save_graph_entries.sql
+        entries = self.client.rows("graph_entries")
+        for entry in p_entries or []:
+            match = next((
+                row for row in entries
+                if row["graph_id"] == entry["graph_id"] and row["entry_date"] == entry["entry_date"]
+            ), None)
+            if match:
+                match["value"] = entry["value"]
+            else:
+                entries.append({
+                    **copy.deepcopy(entry),
+                    "id": str(uuid.uuid4()),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                })
+        for row in self.client.rows("graph_data"):
+            changed = (p_graph_data or {}).get(row["graph_id"])
+            for column in ("rollups", "stats"):
+                if changed and column in changed:
+                    row[column] = copy.deepcopy(changed[column])
+        return len(p_entries or [])
+
+
+class FakeSupabase:
+    """
+    Tables are plain lists of dicts. `latency` is the simulated round trip
+    per request in seconds.
+    """
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.tables = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def sleep(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def rows(self, table: str) -> list:
+        return self.tables.setdefault(table, [])
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: dict) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def project(self, table: str, row: dict, columns: str) -> dict:
+        """
+        Applies a PostgREST select string to one row, resolving embedded
+        resources through their "<table singular>_id" foreign key.
+        """
+        result = {}
+        for column in _splitColumns(columns):
+            embedded = re.match(r"(\w+)\((.*)\)$", column)
+            if embedded:
+                child, childColumns = embedded.groups()
+                foreignKey = table.rstrip("s") + "_id"
+                result[child] = [
+                    self.project(child, childRow, childColumns)
+                    for childRow in self.rows(child) if childRow.get(foreignKey) == row.get("id")
+                ]
+            elif column == "*":
+                result.update(copy.deepcopy(row))
+            else:
+                result[column] = copy.deepcopy(row.get(column))
+        return result
+
+
+def _mergePatch(target, patch):
+    # same semantics as jsonb_merge_patch in migrations/003_merge_user_data.sql
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = _mergePatch(result.get(key), value)
+    return result
+
+
+def _splitColumns(columns: str) -> list:
+    parts, depth, current = [], 0, ""
+    for char in columns:
+        if char == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import types
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Load driver for /webhook, /onboarding and /task against local fakes.
+#
+#   python -m bench.run --requests 200 --concurrency 20 --save bench/baseline.json
+#   python -m bench.run --requests 200 --concurrency 20 --baseline bench/baseline.json
+#
+# Starts the fake OpenAI and Vapi servers, swaps the Supabase client for
+# the in-process fake, serves the real app with uvicorn and replays the
+# fixtures in bench/fixtures/requests.jsonl. For each scenario it reports
+# HTTP latency percentiles and requests/sec, and for end-of-call reports
+# the time until the background job finished as well.
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench.fakeServices import FakeServices, GRAPHS, PROFILE
+from bench.fakeSupabase import FakeSupabase
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "requests.jsonl"
+COMPARED = ("p50", "p95", "p99")
+
+
+def loadFixtures(path: Path = FIXTURES) -> dict:
+    fixtures = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                fixture = json.loads(line)
+                fixtures[fixture["name"]] = fixture
+    return fixtures
+
+
+def percentiles(samples: list) -> dict:
+    if not samples:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "avg": sum(ordered) / len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+# ---------- Seeding ----------
+
+class Seeder:
+    """
+    Writes rows straight into the fake tables (no simulated latency) so
+    every request gets its own user, call and session rows.
+    """
+
+    def __init__(self, db: FakeSupabase, historyDays: int):
+        self.db = db
+        self.historyDays = historyDays
+        self.counter = 0
+
+    def _phone(self) -> str:
+        self.counter += 1
+        return f"+6140{self.counter:07d}"
+
+    def user(self, kind: str) -> dict:
+        phone = self._phone()
+        values = {"phone": phone, "userId": None}
+        if kind == "none":
+            return values
+
+        userId = str(uuid.uuid4())
+        row = {"id": str(uuid.uuid4()), "phone_number": phone, "user_id": userId,
+               "userdata": PROFILE if kind == "existing" else {}}
+        self.db.rows("user_data").append(row)
+        values["userId"] = userId
+
+        if kind == "existing":
+            today = datetime.now()
+            for graph in GRAPHS:
+                graphId = str(uuid.uuid4())
+                self.db.rows("graphs").append({"id": graphId, "user_data_id": row["id"], **graph})
+                self.db.rows("graph_data").append({"graph_id": graphId, "data": [], "rollups": None})
+                for day in range(self.historyDays, 0, -1):
+                    self.db.rows("graph_entries").append({
+                        "graph_id": graphId,
+                        "entry_date": (today - timedelta(days=day)).strftime("%Y-%m-%d"),
+                        "value": float(day % 7),
+                        "created_at": today.isoformat(),
+                    })
+        return values
+
+    def request(self, fixture: dict) -> dict:
+        seed = fixture.get("seed", {})
+        values = self.user(seed.get("user", "none"))
+        values["callId"] = str(uuid.uuid4())
+        values["callSid"] = f"CA{uuid.uuid4().hex}"
+        values["startedAt"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+        if seed.get("call"):
+            self.db.rows("calls").append({"id": values["callId"], "call_type": seed["call"]})
+        if seed.get("session"):
+            self.db.rows("onboarding_sessions").append({
+                "phone_number": values["phone"], "status": "pending", "call_sid": values["callSid"], "user_id": None,
+            })
+
+        text = json.dumps(fixture["body"])
+        for name, value in values.items():
+            text = text.replace("{{" + name + "}}", value or "")
+        return json.loads(text)
+
+
+# ---------- Driver ----------
+
+async def runScenario(session, baseUrl: str, app, db: FakeSupabase, seeder: Seeder,
+                      fixture: dict, requests: int, concurrency: int) -> dict:
+    bodies = [seeder.request(fixture) for _ in range(requests)]
+    latencies, statuses, jobs = [], {}, []
+    dbBefore = db.requests
+    endOfCall = fixture["path"] == "/webhook" and fixture["body"]["message"]["type"] == "end-of-call-report"
+
+    async def send(body: dict):
+        startedAt = time.perf_counter()
+        async with session.request(fixture["method"], baseUrl + fixture["path"], json=body) as response:
+            await response.read()
+            status = response.status
+        latencies.append(time.perf_counter() - startedAt)
+        statuses[status] = statuses.get(status, 0) + 1
+        if endOfCall:
+            job = app.inFlightEvents.get(app.eventKey(body))
+            if job:
+                jobs.append(job)
+
+    async def worker(queue: list):
+        while queue:
+            await send(queue.pop())
+
+    queue = list(reversed(bodies))
+    startedAt = time.perf_counter()
+    await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+    httpSeconds = time.perf_counter() - startedAt
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "rps": requests / httpSeconds,
+        "latency": percentiles(latencies),
+        "supabasePerRequest": None,
+        "processing": None,
+    }
+
+    if jobs:
+        await asyncio.gather(*(job.wait() for job in jobs))
+        totalSeconds = time.perf_counter() - startedAt
+        result["processing"] = {
+            **percentiles([job.finishedAt - job.enqueuedAt for job in jobs]),
+            "failed": sum(1 for job in jobs if job.status != "succeeded"),
+            "jobsPerSecond": len(jobs) / totalSeconds,
+        }
+    result["supabasePerRequest"] = (db.requests - dbBefore) / requests
+    return result
+
+
+def freePort() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def runAll(args, app, db: FakeSupabase) -> dict:
+    import aiohttp
+    import uvicorn
+
+    port = freePort()
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    fixtures = loadFixtures(Path(args.fixtures))
+    names = args.scenarios.split(",") if args.scenarios else list(fixtures)
+    seeder = Seeder(db, args.history_days)
+    results = {}
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for name in names:
+                print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...", file=sys.stderr)
+                results[name] = await runScenario(
+                    session, f"http://127.0.0.1:{port}", app, db, seeder,
+                    fixtures[name], args.requests, args.concurrency,
+                )
+    finally:
+        server.should_exit = True
+        await serving
+    return results
+
+
+# ---------- Reporting ----------
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def report(results: dict, baseline: dict = None) -> str:
+    lines = [f"{'scenario':<28} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'job p50':>9} {'job p95':>9} {'db/req':>7}"]
+    for name, result in results.items():
+        processing = result["processing"] or {}
+        lines.append(
+            f"{name:<28} {result['rps']:>8.1f} {_ms(result['latency']['p50']):>9} {_ms(result['latency']['p95']):>9}"
+            f" {_ms(result['latency']['p99']):>9} {_ms(processing.get('p50')):>9} {_ms(processing.get('p95')):>9}"
+            f" {result['supabasePerRequest']:>7.1f}"
+        )
+        if set(result["statuses"]) != {200}:
+            lines.append(f"{'':<28} statuses {result['statuses']}")
+
+    if baseline:
+        lines.append("")
+        lines.append("Change against baseline (negative latency / positive rps is better):")
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            changes = [f"rps {_change(before['rps'], result['rps'])}"]
+            changes += [f"{key} {_change(before['latency'][key], result['latency'][key])}" for key in COMPARED]
+            if result["processing"] and before.get("processing"):
+                changes += [f"job {key} {_change(before['processing'][key], result['processing'][key])}" for key in COMPARED]
+            lines.append(f"{name:<28} " + "  ".join(changes))
+    return "\n".join(lines)
+
+
+def _change(before, after) -> str:
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the webhook, onboarding and task endpoints against local fakes")
+    parser.add_argument("--scenarios", help="Comma separated fixture names (default: all)")
+    parser.add_argument("--fixtures", default=str(FIXTURES))
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--supabase-latency", type=float, default=0.02, help="Seconds per Supabase request")
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="Seconds per OpenAI completion")
+    parser.add_argument("--vapi-latency", type=float, default=0.2, help="Seconds per Vapi request")
+    parser.add_argument("--history-days", type=int, default=60, help="Days of points per seeded graph")
+    parser.add_argument("--save", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --save")
+    args = parser.parse_args()
+
+    services = FakeServices(openaiLatency=args.openai_latency, vapiLatency=args.vapi_latency)
+    services.start()
+
+    # Everything the app reads at import time has to be in place before it's imported
+    os.environ["OPENAI_BASE_URL"] = services.openaiUrl
+    os.environ["VAPI_BASE_URL"] = services.vapiUrl
+    os.environ.setdefault("SERVER_URL", "http://bench.local")
+    os.environ.setdefault("VAPI_AU_PHONE_ID", "bench-phone-id")
+    os.environ.setdefault("MY_OPENAI_KEY", "bench")
+    os.environ.setdefault("VAPI_API_KEY", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("JOB_MAX_RETRIES", "0")
+    os.environ.setdefault("IDEMPOTENCY_STORE", "memory")
+
+    from metrics import instrumentClient
+    db = FakeSupabase(latency=args.supabase_latency)
+    fakeClient = types.ModuleType("supabaseClient")
+    fakeClient.supabase = instrumentClient(db)
+    sys.modules["supabaseClient"] = fakeClient
+    import main as app
+
+    try:
+        results = asyncio.run(runAll(args, app, db))
+    finally:
+        services.stop()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print(report(results, baseline))
+
+    if args.save:
+        settings = {key: value for key, value in vars(args).items() if key not in ("save", "baseline")}
+        with open(args.save, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
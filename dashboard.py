@@ -0,0 +1,126 @@
+import hashlib
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+from graphSeries import GraphSeries, fillMode, toEpochDay
+from rollups import periodRange
+
+# Read-side helpers for the dashboard endpoints: range slicing,
+# downsampling, pagination and ETag handling.
+#
+# Points older than GRAPH_COMPACT_AFTER_DAYS may only survive in the graph's
+# rollups, so week/month/year buckets holding more points than the raw series
+# are served from the rollups and only the rest is downsampled from raw points.
+
+RESOLUTIONS = ("raw", "day", "week", "month", "year")
+DEFAULT_AGGREGATION = {"line": "mean"}  # everything else is summed
+MAX_PAGE_SIZE = 5000
+
+
+def parseQueryDate(value: str, name: str):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(400, f"`{name}` must be a date in YYYY-MM-DD format")
+
+
+def graphPoints(graph: dict, start=None, end=None, resolution: str = "raw", how: str = None, fill: bool = False) -> list:
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(400, f"`resolution` must be one of {', '.join(RESOLUTIONS)}")
+    # points that can't be parsed are left out
+    series = GraphSeries.fromPoints(graph['data'])
+    if fill:
+        if resolution != "raw":
+            raise HTTPException(400, "`fill` only works with `resolution=raw`")
+        # missed days up to `to` (default today) filled in by the graph's fill mode
+        return series.fillGaps(start, end, fillMode(graph))
+    inRange = series.slice(start, end)
+    if resolution == "raw":
+        return inRange.toPoints()
+    how = how or DEFAULT_AGGREGATION.get(graph['type'], "sum")
+    try:
+        points = inRange.downsample(resolution, how)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    archived = _archivedBuckets(graph, series, resolution)
+    if not archived:
+        return points
+    return _mergeArchived(points, archived, resolution, how, start, end)
+
+
+def _archivedBuckets(graph: dict, series: GraphSeries, resolution: str) -> dict:
+    # buckets whose rollup counts points the raw series no longer has
+    buckets = (graph.get('rollups') or {}).get(resolution) or {}
+    if not buckets:
+        return {}
+    rawCounts = {point['period']: point['count'] for point in series.downsample(resolution, "count")}
+    return {
+        key: bucket for key, bucket in buckets.items()
+        if bucket and bucket.get('count', 0) > rawCounts.get(key, 0)
+    }
+
+
+def _mergeArchived(points: list, archived: dict, resolution: str, how: str, start, end) -> list:
+    """
+    Replaces the raw points for archived buckets with the rollup's
+    aggregate, and adds archived buckets that overlap `start`..`end` but
+    have no raw points left. An archived bucket is served whole even when
+    the range only covers part of it.
+    """
+    startDay = None if start is None else toEpochDay(start)
+    endDay = None if end is None else toEpochDay(end)
+    merged = [(toEpochDay(point['date']), point) for point in points if point['period'] not in archived]
+    for key, bucket in archived.items():
+        try:
+            first, last = periodRange(key, resolution)
+        except ValueError:
+            continue
+        firstDay, lastDay = toEpochDay(first), toEpochDay(last)
+        if (endDay is not None and firstDay > endDay) or (startDay is not None and lastDay < startDay):
+            continue
+        value = bucket['count'] if how == "count" else bucket.get(how)
+        merged.append((firstDay, {
+            "period": key,
+            "date": first.strftime("%d/%m/%Y"),
+            "value": value if how == "count" or value is None else float(value),
+            "count": bucket['count'],
+        }))
+    merged.sort(key=lambda point: point[0])
+    return [point for _, point in merged]
+
+
+def paginate(points: list, limit: int, offset: int) -> dict:
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise HTTPException(400, f"`limit` must be between 1 and {MAX_PAGE_SIZE}")
+    if offset < 0:
+        raise HTTPException(400, "`offset` can't be negative")
+    page = points[offset:offset + limit]
+    nextOffset = offset + limit if offset + limit < len(points) else None
+    return {"points": page, "total": len(points), "offset": offset, "limit": limit, "nextOffset": nextOffset}
+
+
+def etagFor(body) -> str:
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(canonical.encode()).hexdigest()[:32] + '"'
+
+
+def _matches(ifNoneMatch: str, etag: str) -> bool:
+    if not ifNoneMatch:
+        return False
+    tags = [tag.strip() for tag in ifNoneMatch.split(",")]
+    return "*" in tags or etag in tags
+
+
+def cachedJSON(body, ifNoneMatch: str = None) -> Response:
+    """
+    Responds with `body` and a strong ETag, or 304 Not Modified if the
+    client already has this exact version.
+    """
+    etag = etagFor(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches(ifNoneMatch, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
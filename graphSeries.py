@@ -0,0 +1,330 @@
+from datetime import date, datetime
+import numpy as np
+from rollups import bucketKey
+
+# Columnar form of a graph's points. The JSON shape used everywhere else
+# ([{"date": "dd/mm/yyyy", "value": n}, ...]) is parsed once into an int32
+# array of days since 1970-01-01 and a float64 array of values, after which
+# range slicing is a binary search and sums, means, rolling windows and
+# downsampling are vectorised instead of walking dicts.
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+AGGREGATIONS = ("sum", "mean", "min", "max", "count")
+
+# Only real observations are stored, missed days are filled in when read:
+# "zero" for graphs that count something per day, "carry" repeats the last
+# value before the gap, "null" leaves the day empty. A graph's settings can
+# override its type's default with {"fill": mode}.
+FILL_MODES = ("zero", "carry", "null")
+FILL_BY_TYPE = {"contribution": "zero", "bar": "zero", "line": "carry"}
+# Longest window that gets filled, so an open ended range can't blow up
+MAX_FILL_DAYS = 3660
+
+
+def toEpochDay(value) -> int:
+    """
+    Days since 1970-01-01 for a "dd/mm/yyyy" string, date, datetime or an
+    epoch day already. Raises ValueError for anything else.
+    """
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.toordinal() - EPOCH_ORDINAL
+    try:
+        day, month, year = value.split("/")
+        return date(int(year), int(month), int(day)).toordinal() - EPOCH_ORDINAL
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"Invalid graph date {value!r}, expected dd/mm/yyyy")
+
+
+def fromEpochDay(day: int) -> str:
+    return date.fromordinal(int(day) + EPOCH_ORDINAL).strftime("%d/%m/%Y")
+
+
+def fillMode(graph: dict) -> str:
+    mode = (graph.get('settings') or {}).get('fill')
+    return mode if mode in FILL_MODES else FILL_BY_TYPE.get(graph.get('type'), "null")
+
+
+def todayEpochDay() -> int:
+    return date.today().toordinal() - EPOCH_ORDINAL
+
+
+def _formatDays(days: np.ndarray) -> list:
+    # "YYYY-MM-DD" from numpy, rearranged, is much cheaper than strftime per point
+    return [f"{iso[8:10]}/{iso[5:7]}/{iso[0:4]}" for iso in np.datetime_as_string(days.astype("datetime64[D]")).tolist()]
+
+
+class GraphSeries:
+    """
+    A graph's points as parallel arrays. `append` is amortised O(1) (the
+    arrays double when full). `integral` remembers which values were ints
+    in the JSON, so `toPoints` gives back exactly what `fromPoints` read
+    for zero-padded dates and numeric values.
+    Points keep their insertion order; operations that need date order
+    (`slice`, `rolling`, `downsample`) sort a copy first if appends came
+    in out of order.
+    """
+
+    __slots__ = ("_days", "_values", "_integral", "_size", "_sorted")
+
+    def __init__(self, capacity: int = 16):
+        capacity = max(capacity, 1)
+        self._days = np.empty(capacity, dtype=np.int32)
+        self._values = np.empty(capacity, dtype=np.float64)
+        self._integral = np.empty(capacity, dtype=bool)
+        self._size = 0
+        self._sorted = True
+
+    @classmethod
+    def fromPoints(cls, points: list, skipInvalid: bool = True) -> "GraphSeries":
+        """
+        Builds a series from [{"date": "dd/mm/yyyy", "value": n}, ...].
+        Points without a valid date or numeric value are skipped, or raise
+        ValueError if `skipInvalid` is False.
+        """
+        series = cls(len(points) or 1)
+        for point in points:
+            try:
+                series.append(point['date'], point['value'])
+            except (KeyError, TypeError, ValueError):
+                if not skipInvalid:
+                    raise ValueError(f"Invalid graph point {point!r}")
+        return series
+
+    @classmethod
+    def _fromArrays(cls, days: np.ndarray, values: np.ndarray, integral: np.ndarray, isSorted: bool) -> "GraphSeries":
+        series = cls.__new__(cls)
+        series._days = np.ascontiguousarray(days, dtype=np.int32)
+        series._values = np.ascontiguousarray(values, dtype=np.float64)
+        series._integral = np.ascontiguousarray(integral, dtype=bool)
+        series._size = len(series._days)
+        series._sorted = isSorted
+        return series
+
+    def toPoints(self) -> list:
+        """
+        The points in the {"date": "dd/mm/yyyy", "value": n} shape.
+        """
+        dates = _formatDays(self.days)
+        values = self.values.tolist()
+        integral = self._integral[:self._size].tolist()
+        return [
+            {"date": day, "value": int(value) if isInt else value}
+            for day, value, isInt in zip(dates, values, integral)
+        ]
+
+    # ---------- Appending ----------
+
+    def append(self, day, value):
+        """
+        Adds one point. `day` is a "dd/mm/yyyy" string, date or epoch day
+        int. Raises ValueError if it can't be parsed.
+        """
+        if isinstance(value, bool) or value is None:
+            raise ValueError(f"Invalid graph value {value!r}")
+        isInt = isinstance(value, int)
+        value = float(value)
+        day = toEpochDay(day)
+
+        if self._size == len(self._days):
+            self._grow()
+        if self._size and day < self._days[self._size - 1]:
+            self._sorted = False
+        self._days[self._size] = day
+        self._values[self._size] = value
+        self._integral[self._size] = isInt
+        self._size += 1
+
+    def extend(self, points: list):
+        for point in points:
+            self.append(point['date'], point['value'])
+
+    def _grow(self):
+        capacity = len(self._days) * 2
+        for name in ("_days", "_values", "_integral"):
+            current = getattr(self, name)
+            grown = np.empty(capacity, dtype=current.dtype)
+            grown[:self._size] = current[:self._size]
+            setattr(self, name, grown)
+
+    # ---------- Access ----------
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def days(self) -> np.ndarray:
+        return self._days[:self._size]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._size]
+
+    def last(self):
+        """
+        The most recently appended point, or None.
+        """
+        if not self._size:
+            return None
+        value = self._values[self._size - 1].item()
+        return {"date": fromEpochDay(self._days[self._size - 1]),
+                "value": int(value) if self._integral[self._size - 1] else value}
+
+    def sortedByDate(self) -> "GraphSeries":
+        """
+        The series in date order (itself if it already is). Points on the
+        same day keep their relative order.
+        """
+        if self._sorted:
+            return self
+        order = np.argsort(self.days, kind="stable")
+        return GraphSeries._fromArrays(self.days[order], self.values[order], self._integral[:self._size][order], True)
+
+    def slice(self, start=None, end=None) -> "GraphSeries":
+        """
+        Points dated from `start` to `end` inclusive (dates, datetimes,
+        "dd/mm/yyyy" strings or None for open ended), in date order.
+        """
+        series = self.sortedByDate()
+        days = series.days
+        lo = 0 if start is None else int(np.searchsorted(days, toEpochDay(start), side="left"))
+        hi = len(days) if end is None else int(np.searchsorted(days, toEpochDay(end), side="right"))
+        return GraphSeries._fromArrays(days[lo:hi], series.values[lo:hi], series._integral[lo:hi], True)
+
+    # ---------- Aggregates ----------
+
+    def sum(self) -> float:
+        return float(self.values.sum())
+
+    def mean(self):
+        return float(self.values.mean()) if self._size else None
+
+    def min(self):
+        return float(self.values.min()) if self._size else None
+
+    def max(self):
+        return float(self.values.max()) if self._size else None
+
+    def rolling(self, windowDays: int, how: str = "mean") -> "GraphSeries":
+        """
+        For every point, the sum or mean of the values dated within the
+        `windowDays` calendar days ending on that point's date (inclusive).
+        Gaps count as missing, not as zero.
+        """
+        if how not in ("sum", "mean"):
+            raise ValueError(f"Unknown rolling aggregation {how}")
+        if windowDays < 1:
+            raise ValueError("windowDays must be at least 1")
+
+        series = self.sortedByDate()
+        days, values = series.days, series.values
+        totals = np.concatenate(([0.0], np.cumsum(values)))
+        ends = np.arange(1, len(days) + 1)
+        starts = np.searchsorted(days, days - (windowDays - 1), side="left")
+        rolled = totals[ends] - totals[starts]
+        if how == "mean":
+            rolled = rolled / (ends - starts)
+        return GraphSeries._fromArrays(days, rolled, np.zeros(len(days), dtype=bool), True)
+
+    def downsample(self, resolution: str, how: str = "sum") -> list:
+        """
+        One {"period", "date", "value", "count"} point per
+        day/week/month/year bucket, in date order, where "date" is the
+        first day seen and "value" is the bucket's sum, mean, min, max or
+        count.
+        """
+        if how not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation {how}")
+        series = self.sortedByDate()
+        if not len(series):
+            return []
+
+        days = series.days.astype(np.int64)
+        if resolution == "day":
+            keys = days
+        elif resolution == "week":
+            # 1970-01-01 was a Thursday, so the week's Monday is (day + 3) % 7 days back
+            keys = days - (days + 3) % 7
+        elif resolution == "month":
+            keys = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        elif resolution == "year":
+            keys = days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+        else:
+            raise ValueError(f"Unknown resolution {resolution}")
+
+        # days are sorted so each bucket is one contiguous run
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        values = series.values
+        counts = np.diff(np.append(starts, len(values)))
+        sums = np.add.reduceat(values, starts)
+        aggregated = {
+            "sum": sums,
+            "count": counts,
+            "mean": sums / counts,
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+        }[how]
+
+        points = []
+        for start, value, count in zip(starts.tolist(), aggregated.tolist(), counts.tolist()):
+            first = date.fromordinal(int(days[start]) + EPOCH_ORDINAL)
+            points.append({
+                "period": bucketKey(first, resolution),
+                "date": first.strftime("%d/%m/%Y"),
+                "value": float(value) if how != "count" else value,
+                "count": count,
+            })
+        return points
+
+    # ---------- Gap filling ----------
+
+    def fillGaps(self, start=None, end=None, mode: str = "zero") -> list:
+        """
+        Points from `start` to `end` inclusive with every day that has no
+        point filled in, in date order. `start` defaults to the first
+        point and `end` to today. Filled points are marked "filled": True
+        and get 0 ("zero"), the last value before them ("carry", None if
+        there isn't one) or None ("null").
+        """
+        if mode not in FILL_MODES:
+            raise ValueError(f"Unknown fill mode {mode}")
+        series = self.sortedByDate()
+        days = series.days
+        endDay = todayEpochDay() if end is None else toEpochDay(end)
+        if start is not None:
+            startDay = toEpochDay(start)
+        elif len(days):
+            startDay = int(days[0])
+        else:
+            startDay = endDay
+        startDay = max(startDay, endDay - MAX_FILL_DAYS + 1)
+        if startDay > endDay:
+            return []
+
+        window = series.slice(startDay, endDay)
+        allDays = np.arange(startDay, endDay + 1, dtype=np.int32)
+        missing = allDays[~np.isin(allDays, window.days)]
+
+        if mode == "zero":
+            fills = [0] * len(missing)
+        elif mode == "carry":
+            # the carried value can come from before the window
+            previous = np.searchsorted(days, missing, side="right") - 1
+            values, integral = series.values.tolist(), series._integral[:len(series)].tolist()
+            fills = [
+                None if index < 0 else int(values[index]) if integral[index] else values[index]
+                for index in previous.tolist()
+            ]
+        else:
+            fills = [None] * len(missing)
+
+        points = [(day, point) for day, point in zip(window.days.tolist(), window.toPoints())]
+        points += [
+            (day, {"date": label, "value": value, "filled": True})
+            for day, label, value in zip(missing.tolist(), _formatDays(missing), fills)
+        ]
+        points.sort(key=lambda point: point[0])
+        return [point for _, point in points]
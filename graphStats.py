@@ -0,0 +1,157 @@
+import copy
+from datetime import date
+from graphSeries import GraphSeries, fillMode, fromEpochDay, todayEpochDay, toEpochDay
+
+# Per-graph statistics kept up to date as entries are appended, so the
+# task call can mention streaks and personal bests without the history.
+#
+# Shape (stored in graph_data.stats), days are days since 1970-01-01:
+# {
+#     "entries": 42, "lastDay": 20230, "lastActiveDay": 20230,
+#     "currentStreak": 6, "longestStreak": 11,
+#     "best": {"value": 12000, "day": 20101},
+#     "recent": {"20230": [sum, count], ...}    # the last RECENT_DAYS days that have entries
+# }
+#
+# A day is active when it has an entry with a non-zero value. Entries
+# dated before the last active day (backfills) still count towards the
+# best value and the rolling means, but don't extend or break streaks.
+
+RECENT_DAYS = 30
+
+
+def emptyStats() -> dict:
+    return {
+        "entries": 0,
+        "lastDay": None,
+        "lastActiveDay": None,
+        "currentStreak": 0,
+        "longestStreak": 0,
+        "best": None,
+        "recent": {},
+    }
+
+
+def _point(entry: dict):
+    try:
+        return toEpochDay(entry['date']), float(entry['value'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _addPoint(stats: dict, day: int, value: float):
+    stats["entries"] += 1
+    if stats["lastDay"] is None or day > stats["lastDay"]:
+        stats["lastDay"] = day
+
+    if stats["best"] is None or value > stats["best"]["value"]:
+        stats["best"] = {"value": value, "day": day}
+
+    if value != 0:
+        lastActive = stats["lastActiveDay"]
+        if lastActive is None or day > lastActive + 1:
+            stats["currentStreak"] = 1
+        elif day == lastActive + 1:
+            stats["currentStreak"] += 1
+        if lastActive is None or day > lastActive:
+            stats["lastActiveDay"] = day
+        stats["longestStreak"] = max(stats["longestStreak"], stats["currentStreak"])
+
+    # only the last RECENT_DAYS days (by the latest entry) are kept
+    if day > stats["lastDay"] - RECENT_DAYS:
+        bucket = stats["recent"].setdefault(str(day), [0, 0])
+        bucket[0] += value
+        bucket[1] += 1
+    cutoff = stats["lastDay"] - RECENT_DAYS
+    for key in [key for key in stats["recent"] if int(key) <= cutoff]:
+        del stats["recent"][key]
+
+
+def updateStats(stats: dict, entries: list) -> dict:
+    """
+    Returns a copy of `stats` with `entries` ({"date": "dd/mm/yyyy",
+    "value": n}) added. O(1) per entry (the recent window is at most
+    RECENT_DAYS days), invalid entries are skipped.
+    """
+    stats = copy.deepcopy(stats) if stats else emptyStats()
+    for entry in entries:
+        point = _point(entry)
+        if point:
+            _addPoint(stats, *point)
+    return stats
+
+
+def buildStats(series: list) -> dict:
+    """
+    Builds stats from scratch for a full series, in date order.
+    """
+    stats = emptyStats()
+    ordered = GraphSeries.fromPoints(series).sortedByDate()
+    for day, value in zip(ordered.days.tolist(), ordered.values.tolist()):
+        _addPoint(stats, day, value)
+    return stats
+
+
+def correctStats(stats: dict, series: list) -> dict:
+    """
+    Stats for `series` after values it already had were changed in place.
+    Rebuilt from the series, except that when points have been compacted
+    away the stored entry count, longest streak and best value are kept
+    if they're larger, since only the stored stats know about those.
+    """
+    rebuilt = buildStats(series)
+    if stats and stats["entries"] > rebuilt["entries"]:
+        rebuilt["entries"] = stats["entries"]
+        rebuilt["longestStreak"] = max(rebuilt["longestStreak"], stats["longestStreak"])
+        if stats["best"] and (rebuilt["best"] is None or stats["best"]["value"] > rebuilt["best"]["value"]):
+            rebuilt["best"] = dict(stats["best"])
+    return rebuilt
+
+
+def _number(value: float):
+    return int(value) if float(value).is_integer() else value
+
+
+def _recentMean(stats: dict, days: int, today: int, perDay: bool):
+    total, count = 0.0, 0
+    for key, (daySum, dayCount) in stats["recent"].items():
+        if today - days < int(key) <= today:
+            total += daySum
+            count += dayCount
+    if perDay:
+        # missed days count as zero, like gap-filled reads of these graphs
+        return round(total / days, 2)
+    return round(total / count, 2) if count else None
+
+
+def summariseStats(stats: dict, mode: str = "null", today: date = None) -> dict:
+    """
+    The small, prompt-friendly view of a graph's stats as of `today`. The
+    current streak is 0 once a whole day has passed without activity.
+    With fill mode "zero" the rolling means are per day (missed days are
+    zero), otherwise per entry.
+    """
+    stats = stats or emptyStats()
+    today = todayEpochDay() if today is None else toEpochDay(today)
+    lastActive = stats["lastActiveDay"]
+    currentStreak = stats["currentStreak"] if lastActive is not None and today - lastActive <= 1 else 0
+    perDay = mode == "zero"
+    best = stats["best"]
+    return {
+        "currentStreak": currentStreak,
+        "longestStreak": stats["longestStreak"],
+        "mean7": _recentMean(stats, 7, today, perDay),
+        "mean30": _recentMean(stats, 30, today, perDay),
+        "best": {"value": _number(best["value"]), "date": fromEpochDay(best["day"])} if best else None,
+        "daysSinceLastEntry": today - stats["lastDay"] if stats["lastDay"] is not None else None,
+        "entries": stats["entries"],
+    }
+
+
+def statsFor(graph: dict, today: date = None) -> dict:
+    """
+    summariseStats for a graph from getCurrentGraphData. Graphs saved
+    before stats existed get theirs built from their points.
+    """
+    stats = graph.get('stats') or buildStats(graph['data'])
+    return summariseStats(stats, fillMode(graph), today)
@@ -1,60 +1,68 @@
 import uuid
 from supabaseClient import supabase
+from helper import getUserDataId, invalidateGraphs
 
-def add_graph(graph: dict, phone_number: str) -> dict:
+def add_graph(graph: dict, phone_number: str) -> str:
     """
     Inserts a graph config into 'graphs' for the user with this phone_number,
     then seeds initial data in 'graph_data'.
-    Returns the inserted graph row.
+    Returns the inserted graph's id.
     """
-    # 1) lookup user_data.id by phone_number
-    try:
-        ud_resp = (
-            supabase
-            .table("user_data")
-            .select("id")
-            .eq("phone_number", phone_number)
-            .single()
-            .execute()
-        )
-    except Exception as e:
-        raise RuntimeError(f"Failed to fetch user_data for {phone_number}: {e}")
+    return add_graphs([graph], phone_number)[0]
 
-    if not ud_resp.data or "id" not in ud_resp.data:
-        raise RuntimeError(f"No user_data row found with phone_number={phone_number}")
 
-    user_data_id = ud_resp.data["id"]
+def add_graphs(graphs: list, phone_number: str, seed_data: list = None) -> list:
+    """
+    Inserts several graph configs for the user with this phone_number and
+    seeds each one's 'graph_data' row with `seed_data` (an empty array if
+    not given). The user is looked up once and the graphs and graph_data
+    rows are each written in a single bulk insert.
+    Returns the new graph ids in the same order as `graphs`.
+    """
+    if not graphs:
+        return []
 
-    # 2) generate a UUID for this graph
-    graph_id = str(uuid.uuid4())
+    # 1) lookup user_data.id by phone_number (cached)
+    try:
+        user_data_id = getUserDataId(phone_number)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch user_data for {phone_number}: {e}")
 
-    # 3) build the record for insertion (including the FK)
-    graph_record = {
-        "id":             graph_id,
-        "user_data_id":   user_data_id,
-        "title":          graph["title"],
-        "description":    graph["description"],
-        "type":           graph["type"],
-        "settings":       graph["settings"],
-    }
+    # 2) build a record (with a fresh UUID and the FK) for every graph
+    graph_records = []
+    for graph in graphs:
+        graph_records.append({
+            "id":             str(uuid.uuid4()),
+            "user_data_id":   user_data_id,
+            "title":          graph["title"],
+            "description":    graph["description"],
+            "type":           graph["type"],
+            "settings":       graph["settings"],
+        })
+    graph_ids = [record["id"] for record in graph_records]
 
-    # 4) insert into 'graphs'
+    # 3) insert them all into 'graphs'
     try:
-        resp = supabase.table("graphs").insert([graph_record]).execute()
+        resp = supabase.table("graphs").insert(graph_records).execute()
     except Exception as e:
         raise RuntimeError(f"Supabase insert (graphs) failed: {e}")
 
     updated_rows = getattr(resp, "data", None)
     if not updated_rows or not isinstance(updated_rows, list):
-        raise RuntimeError("Error adding the graph!")
+        raise RuntimeError("Error adding the graphs!")
 
-    # 5) seed an empty data array into 'graph_data'
+    # 4) seed every graph's 'graph_data' row in one go
     try:
-        data_resp = supabase.table("graph_data").insert([{
-            "graph_id": graph_id,
-            "data":     []
-        }]).execute()
+        supabase.table("graph_data").insert([
+            {
+                "graph_id": graph_id,
+                "data":     list(seed_data or [])
+            }
+            for graph_id in graph_ids
+        ]).execute()
     except Exception as e:
         raise RuntimeError(f"Supabase insert (graph_data) failed: {e}")
+    finally:
+        invalidateGraphs(user_data_id=user_data_id)
 
-    return graph_id
+    return graph_ids
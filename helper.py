@@ -1,7 +1,40 @@
 from fastapi import HTTPException
 from supabaseClient import supabase
 from datetime import datetime, timezone, timedelta
+from cache import TTLCache
+from rollups import splitAtCutoff
+from graphSeries import GraphSeries, fillMode, todayEpochDay
+from graphStats import statsFor
+from logger import getLogger
 import copy
+import os
+
+GRAPH_ENTRY_COLUMNS = "entry_date, value, created_at"
+USER_COLUMNS = "id, phone_number, user_id, userdata"
+# Days of gap-filled history getLastEntries gives the LLM for each graph
+RECENT_ENTRY_DAYS = int(os.getenv("RECENT_ENTRY_DAYS", "5"))
+
+log = getLogger("helper")
+
+# Read-through caches so one end-of-call report resolves each user's rows at most once.
+# user rows are stored under both ("phone", phone_number) and ("user", user_id),
+# graph lists under user_data.id, and the user_data.id owning each cached graph under its graph id
+userCache = TTLCache(
+    "users",
+    maxSize=int(os.getenv("CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+)
+graphCache = TTLCache(
+    "graphs",
+    maxSize=int(os.getenv("CACHE_MAX_ENTRIES", "1000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+)
+# users have several graphs, so this holds several times as many entries as graphCache
+graphOwnerCache = TTLCache(
+    "graphOwners",
+    maxSize=int(os.getenv("CACHE_MAX_ENTRIES", "1000")) * 10,
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+)
 
 
 def replace_user_data(phone_number: str, new_data: dict):
@@ -21,6 +54,8 @@ def replace_user_data(phone_number: str, new_data: dict):
     except Exception as e:
         raise RuntimeError(f"Supabase update failed for phone_number={phone_number}: {e}")
 
+    invalidateUser(phone_number=phone_number)
+
     updated_rows = getattr(resp, "data", None)
     if not updated_rows or not isinstance(updated_rows, list):
         raise RuntimeError(f"No user_data row found with phone_number={phone_number}")
@@ -28,31 +63,73 @@ def replace_user_data(phone_number: str, new_data: dict):
     return updated_rows[0]
 
 
-def updateStatus(call_sid: str, new_status: str):
+def apply_merge_patch(target, patch):
     """
-    Update the `status` column on the onboarding_sessions row
-    matching the given call_sid. Returns the updated row dict
-    on success or raises on failure.
+    Applies a JSON merge patch (RFC 7396) to `target` and returns the
+    result without modifying either argument. Objects are merged
+    recursively, a null value removes the key, anything else replaces it.
+    """
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def patch_user_data(phone_number: str, patch: dict):
+    """
+    Applies a JSON merge patch to the `userdata` JSONB blob in the
+    database (see migrations/003_merge_user_data.sql), so only the
+    changed keys are sent. Returns the updated blob or raises on failure.
     """
     try:
-        resp = (
-            supabase
-            .table("onboarding_sessions")
-            .update({"status": new_status})
-            .eq("call_sid", call_sid)
-            .execute()
-        )
+        resp = supabase.rpc("merge_user_data", {
+            "p_phone_number": phone_number,
+            "p_patch": patch,
+        }).execute()
     except Exception as e:
-        # network/auth/table-not-found errors, etc.
-        raise RuntimeError(f"Supabase update failed for call_sid={call_sid}: {e}")
+        raise RuntimeError(f"Supabase merge_user_data failed for phone_number={phone_number}: {e}")
 
-    # resp.data should be a list of updated rows
-    updated_rows = getattr(resp, "data", None)
-    if not updated_rows or not isinstance(updated_rows, list):
-        raise RuntimeError(f"No session found with call_sid: {call_sid}")
+    invalidateUser(phone_number=phone_number)
 
-    # return the first (and only) updated row
-    return updated_rows[0]
+    if resp.data is None:
+        raise RuntimeError(f"No user_data row found with phone_number={phone_number}")
+
+    return resp.data
+
+
+def updateStatuses(statusBySid: dict) -> set:
+    """
+    Writes many onboarding_sessions statuses at once, one UPDATE per
+    distinct status. Returns the call_sids that matched a session row.
+    """
+    sidsByStatus = {}
+    for call_sid, status in statusBySid.items():
+        sidsByStatus.setdefault(status, []).append(call_sid)
+
+    written = set()
+    for status, call_sids in sidsByStatus.items():
+        try:
+            resp = supabase.table("onboarding_sessions") \
+                            .update({"status": status}) \
+                            .in_("call_sid", call_sids) \
+                            .execute()
+        except Exception as e:
+            raise RuntimeError(f"Supabase update failed for {len(call_sids)} sessions: {e}")
+        written.update(row['call_sid'] for row in resp.data or [])
+    return written
+
+def getSessionStatus(call_sid: str):
+    resp = supabase.table("onboarding_sessions") \
+                    .select("status") \
+                    .eq("call_sid", call_sid) \
+                    .execute()
+    return resp.data[0]['status'] if resp.data else None
 
 def format_conversation(messages):
     """
@@ -79,7 +156,6 @@ def convert_iso_to_gmt_plus10(iso_ts: str) -> str:
       'Weekday, Month D, YYYY H:MM:SS AM/PM (This is GMT +10)'
     by simply adding 10 hours—no OS-specific strftime hacks.
     """
-    print("Raw iso:", iso_ts)
     # 1) Parse the UTC timestamp
     dt_utc = datetime.fromisoformat(iso_ts.replace("Z", "+00:00"))
     
@@ -101,7 +177,6 @@ def convert_iso_to_gmt_plus10(iso_ts: str) -> str:
     # 4) Zero-pad minutes/seconds, then assemble
     time_str = f"{hour12}:{minute:02d}:{second:02d} {ampm}"
     
-    print(f"Converted time: {weekday}, {month} {day}, {year} {time_str}")
     return f"{weekday}, {month} {day}, {year} {time_str}"
 
 
@@ -134,14 +209,14 @@ def saveCall(callId: str, callType: str, customerNumber: str):
         "call_type": callType,
     }
 
-    print("Sending call type info to supabase", session_row)
+    log.debug("calls.save", row=session_row)
     # 1) catch any transport/auth errors
     try:
         resp = supabase.table("calls") \
                         .insert([session_row]) \
                         .execute()
     except Exception as e:
-        print("SupabaseRequestFailed:", e)
+        log.error("calls.saveFailed", callId=callId, error=e)
         # e.g. network failure, auth failure, bad URL, etc.
         raise HTTPException(500, f"Supabase request failed: {e}")
 
@@ -153,7 +228,7 @@ def deleteCall(callId: str):
                         .delete() \
                         .eq("id", callId) \
                         .execute()
-  print(resp)
+  log.debug("calls.delete", callId=callId, deleted=len(resp.data or []))
   
 def getCallType(callId: str):
     resp = supabase.table("calls") \
@@ -163,70 +238,300 @@ def getCallType(callId: str):
     return resp.data[0]['call_type']
 
 
-def getCurrentUserData(phone_number: str):
+def _cacheUserRow(row: dict):
+    userCache.set(("phone", row['phone_number']), row)
+    if row.get('user_id'):
+        userCache.set(("user", row['user_id']), row)
+
+def _getUserRow(phone_number: str = None, user_id: str = None) -> dict:
+    """
+    Looks up the user_data row by phone number or user_id, going through
+    userCache. Returns a copy so callers can't mutate the cached row.
+    """
+    key = ("phone", phone_number) if phone_number else ("user", user_id)
+    row = userCache.get(key)
+    if row is None:
+        column, value = ("phone_number", phone_number) if phone_number else ("user_id", user_id)
+        row = _fetchUserRow(column, value)
+        _cacheUserRow(row)
+    return copy.deepcopy(row)
+
+def _fetchUserRow(column: str, value: str) -> dict:
     resp = supabase.table('user_data') \
-                        .select("userdata") \
-                        .eq("phone_number", phone_number) \
+                        .select(USER_COLUMNS) \
+                        .eq(column, value) \
                         .execute()
-    return resp.data[0]['userdata']
+    if not resp.data:
+        raise RuntimeError(f"No user_data row found with {column}={value}")
+    return resp.data[0]
+
+def invalidateUser(phone_number: str = None, user_id: str = None):
+    """
+    Drops a user's cached row under both of its keys.
+    """
+    keys = []
+    if phone_number:
+        keys.append(("phone", phone_number))
+    if user_id:
+        keys.append(("user", user_id))
+    for key in keys:
+        row = userCache.pop(key)
+        if row:
+            userCache.pop(("phone", row['phone_number']))
+            userCache.pop(("user", row.get('user_id')))
+
+def invalidateGraphs(user_data_id: str = None, graphId: str = None):
+    """
+    Drops the cached graph list for a user, either directly by
+    user_data.id or via one of the user's graph ids.
+    """
+    if graphId:
+        owner = graphOwnerCache.pop(graphId)
+        if owner is None and not user_data_id:
+            # the owner was evicted first, so any cached list could hold this graph
+            graphCache.clear()
+            return
+        user_data_id = owner or user_data_id
+    if user_data_id:
+        graphCache.delete(user_data_id)
+
+def cacheStats() -> dict:
+    return {"users": userCache.stats(), "graphs": graphCache.stats(), "graphOwners": graphOwnerCache.stats()}
+
+def getUserDataId(phone_number: str) -> str:
+    return _getUserRow(phone_number=phone_number)['id']
+
+def getCurrentUserData(phone_number: str):
+    return _getUserRow(phone_number=phone_number)['userdata']
 
 def getCustomerData(user_id: str):
-    resp = supabase.table('user_data') \
-                        .select("phone_number, userdata") \
-                        .eq("user_id", user_id) \
-                        .execute()
-    phone_number =  resp.data[0]['phone_number']
-    userData = resp.data[0]['userdata']
+    row = _getUserRow(user_id=user_id)
+    phone_number =  row['phone_number']
+    userData = row['userdata']
     return phone_number, userData
     
 
 def getCurrentGraphData(phone_number: str):
-    userIdDataResp = supabase.table('user_data') \
-                        .select("id") \
-                        .eq("phone_number", phone_number) \
-                        .execute()
-    userId = userIdDataResp.data[0]['id']
+    """
+    Returns every graph for the user with its `data` array attached.
+    At most two round trips no matter how many graphs the user has: one
+    to resolve user_data.id and one for the graphs with graph_data and
+    graph_entries embedded. Both go through the read-through caches.
+    """
+    userId = getUserDataId(phone_number)
     
-    graphsResp = supabase.table('graphs') \
-                        .select("*") \
-                        .eq("user_data_id", userId) \
-                        .execute()
+    graphData = graphCache.get(userId)
+    if graphData is None:
+        graphData = [_formatGraph(graph) for graph in _fetchGraphs("user_data_id", userId)]
+        graphCache.set(userId, graphData)
+        for graph in graphData:
+            graphOwnerCache.set(graph['id'], userId)
 
-    graphsInfo = graphsResp.data
-    graphData = []
-    for graph in graphsInfo:
-        graphDataResp = supabase.table('graph_data') \
-                        .select("data") \
-                        .eq("graph_id", graph['id']) \
-                        .execute()
-        tempGraph = graph
-        del tempGraph['user_data_id']
-        tempGraph['data'] = graphDataResp.data[0]['data']
-        graphData.append(tempGraph)
-    
-    return graphData
+    return copy.deepcopy(graphData)
 
-def updateGraphData(graphData: list, graphId: str):
-    print("Updating graph data!", graphData)
+def getGraph(graphId: str):
+    """
+    Returns one graph in the same shape as getCurrentGraphData's items,
+    or None if it doesn't exist. Served from the owner's cached graph
+    list when there is one, otherwise a single round trip.
+    """
+    userId = graphOwnerCache.get(graphId)
+    cachedGraphs = graphCache.get(userId) if userId else None
+    if cachedGraphs is not None:
+        for graph in cachedGraphs:
+            if graph['id'] == graphId:
+                return copy.deepcopy(graph)
+
+    graphs = _fetchGraphs("id", graphId)
+    if not graphs:
+        return None
+    return _formatGraph(graphs[0])
+
+def _fetchGraphs(column: str, value: str) -> list:
+    resp = supabase.table('graphs') \
+                        .select(f"*, graph_data(data, rollups, stats), graph_entries({GRAPH_ENTRY_COLUMNS})") \
+                        .eq(column, value) \
+                        .execute()
+    return resp.data
+
+def _formatGraph(graph: dict) -> dict:
+    # graph_data comes back as an object if graph_id is unique, otherwise a list of rows
+    graphDataRows = graph.pop('graph_data', None) or []
+    if isinstance(graphDataRows, dict):
+        graphDataRows = [graphDataRows]
+    graph.pop('user_data_id', None)
+    legacyData = graphDataRows[0]['data'] if graphDataRows else []
+    graph['data'] = buildGraphSeries(legacyData, graph.pop('graph_entries', None) or [])
+    graph['rollups'] = graphDataRows[0].get('rollups') if graphDataRows else None
+    graph['stats'] = graphDataRows[0].get('stats') if graphDataRows else None
+    return graph
+
+def buildGraphSeries(legacyData: list, entryRows: list) -> list:
+    """
+    Rebuilds a graph's points in the {"date": "dd/mm/yyyy", "value": n}
+    shape. Points from the old graph_data.data array come first, followed
+    by graph_entries rows in date order.
+    """
+    series = list(legacyData or [])
+    for row in sorted(entryRows, key=lambda row: (row['entry_date'], row.get('created_at') or '')):
+        entryDate = datetime.strptime(row['entry_date'], "%Y-%m-%d")
+        value = row['value']
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        series.append({"date": entryDate.strftime("%d/%m/%Y"), "value": value})
+    return series
+
+def _toEntryRow(graphId: str, entry: dict):
+    try:
+        entryDate = datetime.strptime(entry['date'], "%d/%m/%Y").strftime("%Y-%m-%d")
+        value = float(entry['value'])
+    except (KeyError, TypeError, ValueError) as e:
+        log.warning("graph.invalidEntry", graphId=graphId, entry=entry, error=e)
+        return None
+    return {"graph_id": graphId, "entry_date": entryDate, "value": value}
+
+def saveGraphEntries(entriesByGraph: dict, rollupsByGraph: dict = None, statsByGraph: dict = None) -> int:
+    """
+    Writes new points to graphs as graph_entries rows together with each
+    graph's weekly/monthly/yearly aggregates (graph_data.rollups) and
+    streaks/means/best (graph_data.stats, see graphStats.py).
+    Takes {graphId: [{"date": "dd/mm/yyyy", "value": n}, ...]} and writes
+    everything in one save_graph_entries call
+    (migrations/007_save_graph_entries.sql), a single round trip and
+    transaction no matter how many graphs changed, so the points and the
+    aggregates built from them are saved together or not at all.
+    A graph has one row per day (migrations/006_graph_entries_unique_day.sql):
+    a point for a day that already has one replaces its value, so writing
+    the same points twice doesn't add rows.
+    Returns the number of graph_entries rows written.
+    """
+    rowsByDay = {}
+    for graphId, entries in entriesByGraph.items():
+        for entry in entries:
+            row = _toEntryRow(graphId, entry)
+            if row:
+                # one upsert can't touch the same row twice, the last point for a day wins
+                rowsByDay[(graphId, row['entry_date'])] = row
+    rows = list(rowsByDay.values())
+
+    graphData = {}
+    for graphId, graphRollups in (rollupsByGraph or {}).items():
+        graphData.setdefault(graphId, {})['rollups'] = graphRollups
+    for graphId, graphStats in (statsByGraph or {}).items():
+        graphData.setdefault(graphId, {})['stats'] = graphStats
+
+    if not rows and not graphData:
+        return 0
+
+    log.info("graph.save", rows=len(rows), graphs=len(set(entriesByGraph) | set(graphData)))
+    log.debug("graph.saveRows", rows=rows)
+    try:
+        resp = supabase.rpc("save_graph_entries", {
+            "p_entries": rows,
+            "p_graph_data": graphData,
+        }).execute()
+    except Exception as e:
+        raise RuntimeError(f"Supabase save_graph_entries failed: {e}")
+    finally:
+        for graphId in set(entriesByGraph) | set(graphData):
+            invalidateGraphs(graphId=graphId)
+    return resp.data
 
-    resp = supabase.table('graph_data') \
-                    .update({'data': graphData}) \
-                    .eq('graph_id', graphId) \
+def migrateGraphData(graphId: str = None, batchSize: int = 500):
+    """
+    Moves points stored in graph_data.data arrays into graph_entries and
+    empties the arrays. Pass a graphId to migrate just one graph.
+    Safe to re-run, even after a crash between writing a graph's entries
+    and emptying its array: entries are upserted on the one row per graph
+    per day key (migrations/006_graph_entries_unique_day.sql) and days that
+    already have a row are left alone. Graphs whose arrays are already
+    empty are skipped.
+    """
+    query = supabase.table('graph_data').select("graph_id, data")
+    if graphId:
+        query = query.eq("graph_id", graphId)
+    graphDataRows = query.execute().data
+
+    migrated = 0
+    for graphDataRow in graphDataRows:
+        legacyData = graphDataRow['data'] or []
+        if not legacyData:
+            continue
+
+        rowsByDay = {}
+        for entry in legacyData:
+            row = _toEntryRow(graphDataRow['graph_id'], entry)
+            if row:
+                rowsByDay[row['entry_date']] = row
+        rows = list(rowsByDay.values())
+        for start in range(0, len(rows), batchSize):
+            supabase.table('graph_entries') \
+                    .upsert(rows[start:start + batchSize], on_conflict="graph_id,entry_date", ignore_duplicates=True) \
                     .execute()
-    
-    print("Updated graph data maybe!!")
-    
 
-def getLastEntries(graphData):
+        supabase.table('graph_data') \
+                .update({'data': []}) \
+                .eq('graph_id', graphDataRow['graph_id']) \
+                .execute()
+        invalidateGraphs(graphId=graphDataRow['graph_id'])
+        migrated += 1
+        log.info("graph.migrated", graphId=graphDataRow['graph_id'], rows=len(rows))
+
+    return migrated
+
+def compactGraphData(graphIds: list, cutoff: datetime):
+    """
+    Archives raw points dated before `cutoff` for the given graphs by
+    deleting them from graph_entries and the legacy graph_data.data arrays.
+    Only call this once the graphs' rollups include those points.
+    """
+    if not graphIds:
+        return
+
+    cutoffDate = cutoff.strftime("%Y-%m-%d")
+    log.info("graph.compact", cutoff=cutoffDate, graphIds=graphIds)
+    try:
+        supabase.table('graph_entries') \
+                .delete() \
+                .in_('graph_id', graphIds) \
+                .lt('entry_date', cutoffDate) \
+                .execute()
+
+        legacyResp = supabase.table('graph_data') \
+                            .select("graph_id, data") \
+                            .in_('graph_id', graphIds) \
+                            .execute()
+        for graphDataRow in legacyResp.data:
+            archived, hot = splitAtCutoff(graphDataRow['data'] or [], cutoff)
+            if archived:
+                supabase.table('graph_data') \
+                        .update({'data': hot}) \
+                        .eq('graph_id', graphDataRow['graph_id']) \
+                        .execute()
+    except Exception as e:
+        raise RuntimeError(f"Compacting graph data failed for graph_ids={graphIds}: {e}")
+    finally:
+        for graphId in graphIds:
+            invalidateGraphs(graphId=graphId)
+
+def getLastEntries(graphData, recentDays: int = RECENT_ENTRY_DAYS):
+    """
+    Every graph without its full series, with `lastEntry` (its latest
+    point, None if it has none yet), `recentEntries`: the last
+    `recentDays` days up to today, with missed days gap-filled the way the
+    graph's type says (see graphSeries.fillMode), and `stats`: streaks,
+    7/30-day means, best value and days since the last entry.
+    """
     lastEntryGraphData = []
+    today = todayEpochDay()
     
     for graph in graphData:
-        
-        if len(graph['data']) > 0:
-            graph['lastEntry'] = graph['data'][-1]
-            tempGraph = copy.deepcopy(graph)
-            del tempGraph['data']
-            lastEntryGraphData.append(tempGraph)
+        series = GraphSeries.fromPoints(graph['data']).sortedByDate()
+        tempGraph = copy.deepcopy({key: value for key, value in graph.items() if key not in ('data', 'rollups', 'stats')})
+        tempGraph['lastEntry'] = series.last()
+        tempGraph['recentEntries'] = series.fillGaps(today - recentDays + 1, today, fillMode(graph))
+        tempGraph['stats'] = statsFor(graph)
+        lastEntryGraphData.append(tempGraph)
 
     return lastEntryGraphData
 
@@ -245,4 +550,4 @@ def getPhoneNumberId(phoneNumber):
     elif phoneNumber.startswith("+44"):
         return os.getenv("VAPI_UK_PHONE_ID")
     else:
-        print("Phone number not in provided country code options")
\ No newline at end of file
+        log.warning("phoneNumberId.unknownCountry", phone_number=phoneNumber)
\ No newline at end of file
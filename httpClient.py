@@ -0,0 +1,56 @@
+import aiohttp
+from logger import getLogger
+
+log = getLogger("httpClient")
+
+
+class SharedSession:
+    """
+    A long-lived, pooled aiohttp session for one upstream API.
+
+    Open it from the app lifespan and close it on shutdown. If something
+    asks for the session outside the app (scripts, tests) it is opened
+    lazily on first use.
+    """
+
+    def __init__(self, name: str, limit: int = 100, limitPerHost: int = 20,
+                 timeout: float = 60, connectTimeout: float = 10, dnsCacheSeconds: int = 300):
+        self.name = name
+        self.limit = limit
+        self.limitPerHost = limitPerHost
+        self.timeout = timeout
+        self.connectTimeout = connectTimeout
+        self.dnsCacheSeconds = dnsCacheSeconds
+        self._session = None
+
+    async def open(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limitPerHost,
+                ttl_dns_cache=self.dnsCacheSeconds,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.clientTimeout(),
+            )
+            log.info("session.opened", session=self.name, limit=self.limit, limitPerHost=self.limitPerHost)
+        return self._session
+
+    def clientTimeout(self, total: float = None) -> aiohttp.ClientTimeout:
+        """
+        The session's timeout with `total` overridden for one request. The
+        connect timeout is kept, since a per-request ClientTimeout replaces
+        the session's whole one.
+        """
+        return aiohttp.ClientTimeout(total=total or self.timeout, connect=self.connectTimeout)
+
+    async def get(self) -> aiohttp.ClientSession:
+        return await self.open()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            log.info("session.closed", session=self.name)
+        self._session = None
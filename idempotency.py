@@ -0,0 +1,151 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from supabaseClient import supabase
+from sharedState import sharedState
+
+
+class IdempotencyStore(ABC):
+    """
+    Remembers which webhook events have already been taken on.
+
+    `claim` is atomic: exactly one caller gets True for a given key until
+    it is released. `complete` marks the work as done for good, `release`
+    forgets the key so a redelivery can try again.
+    """
+
+    @abstractmethod
+    def claim(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, key: str):
+        ...
+
+    @abstractmethod
+    def release(self, key: str):
+        ...
+
+    @abstractmethod
+    def status(self, key: str):
+        ...
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    Per-process store. Keys expire after `ttl` seconds and the oldest are
+    dropped once `maxSize` keys are stored.
+    """
+
+    def __init__(self, ttl: float = 24 * 60 * 60, maxSize: int = 10000):
+        self.ttl = ttl
+        self.maxSize = maxSize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> bool:
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry and entry[0] > time.monotonic():
+                return False
+            self._keys[key] = (time.monotonic() + self.ttl, "processing")
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.maxSize:
+                self._keys.popitem(last=False)
+            return True
+
+    def complete(self, key: str):
+        with self._lock:
+            self._keys[key] = (time.monotonic() + self.ttl, "completed")
+
+    def release(self, key: str):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def status(self, key: str):
+        with self._lock:
+            entry = self._keys.get(key)
+            if not entry or entry[0] <= time.monotonic():
+                return None
+            return entry[1]
+
+
+class SupabaseIdempotencyStore(IdempotencyStore):
+    """
+    Persistent store backed by the webhook_events table, so duplicates
+    are caught across restarts and workers. The primary key on `key`
+    makes the insert in `claim` the atomic check.
+    """
+
+    table = "webhook_events"
+
+    def claim(self, key: str) -> bool:
+        try:
+            supabase.table(self.table).insert([{"key": key, "status": "processing"}]).execute()
+        except Exception as e:
+            if "23505" in str(e) or "duplicate key" in str(e):
+                return False
+            raise RuntimeError(f"Supabase insert ({self.table}) failed for key={key}: {e}")
+        return True
+
+    def complete(self, key: str):
+        supabase.table(self.table) \
+                .update({"status": "completed"}) \
+                .eq("key", key) \
+                .execute()
+
+    def release(self, key: str):
+        supabase.table(self.table) \
+                .delete() \
+                .eq("key", key) \
+                .execute()
+
+    def status(self, key: str):
+        resp = supabase.table(self.table) \
+                        .select("status") \
+                        .eq("key", key) \
+                        .execute()
+        return resp.data[0]['status'] if resp.data else None
+
+
+class SharedIdempotencyStore(IdempotencyStore):
+    """
+    Keys are markers in the shared state (see sharedState.py), so with
+    SHARED_STATE=sqlite every worker process on the box sees the same
+    events. Keys expire after `ttl` seconds.
+    """
+
+    def __init__(self, state, ttl: float = 24 * 60 * 60):
+        self.state = state
+        self.ttl = ttl
+
+    def claim(self, key: str) -> bool:
+        return self.state.claim(f"event:{key}", self.ttl, "processing")
+
+    def complete(self, key: str):
+        self.state.put(f"event:{key}", "completed", self.ttl)
+
+    def release(self, key: str):
+        self.state.release(f"event:{key}")
+
+    def status(self, key: str):
+        return self.state.get(f"event:{key}")
+
+
+def createIdempotencyStore(kind: str = None) -> IdempotencyStore:
+    kind = (kind or os.getenv("IDEMPOTENCY_STORE", "shared")).lower()
+    ttl = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+    if kind == "shared":
+        return SharedIdempotencyStore(sharedState, ttl=ttl)
+    if kind == "memory":
+        return MemoryIdempotencyStore(ttl=ttl)
+    if kind == "supabase":
+        return SupabaseIdempotencyStore()
+    raise ValueError(f"Unknown IDEMPOTENCY_STORE {kind}")
+
+
+def eventKey(payload: dict) -> str:
+    message = payload['message']
+    return f"{message['call']['id']}:{message['type']}"
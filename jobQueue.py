@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from logger import getLogger
+
+log = getLogger("jobQueue")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class Job:
+    """
+    A single unit of background work. Holds the coroutine function
+    and its arguments plus everything needed to report on it later.
+    """
+
+    def __init__(self, name: str, func, args: tuple, kwargs: dict):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = "queued"
+        self.attempts = 0
+        self.error = None
+        self.result = None
+        self.enqueuedAt = time.time()
+        self.startedAt = None
+        self.finishedAt = None
+        self.done = asyncio.Event()
+
+    async def wait(self, timeout: float = None):
+        """
+        Wait for the job to succeed or fail for good.
+        Returns True if it finished within the timeout.
+        """
+        try:
+            await asyncio.wait_for(self.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def toDict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "enqueuedAt": self.enqueuedAt,
+            "startedAt": self.startedAt,
+            "finishedAt": self.finishedAt,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue with a bounded pool of asyncio workers.
+
+    Jobs are retried with exponential backoff when they raise, and the
+    last `historySize` jobs are kept around so their status can be looked up.
+    """
+
+    def __init__(self, workers: int = 4, maxSize: int = 1000, maxRetries: int = 2,
+                 retryDelay: float = 2.0, historySize: int = 500):
+        self.workerCount = workers
+        self.maxSize = maxSize
+        self.maxRetries = maxRetries
+        self.retryDelay = retryDelay
+        self.historySize = historySize
+
+        self._queue = None
+        self._workers = []
+        self._jobs = OrderedDict()
+        self._retrying = set()
+        self._pending = 0    # jobs enqueued that haven't succeeded or failed for good
+        self._waitTimes = deque(maxlen=500)
+        self._runTimes = deque(maxlen=500)
+        self._accepting = False
+        self.counts = {"enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxSize)
+        self._accepting = True
+        for workerNo in range(self.workerCount):
+            self._workers.append(asyncio.create_task(self._worker(workerNo)))
+        log.info("jobs.started", workers=self.workerCount)
+
+    def enqueue(self, name: str, func, *args, **kwargs) -> Job:
+        """
+        Queue `func(*args, **kwargs)` to be awaited by a worker.
+        Raises QueueFullError when the queue is full or shutting down.
+        """
+        if not self._accepting:
+            raise QueueFullError("Job queue is not accepting new jobs")
+
+        job = Job(name, func, args, kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.maxSize} jobs)")
+
+        self._remember(job)
+        self._pending += 1
+        self.counts["enqueued"] += 1
+        return job
+
+    def getJob(self, jobId: str):
+        return self._jobs.get(jobId)
+
+    async def drain(self, timeout: float = 30):
+        """
+        Stop taking new jobs, wait for queued and retrying jobs to finish,
+        then stop the workers. Anything still running after `timeout`
+        seconds is cancelled.
+        """
+        self._accepting = False
+        if self._queue is None:
+            return
+
+        log.info("jobs.draining", depth=self.depth())
+        deadline = time.monotonic() + timeout
+        while self._pending:
+            if time.monotonic() > deadline:
+                log.warning("jobs.drainTimedOut", depth=self.depth())
+                break
+            await asyncio.sleep(0.1)
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def depth(self) -> int:
+        if self._queue is None:
+            return 0
+        return self._queue.qsize() + len(self._retrying)
+
+    def stats(self) -> dict:
+        running = sum(1 for job in self._jobs.values() if job.status == "running")
+        return {
+            "depth": self.depth(),
+            "running": running,
+            "workers": self.workerCount,
+            "counts": dict(self.counts),
+            "waitSeconds": _summarise(self._waitTimes),
+            "runSeconds": _summarise(self._runTimes),
+        }
+
+    # ---------- Internals ----------
+
+    def _remember(self, job: Job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.historySize:
+            oldId, oldJob = next(iter(self._jobs.items()))
+            if not oldJob.done.is_set():
+                break
+            del self._jobs[oldId]
+
+    async def _worker(self, workerNo: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.attempts += 1
+        job.startedAt = time.time()
+        if job.attempts == 1:
+            self._waitTimes.append(job.startedAt - job.enqueuedAt)
+
+        try:
+            job.result = await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            job.error = repr(e)
+            log.error("jobs.failed", job=job.name, jobId=job.id, attempt=job.attempts, error=e)
+            if job.attempts <= self.maxRetries:
+                job.status = "retrying"
+                self.counts["retried"] += 1
+                self._retrying.add(job.id)
+                asyncio.create_task(self._retryLater(job))
+                return
+            job.status = "failed"
+            self.counts["failed"] += 1
+        else:
+            job.status = "succeeded"
+            job.error = None
+            self.counts["succeeded"] += 1
+
+        job.finishedAt = time.time()
+        self._runTimes.append(job.finishedAt - job.enqueuedAt)
+        self._pending -= 1
+        job.done.set()
+
+    async def _retryLater(self, job: Job):
+        await asyncio.sleep(self.retryDelay * 2 ** (job.attempts - 1))
+        job.status = "queued"
+        await self._queue.put(job)
+        self._retrying.discard(job.id)
+
+
+def _summarise(samples) -> dict:
+    if not samples:
+        return {"count": 0, "avg": None, "p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": sum(ordered) / len(ordered),
+        "p50": ordered[int(0.50 * (len(ordered) - 1))],
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "max": ordered[-1],
+    }
+
+
+jobQueue = JobQueue(
+    workers=int(os.getenv("JOB_WORKERS", "4")),
+    maxSize=int(os.getenv("JOB_QUEUE_SIZE", "1000")),
+    maxRetries=int(os.getenv("JOB_MAX_RETRIES", "2")),
+    retryDelay=float(os.getenv("JOB_RETRY_DELAY", "2")),
+)
@@ -0,0 +1,107 @@
+import json
+
+# Incremental parser for a JSON document arriving in chunks (e.g. streamed
+# LLM output). It hands every completed top-level item to a callback as soon
+# as it's complete: list elements as (index, value), object members as
+# (key, value). Anything before the first [ or { (like a ```json fence) is
+# ignored.
+
+
+class IncrementalJsonParser:
+
+    def __init__(self, onItem=None):
+        self.onItem = onItem
+        self.buffer = ""
+        self.items = []
+        self._pos = 0
+        self._depth = 0
+        self._inString = False
+        self._escaped = False
+        self._topLevel = None     # "[" or "{"
+        self._itemStart = None    # where the current top-level value starts
+        self._key = None          # current member key for top-level objects
+        self._keyStart = None
+        self._expectKey = False
+        self._done = False
+
+    def feed(self, chunk: str):
+        self.buffer += chunk
+        while self._pos < len(self.buffer) and not self._done:
+            self._step(self.buffer[self._pos])
+            self._pos += 1
+
+    def _emit(self, end: int):
+        raw = self.buffer[self._itemStart:end].strip()
+        self._itemStart = None
+        if not raw:
+            return
+        value = json.loads(raw)
+        key = self._key if self._topLevel == "{" else len(self.items)
+        self.items.append((key, value))
+        self._key = None
+        if self.onItem:
+            self.onItem(key, value)
+
+    def _step(self, char: str):
+        index = self._pos
+
+        if self._topLevel is None:
+            if char in "[{":
+                self._topLevel = char
+                self._depth = 1
+                self._expectKey = char == "{"
+            return
+
+        if self._inString:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._inString = False
+                if self._depth == 1 and self._keyStart is not None:
+                    self._key = json.loads(self.buffer[self._keyStart:index + 1])
+                    self._keyStart = None
+            return
+
+        if char == '"':
+            self._inString = True
+            if self._depth == 1 and self._expectKey:
+                self._keyStart = index
+                self._expectKey = False
+                return
+
+        if self._depth == 1:
+            if char == ":" and self._topLevel == "{":
+                self._itemStart = index + 1
+                return
+            if char == ",":
+                if self._itemStart is not None:
+                    self._emit(index)
+                self._expectKey = self._topLevel == "{"
+                return
+            if char in "]}":
+                if self._itemStart is not None:
+                    self._emit(index)
+                self._depth = 0
+                self._done = True
+                return
+            if self._itemStart is None and not char.isspace() and self._topLevel == "[":
+                self._itemStart = index
+
+        if char in "[{":
+            self._depth += 1
+        elif char in "]}":
+            self._depth -= 1
+            # a nested value just closed, no need to wait for the next comma
+            if self._depth == 1 and self._itemStart is not None:
+                self._emit(index + 1)
+
+    def result(self):
+        """
+        The whole parsed document once the stream is finished.
+        """
+        text = self.buffer.strip()
+        start = min((i for i in (text.find("["), text.find("{")) if i != -1), default=0)
+        end = max(text.rfind("]"), text.rfind("}")) + 1
+        return json.loads(text[start:end or None])
@@ -0,0 +1,230 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import metrics
+
+# Structured logging for the app. Records are written as JSON lines (or
+# key=value text with LOG_FORMAT=text) by a background listener thread, so a
+# log call only sanitises its fields and puts the record on a queue instead
+# of writing to stdout on the request path.
+#
+#   log = getLogger("helper")
+#   log.info("graph.append", graphs=3, rows=rows)
+#   log.debug("webhook.payload", sample=0.01, payload=payload)
+#
+# Field values are truncated (strings, long lists, deep nesting) and
+# secrets/phone numbers are redacted before they are queued. Verbose events
+# can pass `sample` to only be logged for that fraction of calls.
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+LOG_MAX_ITEMS = int(os.getenv("LOG_MAX_ITEMS", "20"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Default fraction of verbose events (full prompts, payloads) that are logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.05"))
+
+MAX_DEPTH = 4
+REDACTED_KEYS = {"authorization", "api_key", "apikey", "token", "secret", "password"}
+PHONE_KEYS = {"phone", "phone_number", "phonenumber", "number", "customernumber"}
+# "+61412345678", "0412 345 678" (but not dates, times or ids)
+PHONE_PATTERN = re.compile(r"(?<![\w:/.-])(?:\+\d{1,3}[ -]?|0)\d(?:[ -]?\d){7,11}(?![\w:/])")
+BEARER_PATTERN = re.compile(r"(?i)bearer\s+[\w\-.]+")
+
+
+def _maskPhone(text: str) -> str:
+    digits = re.sub(r"\D", "", text)
+    return "*" * max(len(digits) - 3, 0) + digits[-3:]
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= LOG_MAX_FIELD_CHARS:
+        return text
+    return text[:LOG_MAX_FIELD_CHARS] + f"...(+{len(text) - LOG_MAX_FIELD_CHARS} chars)"
+
+
+def sanitise(value, key: str = "", depth: int = 0):
+    """
+    Copy of `value` that is safe and cheap to log: secrets and phone numbers
+    are masked, strings truncated, and lists/dicts cut to LOG_MAX_ITEMS
+    items and MAX_DEPTH levels.
+    """
+    lowered = key.lower() if isinstance(key, str) else ""
+    if lowered in REDACTED_KEYS or lowered.endswith("_key") or lowered.endswith("token"):
+        return "[redacted]"
+
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+    if isinstance(value, str):
+        if lowered in PHONE_KEYS:
+            return _maskPhone(value)
+        value = BEARER_PATTERN.sub("Bearer [redacted]", value)
+        value = PHONE_PATTERN.sub(lambda match: _maskPhone(match.group()), value)
+        return _truncate(value)
+
+    if depth >= MAX_DEPTH:
+        return f"<{type(value).__name__}>"
+    if isinstance(value, dict):
+        items = list(value.items())
+        cleaned = {str(k): sanitise(v, k, depth + 1) for k, v in items[:LOG_MAX_ITEMS]}
+        if len(items) > LOG_MAX_ITEMS:
+            cleaned["..."] = f"+{len(items) - LOG_MAX_ITEMS} keys"
+        return cleaned
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        cleaned = [sanitise(v, key, depth + 1) for v in items[:LOG_MAX_ITEMS]]
+        if len(items) > LOG_MAX_ITEMS:
+            cleaned.append(f"...+{len(items) - LOG_MAX_ITEMS} items")
+        return cleaned
+    if isinstance(value, BaseException):
+        return _truncate(repr(value))
+    return sanitise(str(value), key, depth)
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for name in ("callId", "stage"):
+            if getattr(record, name, None):
+                line[name] = getattr(record, name)
+        line.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class TextFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            time.strftime("%H:%M:%S", time.localtime(record.created)),
+            record.levelname,
+            record.name,
+            record.getMessage(),
+        ]
+        for name in ("callId", "stage"):
+            if getattr(record, name, None):
+                parts.append(f"{name}={getattr(record, name)}")
+        for name, value in getattr(record, "fields", {}).items():
+            parts.append(f"{name}={json.dumps(value, default=str)}")
+        text = " ".join(parts)
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Never blocks the caller: if the listener can't keep up, records are
+    dropped and counted instead.
+    """
+
+    def __init__(self, logQueue):
+        super().__init__(logQueue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Fields are already sanitised, formatting happens on the listener thread
+        record.callId = metrics.currentCallId.get()
+        record.stage = metrics.currentStage.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogger:
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, sample: float = None, exc_info=None, fields: dict = None):
+        if not self.logger.isEnabledFor(level):
+            return
+        if sample is not None and random.random() >= sample:
+            return
+        cleaned = {name: sanitise(value, name) for name, value in (fields or {}).items()}
+        self.logger.log(level, event, exc_info=exc_info, extra={"fields": cleaned})
+
+    def debug(self, event: str, sample: float = None, **fields):
+        self._log(logging.DEBUG, event, sample, fields=fields)
+
+    def info(self, event: str, sample: float = None, **fields):
+        self._log(logging.INFO, event, sample, fields=fields)
+
+    def warning(self, event: str, sample: float = None, **fields):
+        self._log(logging.WARNING, event, sample, fields=fields)
+
+    def error(self, event: str, sample: float = None, **fields):
+        self._log(logging.ERROR, event, sample, fields=fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, exc_info=True, fields=fields)
+
+    def verbose(self, event: str, **fields):
+        """
+        Debug event (full prompts, responses, payloads) logged for only
+        LOG_SAMPLE_RATE of calls.
+        """
+        self._log(logging.DEBUG, event, LOG_SAMPLE_RATE, fields=fields)
+
+
+_root = logging.getLogger("lifetrack")
+_handler = None
+_listener = None
+
+
+def setupLogging():
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    _handler = _DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(_handler.queue, output)
+    _listener.start()
+
+    _root.setLevel(LOG_LEVEL)
+    for handler in list(_root.handlers):
+        _root.removeHandler(handler)
+    _root.addHandler(_handler)
+    _root.propagate = False
+
+
+def stopLogging():
+    """
+    Flushes queued records. Called on shutdown.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    if _handler.dropped:
+        print(f"Dropped {_handler.dropped} log records", file=sys.stderr)
+
+
+def getLogger(name: str) -> StructuredLogger:
+    setupLogging()
+    return StructuredLogger(_root.getChild(name))
+
+
+atexit.register(stopLogging)
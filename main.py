@@ -1,17 +1,76 @@
-from fastapi import FastAPI, Path, HTTPException, Request
+from fastapi import FastAPI, Path, Query, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 import uvicorn
 from makeCall import makeTaskCall, makeOnboardingCall
+from vapiClient import vapiSession
 from supabaseClient import supabase
-from transcriptionAnalysis import generateGraphObjects, getInitialUserObject, setNextCall, updateUserData, UpdateGraphs
-from graphs import add_graph
-from helper import format_conversation, updateStatus, replace_user_data, deleteCall, getCallType, getCustomerData, getCurrentGraphData, getLastEntries, updateGraphData
-import datetime
+from transcriptionAnalysis import ANALYSIS_MODE, llmSession, generateGraphObjects, getInitialUserObject, getNextCallTime, scheduleNextCall, updateUserData, UpdateGraphs, analyseOnboardingCall, analyseTaskCall
+from graphs import add_graphs
+from helper import format_conversation, replace_user_data, deleteCall, getCallType, getCustomerData, getCurrentGraphData, getLastEntries, getGraph, invalidateUser, cacheStats
+from jobQueue import jobQueue, QueueFullError
+from statusBuffer import statusBuffer
+from scheduler import SCHEDULER_ENABLED, callScheduler
+from pipeline import Stage, pickStage, runStages
+from idempotency import createIdempotencyStore, eventKey
+from sharedState import sharedState
+import nextCallParser
+import metrics
+import profiling
+from logger import getLogger, stopLogging
+from graphStats import statsFor
+from dashboard import cachedJSON, graphPoints, paginate, parseQueryDate
+from contextlib import asynccontextmanager
+from functools import partial
 import asyncio
+import os
+import uuid
 
-app = FastAPI()
+idempotencyStore = createIdempotencyStore()
+# end-of-call jobs currently queued or running in this process, by event key
+inFlightEvents = {}
+DUPLICATE_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "20"))
+# How long a number stays marked as being dialled if the worker dies mid-request
+DIAL_MARKER_SECONDS = float(os.getenv("DIAL_MARKER_SECONDS", "60"))
+
+log = getLogger("main")
+
+metrics.registry.register(metrics.Gauge("job_queue_depth", "Background jobs waiting to run", jobQueue.depth))
+metrics.registry.register(metrics.Gauge("job_queue_running", "Background jobs currently running", lambda: jobQueue.stats()["running"]))
+metrics.registry.register(metrics.Gauge("status_buffer_pending", "Session status updates waiting to be written", statusBuffer.depth))
+# llm_cost_usd_total is per worker, these are summed over every worker through the shared state.
+# /metrics reads the totals off the event loop into llmTotals just before rendering
+llmTotals = {}
+metrics.registry.register(metrics.Gauge("llm_cost_usd_all_workers", "Estimated OpenAI spend in USD across all workers",
+                                        lambda: llmTotals.get("llm:costUsd", 0)))
+metrics.registry.register(metrics.Gauge("llm_requests_all_workers", "OpenAI requests across all workers",
+                                        lambda: llmTotals.get("llm:requests", 0)))
+metrics.registry.register(metrics.Gauge("scheduler_backlog", "Due calls waiting to be sent to Vapi", callScheduler.backlog))
+metrics.registry.register(metrics.Gauge("scheduler_oldest_lag_seconds", "How far behind its dispatch time the oldest waiting call is", callScheduler.lagSeconds))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await llmSession.open()
+    await vapiSession.open()
+    await jobQueue.start()
+    await statusBuffer.start()
+    if SCHEDULER_ENABLED:
+        await callScheduler.start()
+    yield
+    # Let in-flight end-of-call reports finish before the worker exits
+    await jobQueue.drain()
+    # stopped after the drain since end-of-call jobs schedule calls
+    if SCHEDULER_ENABLED:
+        await callScheduler.stop()
+    await statusBuffer.stop()
+    await llmSession.close()
+    await vapiSession.close()
+    stopLogging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,6 +86,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilingMiddleware)
 
 
 # ---------- Schemas ----------
@@ -47,35 +107,50 @@ class TaskRequest(BaseModel):
 async def webhook(request: Request):
     payload = await request.json()
     messageType = payload['message']['type']
-    print(messageType)
     sid = payload['message']['call']['transport']['callSid']
     phone_number = payload['message']['call']['customer']['number']
+    log.debug("webhook.received", type=messageType, sid=sid)
     if messageType == "end-of-call-report":
-        print("\n\n\n CALL ENDED \n\n\n")
-        print(payload)
-        callType = getCallType(payload['message']['call']['id'])
-        formatted_convo = format_conversation(payload['message']['artifact']['messages'][1:])
-        if callType == 'onboarding':
-            print('handling onboarding!!')
-            await handleOnboardingEnd(sid, phone_number, payload, formatted_convo)
-        else:
-            print('handling task end!!')
-            await handleTaskEnd(phone_number, payload, formatted_convo)
-        print(sid)
+        log.info("webhook.callEnded", sid=sid, callId=payload['message']['call']['id'],
+                 messages=len(payload['message'].get('artifact', {}).get('messages', [])))
+        # the full report (transcript and artifact) is tens of KB, only keep a sample
+        log.verbose("webhook.payload", payload=payload)
+        key = eventKey(payload)
+
+        # Vapi re-delivers on timeouts, wait on the original job instead of starting another
+        inFlightJob = inFlightEvents.get(key)
+        if inFlightJob:
+            log.info("webhook.duplicate", key=key, inFlight=True)
+            await inFlightJob.wait(DUPLICATE_WAIT_SECONDS)
+            return {"duplicate": True, "jobId": inFlightJob.id, "status": inFlightJob.status}
+        if not await asyncio.to_thread(idempotencyStore.claim, key):
+            log.info("webhook.duplicate", key=key, inFlight=False)
+            return {"duplicate": True}
+
+        # Vapi only needs an ack, the analysis happens in the background
+        try:
+            # carry keeps the background job in this request's profile if it's being profiled
+            # `completed` outlives a failed attempt so a retry only re-runs the stages that failed
+            carried = profiling.carry(handleEndOfCall)
+            job = jobQueue.enqueue("end-of-call-report", carried, sid, phone_number, payload, completed={})
+        except QueueFullError as e:
+            # the job will never run, so it mustn't keep the profile open
+            profiling.cancel(carried)
+            await asyncio.to_thread(idempotencyStore.release, key)
+            raise HTTPException(503, str(e))
+        inFlightEvents[key] = job
+        asyncio.create_task(settleEvent(key, job))
+        log.info("webhook.queued", sid=sid, jobId=job.id)
 
 
     elif messageType == "status-update":
-        print("\n\n\n STATUS UPDATE \n\n\n")
-        print(sid)
-        print(payload['message']['status'])
         status = payload['message']['status']
+        log.info("webhook.statusUpdate", sid=sid, status=status)
+        # Buffered and written in batches, Vapi sends several of these per call
         if status == 'in-progress':
-            updateStatus(sid, 'answered')
-            print("Call in progress!")
-            # Update Supabase with the new status
+            statusBuffer.set(sid, 'answered')
         elif status == 'ended':
-            updateStatus(sid, 'completed')
-            print('Call ended!')
+            statusBuffer.set(sid, 'completed')
             
         
     return {
@@ -87,54 +162,139 @@ async def webhook(request: Request):
     }
 
 
-async def handleOnboardingEnd(sid: str, phone_number: str, payload: dict, formatted_convo: str):
+async def settleEvent(key: str, job):
+    """
+    Once a job is finished for good, mark its event completed, or forget it
+    if it failed so a redelivery from Vapi can try again.
+    """
+    await job.wait()
+    inFlightEvents.pop(key, None)
+    if job.status == "succeeded":
+        await asyncio.to_thread(idempotencyStore.complete, key)
+    else:
+        await asyncio.to_thread(idempotencyStore.release, key)
 
-    updateStatus(sid, 'completed')
-    
-    
-    # Get a placeholder array of empty entries for the last week (value: 0)
-    placeholderData = []
-    for dayNo in range(5):
-        date = datetime.datetime.now() - datetime.timedelta(days=dayNo)
-        date = date.strftime("%d/%m/%Y")
-        placeholderData.append({"date": date, "value": 0})
-    placeholderData.reverse()
-    print(placeholderData)
-       
-    
-    print("Formatted Conversation:", formatted_convo)
-    graphs = await generateGraphObjects(formatted_convo)
-    print("Graphs:", graphs)
-    for graph in graphs:
-        print('\nAdding Graph:', graph)
-        id = add_graph(graph, phone_number)
-        updateGraphData(placeholderData, id)
-    
-    userObj = await getInitialUserObject(formatted_convo)
-    await setNextCall(phone_number, userObj, formatted_convo, payload['message']['startedAt'], graphs)
-    
-    print("User Object:", userObj)
-    replace_user_data(phone_number, userObj)
+
+async def handleEndOfCall(sid: str, phone_number: str, payload: dict, completed: dict = None):
+    """
+    Runs the end-of-call pipeline. Stages that succeed are recorded in
+    `completed`, so when the job queue retries after a failure the graph
+    entries, profile patch and next call that already went through aren't
+    written a second time.
+    """
+    # Everything the pipeline spends on LLM/Supabase/Vapi is attributed to this call
+    with metrics.callContext(payload['message']['call']['id']):
+        callType = await asyncio.to_thread(getCallType, payload['message']['call']['id'])
+        formatted_convo = format_conversation(payload['message']['artifact']['messages'][1:])
+        if callType == 'onboarding':
+            log.info("endOfCall.onboarding", sid=sid)
+            result = await handleOnboardingEnd(sid, phone_number, payload, formatted_convo, completed)
+        else:
+            log.info("endOfCall.task", sid=sid)
+            result = await handleTaskEnd(phone_number, payload, formatted_convo, completed)
+    return result.timings
+
+
+async def handleOnboardingEnd(sid: str, phone_number: str, payload: dict, formatted_convo: str, completed: dict = None):
+
+    # New graphs start empty, missed days are gap-filled when they're read
+    log.verbose("onboarding.transcript", transcript=formatted_convo)
+
+    def addGraphs(graphs):
+        log.info("onboarding.graphs", count=len(graphs), titles=[graph.get('title') for graph in graphs])
+        return add_graphs(graphs, phone_number)
+
+    def saveUser(userObj):
+        log.debug("onboarding.userObj", userObj=userObj)
+        replace_user_data(phone_number, userObj)
+
+    async def nextCall(nextCallTime, userObj, graphs):
+        return await scheduleNextCall(phone_number, nextCallTime, userObj, graphs)
+
+    if ANALYSIS_MODE == "combined":
+        # One LLM pass gives us graphs, profile and next call time together
+        analysisStages = [
+            Stage("analysis", partial(analyseOnboardingCall, formatted_convo, payload['message']['startedAt'])),
+            pickStage("graphs", "analysis"),
+            pickStage("userObj", "analysis"),
+            pickStage("nextCallTime", "analysis"),
+        ]
+    else:
+        # The three LLM stages only need the transcript so they all start at once,
+        # everything else waits on just the results it uses
+        analysisStages = [
+            Stage("graphs", partial(generateGraphObjects, formatted_convo)),
+            Stage("userObj", partial(getInitialUserObject, formatted_convo)),
+            Stage("nextCallTime", partial(getNextCallTime, formatted_convo, payload['message']['startedAt'])),
+        ]
+
+    result = await runStages(f"onboarding ({ANALYSIS_MODE})", [
+        # through the buffer too, so an older buffered status can't be flushed over it
+        Stage("status", partial(statusBuffer.set, sid, 'completed')),
+        *analysisStages,
+        Stage("addGraphs", addGraphs, deps=("graphs",)),
+        Stage("saveUser", saveUser, deps=("userObj",)),
+        Stage("nextCall", nextCall, deps=("nextCallTime", "userObj", "graphs")),
+    ], completed)
+    result.raiseForErrors()
     
-    deleteCall(payload['message']['call']['id'])
+    await asyncio.to_thread(deleteCall, payload['message']['call']['id'])
+    return result
 
-async def handleTaskEnd(phone_number: str, payload: str, formatted_convo: str):
+async def handleTaskEnd(phone_number: str, payload: str, formatted_convo: str, completed: dict = None):
     
     # Steps to handle Task End:
     # 
     #  1. Update graphs with new data
-    graphs = await UpdateGraphs(formatted_convo, phone_number)
-    
     #  2. Update user object with new data
-    customerData = await updateUserData(formatted_convo, phone_number)
-    
-    #  3. Schedule the next call
-    await setNextCall(phone_number, customerData, formatted_convo, payload['message']['startedAt'], graphs)
+    #  3. Work out when the next call is
+    #  (all three only need the transcript so they run concurrently,
+    #   or come out of one combined LLM pass with ANALYSIS_MODE=combined)
+    #  4. Schedule the next call once its inputs are ready
+    async def nextCall(nextCallTime, customerData, graphs):
+        # George gets the same summaries as /task: latest and recent points and stats, not the full series
+        return await scheduleNextCall(phone_number, nextCallTime, customerData, getLastEntries(graphs))
+
+    if ANALYSIS_MODE == "combined":
+        analysisStages = [
+            Stage("analysis", partial(analyseTaskCall, formatted_convo, phone_number, payload['message']['startedAt'])),
+            pickStage("graphs", "analysis"),
+            pickStage("customerData", "analysis"),
+            pickStage("nextCallTime", "analysis"),
+        ]
+    else:
+        analysisStages = [
+            Stage("graphs", partial(UpdateGraphs, formatted_convo, phone_number)),
+            Stage("customerData", partial(updateUserData, formatted_convo, phone_number)),
+            Stage("nextCallTime", partial(getNextCallTime, formatted_convo, payload['message']['startedAt'])),
+        ]
+
+    result = await runStages(f"task ({ANALYSIS_MODE})", [
+        *analysisStages,
+        Stage("nextCall", nextCall, deps=("nextCallTime", "customerData", "graphs")),
+    ], completed)
+    result.raiseForErrors()
     
-    #  4. Delete the call type
-    deleteCall(payload['message']['call']['id'])
+    #  5. Delete the call type
+    await asyncio.to_thread(deleteCall, payload['message']['call']['id'])
 
-    return 'no lol'
+    return result
+
+@asynccontextmanager
+async def dialing(phone_number: str):
+    """
+    Marks the number as being dialled in the shared state for the length of
+    the block, so two requests for the same user (on any worker) can't both
+    place a call. Raises 409 if another request already is.
+    """
+    key = f"dialing:{phone_number}"
+    owner = uuid.uuid4().hex
+    if not await asyncio.to_thread(sharedState.claim, key, DIAL_MARKER_SECONDS, owner):
+        raise HTTPException(409, "A call to this number is already being placed")
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(sharedState.release, key, owner)
 
 @app.post("/onboarding")
 async def onboarding(req: OnboardRequest):
@@ -143,7 +303,10 @@ async def onboarding(req: OnboardRequest):
     Gets info like who they are, what their goals are,
     what time they want to be called etc.
     """
-    
+    async with dialing(req.phone_number):
+        return await startOnboarding(req)
+
+async def startOnboarding(req: OnboardRequest):
     try:
         resp = supabase.table("user_data") \
                         .select("*") \
@@ -154,15 +317,15 @@ async def onboarding(req: OnboardRequest):
         raise HTTPException(500, f"Supabase request failed: {e}")
     
     if len(resp.data):
-        print("User already onboarded!", resp.data)
+        log.info("onboarding.alreadyOnboarded", phone_number=req.phone_number)
         return {"sid": "OnboardedAlready"}
     
-    print("User not onboarded yet! Making call...")
-    sid = makeOnboardingCall(req.phone_number)
+    log.info("onboarding.calling", phone_number=req.phone_number)
+    sid = await makeOnboardingCall(req.phone_number)
     if not sid:
-        print("Calling failed? No SID")
+        log.error("onboarding.callFailed", phone_number=req.phone_number)
         raise HTTPException(status_code=500, detail="Failed to initiate onboarding call")
-    print("Call sent successfully!", sid)
+    log.info("onboarding.called", sid=sid)
     # build the payload to insert
     session_row = {
         "phone_number": req.phone_number,
@@ -171,7 +334,7 @@ async def onboarding(req: OnboardRequest):
         "user_id": None                     # null until they sign up
     }
 
-    print("Sending info to supabase", session_row)
+    log.debug("onboarding.session", row=session_row)
     # 1) catch any transport/auth errors
     try:
         resp = supabase.table("onboarding_sessions") \
@@ -180,11 +343,9 @@ async def onboarding(req: OnboardRequest):
     except Exception as e:
         # e.g. network failure, auth failure, bad URL, etc.
         raise HTTPException(500, f"Supabase request failed: {e}")
-    print(resp)
     # make sure we got back the inserted row
     if not resp.data or not isinstance(resp.data, list):
         raise HTTPException(500, "No data returned from Supabase after insert")
-    print(resp.data[0])
     # new_session = resp.data[0]  # this is your row, including its `id`, timestamps, etc.
     
     # —————————————————————————
@@ -196,7 +357,6 @@ async def onboarding(req: OnboardRequest):
         "userdata": {},     # start with an empty JSON blob
         "user_id": None     # now allowed to be null
     }
-    print("User data adding:", user_data_row)
     try:
         ud_resp = (
             supabase
@@ -205,31 +365,222 @@ async def onboarding(req: OnboardRequest):
             .execute()
         )
     except Exception as e:
-        print("AHHH FAILED 1", e)
+        log.error("onboarding.userDataFailed", error=e)
         # you might choose to delete new_session here if you want full rollback
         raise HTTPException(500, f"Supabase insert (user_data) failed: {e}")
 
+    invalidateUser(phone_number=req.phone_number)
+
     if not ud_resp.data or not isinstance(ud_resp.data, list):
-        print("AHHH FAILED 2")
+        log.error("onboarding.userDataEmpty", phone_number=req.phone_number)
         raise HTTPException(500, "No data returned after inserting user_data")
     
     return {"sid": sid}
 
+@app.get("/onboarding/{call_sid}/status")
+async def onboardingStatus(call_sid: str = Path(...)):
+    """
+    Status of an onboarding call, including updates not yet written to Supabase.
+    """
+    status = await asyncio.to_thread(statusBuffer.getStatus, call_sid)
+    if status is None:
+        raise HTTPException(404, f"No onboarding session found with call_sid {call_sid}")
+    return {"call_sid": call_sid, "status": status}
+
+@app.get("/status-buffer")
+async def statusBufferStats():
+    """
+    Pending, written, coalesced and dropped counts for the status write-behind buffer.
+    """
+    return statusBuffer.stats()
+
+@app.get("/users/{user_id}/graphs")
+async def userGraphs(user_id: str = Path(...), if_none_match: Optional[str] = Header(None)):
+    """
+    The user's graphs without their points, plus the latest point, point
+    count and stats (streaks, rolling means, best) for each, so the dashboard can lay itself out before
+    asking for the data it actually renders.
+    """
+    try:
+        phone_number, _ = await asyncio.to_thread(getCustomerData, user_id)
+    except RuntimeError:
+        raise HTTPException(404, f"No user found with id {user_id}")
+    graphData = await asyncio.to_thread(getCurrentGraphData, phone_number)
+
+    graphs = []
+    for graph in graphData:
+        graph['stats'] = statsFor(graph)
+        points = graph.pop('data')
+        graph.pop('rollups', None)
+        graph['pointCount'] = len(points)
+        graph['lastEntry'] = points[-1] if points else None
+        graphs.append(graph)
+
+    return cachedJSON({"graphs": graphs}, if_none_match)
+
+@app.get("/graphs/{graph_id}/data")
+async def graphDataRange(
+    graph_id: str = Path(...),
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    resolution: str = Query("raw"),
+    agg: Optional[str] = Query(None),
+    limit: int = Query(500),
+    offset: int = Query(0),
+    fill: bool = Query(False),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    A graph's points between `from` and `to` (YYYY-MM-DD, inclusive),
+    optionally downsampled to day/week/month/year buckets (summed, or
+    averaged for line graphs unless `agg` says otherwise) or with missed
+    days gap-filled (`fill`), and paginated.
+    Responds 304 when the client's ETag still matches.
+    """
+    graph = await asyncio.to_thread(getGraph, graph_id)
+    if not graph:
+        raise HTTPException(404, f"No graph found with id {graph_id}")
+
+    points = graphPoints(graph, parseQueryDate(start, "from"), parseQueryDate(end, "to"), resolution, agg, fill)
+    body = {
+        "graphId": graph_id,
+        "type": graph['type'],
+        "resolution": resolution,
+        **paginate(points, limit, offset),
+    }
+    return cachedJSON(body, if_none_match)
+
+@app.get("/jobs")
+async def jobStats():
+    """
+    Queue depth, worker count and wait/run latency for background jobs.
+    """
+    return jobQueue.stats()
+
+@app.get("/jobs/{job_id}")
+async def jobStatus(job_id: str = Path(...)):
+    job = jobQueue.getJob(job_id)
+    if not job:
+        raise HTTPException(404, f"No job found with id {job_id}")
+    return job.toDict()
+
+@app.get("/cache")
+async def cacheStatus():
+    """
+    Size and hit/miss counters for the user and graph read-through caches.
+    """
+    return cacheStats()
+
+@app.get("/next-call/stats")
+async def nextCallStats():
+    """
+    How often the rule-based next call parser decided on its own
+    versus falling back to the LLM.
+    """
+    return nextCallParser.stats()
+
+@app.get("/scheduler")
+async def schedulerStats():
+    """
+    Backlog, lag, dispatch counts and rate limit tokens of the due-call scheduler.
+    """
+    return callScheduler.stats()
+
+@app.get("/costs")
+async def costTotals():
+    """
+    LLM requests, tokens and estimated spend summed over every worker.
+    """
+    totals = await asyncio.to_thread(sharedState.counters, "llm:")
+    return {key.removeprefix("llm:"): value for key, value in totals.items()}
+
+@app.get("/metrics")
+async def metricsExport():
+    """
+    Prometheus scrape endpoint.
+    """
+    llmTotals.update(await asyncio.to_thread(sharedState.counters, "llm:"))
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/calls/{call_id}")
+async def callMetrics(call_id: str = Path(...)):
+    """
+    LLM tokens, cost and latency and Supabase/Vapi requests for one call, by pipeline stage.
+    """
+    breakdown = metrics.callBreakdown(call_id)
+    if breakdown is None:
+        raise HTTPException(404, f"No metrics recorded for call {call_id}")
+    return breakdown
+
+def requireAdmin(token: Optional[str]):
+    if not profiling.ADMIN_TOKEN:
+        raise HTTPException(404, "Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if token != profiling.ADMIN_TOKEN:
+        raise HTTPException(403, "Invalid admin token")
+
+@app.get("/admin/profiles")
+async def profileList(x_admin_token: Optional[str] = Header(None)):
+    """
+    The most recent request profiles, newest first.
+    """
+    requireAdmin(x_admin_token)
+    return profiling.recent()
+
+@app.get("/admin/profiles/{profile_id}")
+async def profileDetail(profile_id: str = Path(...), x_admin_token: Optional[str] = Header(None)):
+    """
+    Span timings for one profiled request.
+    """
+    requireAdmin(x_admin_token)
+    profile = profiling.getProfile(profile_id)
+    if not profile:
+        raise HTTPException(404, f"No profile found with id {profile_id}")
+    return profile.toDict()
+
+@app.get("/admin/profiles/{profile_id}/collapsed")
+async def profileCollapsed(profile_id: str = Path(...), x_admin_token: Optional[str] = Header(None)):
+    """
+    Wall-clock samples as collapsed stacks, for flamegraph.pl or speedscope.
+    """
+    requireAdmin(x_admin_token)
+    profile = profiling.getProfile(profile_id)
+    if not profile:
+        raise HTTPException(404, f"No profile found with id {profile_id}")
+    return PlainTextResponse(profile.collapsed())
+
 @app.post("/task")
 async def webhook(req: TaskRequest):
-    phone_number, data = getCustomerData(req.userId)
-    graphData = getCurrentGraphData(phone_number)
-    lastEntries = getLastEntries(graphData)
-    makeTaskCall(phone_number, None, data, lastEntries)
+    phone_number, data = await asyncio.to_thread(getCustomerData, req.userId)
+    async with dialing(phone_number):
+        graphData = await asyncio.to_thread(getCurrentGraphData, phone_number)
+        lastEntries = getLastEntries(graphData)
+        if SCHEDULER_ENABLED:
+            # dispatched by the scheduler's next batch instead of right here,
+            # a second submit while it's waiting gets the same call back
+            callId = await callScheduler.schedule(phone_number, None, data, lastEntries)
+            return {"scheduled": callId}
+        await makeTaskCall(phone_number, None, data, lastEntries)
     
 
 
 # ---------- Run Server ----------
 
 if __name__ == "__main__":
+    # WEB_CONCURRENCY > 1 runs that many worker processes. They only agree
+    # on costs, handled events, numbers being dialled or queued and the
+    # scheduler's rate limits with SHARED_STATE=sqlite.
+    # Auto-reload is for development only, opt in with RELOAD=1 (single worker).
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    reload = os.getenv("RELOAD", "false").lower() in ("1", "true", "yes")
+    if workers > 1 and sharedState.kind == "memory":
+        log.warning("server.memorySharedState", workers=workers)
+    if reload and workers > 1:
+        log.warning("server.reloadIgnored", workers=workers)
+        reload = False
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        reload=reload
     )
\ No newline at end of file
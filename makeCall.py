@@ -1,23 +1,21 @@
 from fastapi import HTTPException
-import requests
+import asyncio
 import os
 import datetime
 import uuid
 from helper import saveCall, getPhoneNumberId
+from vapiClient import vapiClient
+import profiling
+from logger import getLogger
 
+log = getLogger("makeCall")
 
-def makeCall(firstMessage: str, prompt: str, customerNumber: str, scheduledTime: str=None, onboard: bool=False):
-  auth_token: str = os.getenv("VAPI_API_KEY")
+
+@profiling.profiled("makeCall")
+async def makeCall(firstMessage: str, prompt: str, customerNumber: str, scheduledTime: str=None, onboard: bool=False):
   phone_number_id: str = getPhoneNumberId(customerNumber)
   server_url: str = os.getenv("SERVER_URL")
-  print(server_url, auth_token, phone_number_id)
   server_url += '/webhook'
-
-  # Create the header with Authorization token
-  headers = {
-      'Authorization': f'Bearer {auth_token}',
-      'Content-Type': 'application/json',
-  }
   
   assistant = {
     "name": "Billy",
@@ -114,26 +112,26 @@ def makeCall(firstMessage: str, prompt: str, customerNumber: str, scheduledTime:
     body['schedulePlan']['earliestAt'] = scheduledTime
     body['schedulePlan']['latestAt'] = scheduledTime
 
-   # Make the POST request to Vapi to create the phone call
-  response = requests.post(
-      'https://api.vapi.ai/call/phone', headers=headers, json=body)
-
-  # Check if the request was successful and print the response
-  if response.status_code == 201:
-      print('Call created successfully')
-      print(response.json())
-      saveCall(response.json()['id'], 'onboarding' if onboard else 'task', customerNumber)
-      if 'transport' in response.json():
-        return response.json()['transport']['callSid']
+  # Make the POST request to Vapi to create the phone call
+  # (async, pooled and retried on 429/5xx so it doesn't block the event loop)
+  status, response = await vapiClient.createCall(body)
+
+  # Check if the request was successful and log the response
+  if status == 201:
+      log.info("call.created", callId=response['id'], onboard=onboard, scheduledTime=scheduledTime,
+               phoneNumberId=phone_number_id)
+      log.verbose("call.response", response=response)
+      await asyncio.to_thread(saveCall, response['id'], 'onboarding' if onboard else 'task', customerNumber)
+      if 'transport' in response:
+        return response['transport']['callSid']
       else:
-        return response.json()['id']
+        return response['id']
   else:
-      print('Failed to create call')
-      print(response.text)
+      log.error("call.failed", status=status, response=response)
       return None
   
 
-def makeOnboardingCall(customerNumber: str):
+async def makeOnboardingCall(customerNumber: str):
   prompt = f"""
   ## Identity & Purpose
 You are George, the dialogger onboarding agent (dialogger.me).  
@@ -195,11 +193,11 @@ Others tend to:
 - **If they ask about Privacy & Confidentiality:**
 All of what you share is private and encrypted—only you can ever see your dialogger dashboard and journal entries.
 """
-  sid = makeCall('Hey! This is George from dialogger.', prompt, customerNumber, None, True)
+  sid = await makeCall('Hey! This is George from dialogger.', prompt, customerNumber, None, True)
   return sid
 
 
-def makeTaskCall(customerNumber: str, scheduledTime: str=None, customerData: dict={}, dataToCollect: dict={}):  
+async def makeTaskCall(customerNumber: str, scheduledTime: str=None, customerData: dict={}, dataToCollect: dict={}):  
   prompt = f"""
 ## Identity & Purpose
 You are George, the “check-in agent” for dialogger. 
@@ -212,6 +210,8 @@ You are calling the following user today (this is data from previous calls with
 {customerData}
 casually ask about their day and collect info for what they want to track on their dashboard:
 {dataToCollect}
+Each item has `stats` (current and longest streak in days, 7 and 30 day averages, their best value and days since they last logged it).
+If it fits naturally, celebrate a streak or a new best ("that's six days in a row!"), don't read the numbers out as a list.
 ## Voice & Persona
 ### Personality
 - Warm and enthusiastic, 
@@ -245,5 +245,5 @@ If they choose a new time:
 - **Typical check-in** duration: 3-5 minutes.
 - **at the end of the call** use the hang up function.
 """
-  sid = makeCall('Hey! This is George from dialogger.', prompt, customerNumber, scheduledTime)
+  sid = await makeCall('Hey! This is George from dialogger.', prompt, customerNumber, scheduledTime)
   return sid
\ No newline at end of file
@@ -0,0 +1,320 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import profiling
+
+# Process-wide metrics registry rendered in the Prometheus text format at
+# /metrics, plus a per-call breakdown (by Vapi call id and pipeline stage)
+# of LLM tokens, cost and latency and Supabase/Vapi request counts.
+
+currentCallId = contextvars.ContextVar("currentCallId", default=None)
+currentStage = contextvars.ContextVar("currentStage", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _labelText(labelnames: tuple, values: tuple) -> str:
+    if not labelnames:
+        return ""
+    pairs = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """
+    A gauge whose value is read from `func` when metrics are collected.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func):
+        super().__init__(name, help)
+        self.func = func
+
+    def samples(self):
+        return [(self.name, (), self.func())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((self.name + "_bucket", key + (_number(bound),), count))
+                samples.append((self.name + "_sum", key, total))
+                samples.append((self.name + "_count", key, counts[-1]))
+        return samples
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                labelnames = metric.labelnames
+                if name.endswith("_bucket"):
+                    labelnames = labelnames + ("le",)
+                lines.append(f"{name}{_labelText(labelnames, key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+llmRequests = registry.register(Counter("llm_requests_total", "OpenAI chat completion requests", ("stage", "status")))
+llmTokens = registry.register(Counter("llm_tokens_total", "OpenAI tokens used", ("stage", "kind")))
+llmCost = registry.register(Counter("llm_cost_usd_total", "Estimated OpenAI spend in USD", ("stage",)))
+llmSeconds = registry.register(Histogram("llm_request_seconds", "OpenAI request latency", ("stage",)))
+llmFirstItemSeconds = registry.register(Histogram("llm_first_item_seconds", "Time to the first parsed item of a streamed response", ("stage",)))
+supabaseRequests = registry.register(Counter("supabase_requests_total", "Supabase requests", ("operation", "status")))
+supabaseSeconds = registry.register(Histogram("supabase_request_seconds", "Supabase request latency", ("operation",)))
+vapiRequests = registry.register(Counter("vapi_requests_total", "Vapi API requests (including retries)", ("method", "path", "status")))
+vapiSeconds = registry.register(Histogram("vapi_request_seconds", "Vapi API request latency", ("method", "path")))
+stageSeconds = registry.register(Histogram("pipeline_stage_seconds", "End-of-call pipeline stage latency", ("pipeline", "stage", "status")))
+pipelineSeconds = registry.register(Histogram("pipeline_seconds", "End-of-call pipeline latency", ("pipeline", "status")))
+schedulerDispatched = registry.register(Counter("scheduler_dispatched_total", "Due calls sent to Vapi by the scheduler", ("status",)))
+schedulerThrottled = registry.register(Counter("scheduler_throttled_total", "Due calls held back by their phone number's rate limit", ("phone_id",)))
+schedulerLagSeconds = registry.register(Histogram("scheduler_lag_seconds", "How long after its dispatch time a due call was sent"))
+
+
+# ---------- Per call breakdown ----------
+
+_callsLock = threading.Lock()
+_calls = OrderedDict()
+MAX_TRACKED_CALLS = 500
+
+
+def _emptyStage() -> dict:
+    return {
+        "llmRequests": 0, "promptTokens": 0, "completionTokens": 0, "costUsd": 0.0, "llmSeconds": 0.0,
+        "supabaseRequests": 0, "supabaseSeconds": 0.0, "vapiRequests": 0, "vapiSeconds": 0.0,
+    }
+
+
+def _addToCall(**amounts):
+    callId = currentCallId.get()
+    if not callId:
+        return
+    stage = currentStage.get() or "other"
+    with _callsLock:
+        stages = _calls.get(callId)
+        if stages is None:
+            stages = _calls[callId] = {}
+            while len(_calls) > MAX_TRACKED_CALLS:
+                _calls.popitem(last=False)
+        totals = stages.setdefault(stage, _emptyStage())
+        for key, amount in amounts.items():
+            totals[key] += amount
+
+
+def callBreakdown(callId: str):
+    with _callsLock:
+        stages = _calls.get(callId)
+        if stages is None:
+            return None
+        stages = {stage: dict(totals) for stage, totals in stages.items()}
+    total = _emptyStage()
+    for totals in stages.values():
+        for key, amount in totals.items():
+            total[key] += amount
+    return {"callId": callId, "stages": stages, "total": total}
+
+
+@contextmanager
+def callContext(callId: str):
+    """
+    Attributes everything recorded inside the block to this Vapi call.
+    """
+    token = currentCallId.set(callId)
+    try:
+        yield
+    finally:
+        currentCallId.reset(token)
+
+
+# ---------- Recording ----------
+
+def recordLLM(seconds: float, usage: dict = None, cost: float = 0.0, status: str = "ok"):
+    stage = currentStage.get() or "other"
+    llmRequests.inc(stage=stage, status=status)
+    llmSeconds.observe(seconds, stage=stage)
+    promptTokens = completionTokens = 0
+    if usage:
+        promptTokens = usage.get('prompt_tokens', 0)
+        completionTokens = usage.get('completion_tokens', 0)
+        llmTokens.inc(promptTokens, stage=stage, kind="prompt")
+        llmTokens.inc(completionTokens, stage=stage, kind="completion")
+        llmCost.inc(cost, stage=stage)
+    _addToCall(llmRequests=1, promptTokens=promptTokens, completionTokens=completionTokens,
+               costUsd=cost, llmSeconds=seconds)
+
+
+def recordFirstItem(seconds: float):
+    llmFirstItemSeconds.observe(seconds, stage=currentStage.get() or "other")
+
+
+def recordVapi(method: str, path: str, status, seconds: float):
+    vapiRequests.inc(method=method, path=path, status=status)
+    vapiSeconds.observe(seconds, method=method, path=path)
+    _addToCall(vapiRequests=1, vapiSeconds=seconds)
+
+
+def recordStage(pipeline: str, stage: str, seconds: float, ok: bool):
+    stageSeconds.observe(seconds, pipeline=pipeline, stage=stage, status="ok" if ok else "error")
+
+
+def recordPipeline(pipeline: str, seconds: float, ok: bool):
+    pipelineSeconds.observe(seconds, pipeline=pipeline, status="ok" if ok else "error")
+
+
+def recordDispatch(status: str, lagSeconds: float):
+    schedulerDispatched.inc(status=status)
+    schedulerLagSeconds.observe(max(lagSeconds, 0.0))
+
+
+QUERY_ACTIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+def _executeSupabase(operation: str, execute, *args, **kwargs):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        with profiling.span(f"supabase:{operation}", blocking=True):
+            return execute(*args, **kwargs)
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        supabaseRequests.inc(operation=operation, status=status)
+        supabaseSeconds.observe(seconds, operation=operation)
+        _addToCall(supabaseRequests=1, supabaseSeconds=seconds)
+
+
+class _InstrumentedQuery:
+    """
+    A supabase-py query or RPC builder whose execute() is counted and timed
+    as one request, labelled "<table>.<action>" or "rpc.<function>".
+    Everything else is passed through, re-wrapping the builders it returns.
+    """
+
+    __slots__ = ("_builder", "_table", "_operation")
+
+    def __init__(self, builder, table: str, operation: str):
+        self._builder = builder
+        self._table = table
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            return functools.partial(_executeSupabase, self._operation, attr)
+        if not callable(attr):
+            return self._wrap(attr, self._operation)
+        operation = f"{self._table}.{name}" if self._table and name in QUERY_ACTIONS else self._operation
+
+        def call(*args, **kwargs):
+            return self._wrap(attr(*args, **kwargs), operation)
+        return call
+
+    def _wrap(self, result, operation: str):
+        if result is self._builder or hasattr(result, "execute"):
+            return _InstrumentedQuery(result, self._table, operation)
+        return result
+
+
+class _InstrumentedClient:
+    """
+    Wraps a supabase-py client so every request made through table()/from_()
+    or rpc() is counted and timed, however many a helper makes.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _InstrumentedQuery(self._client.table(name), name, f"{name}.select")
+
+    from_ = table
+
+    def rpc(self, fn: str, *args, **kwargs):
+        return _InstrumentedQuery(self._client.rpc(fn, *args, **kwargs), None, f"rpc.{fn}")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrumentClient(client):
+    """
+    The Supabase client with per-request metrics, per-call counts and
+    profiling spans.
+    """
+    return _InstrumentedClient(client)
+
+
+def render() -> str:
+    return registry.render()
@@ -0,0 +1,13 @@
+-- Append-only storage for graph points.
+-- graph_data.data keeps any points written before this table existed;
+-- every new point is a row here so an update only sends what's new.
+create table if not exists graph_entries (
+    id          bigint generated always as identity primary key,
+    graph_id    uuid not null references graphs(id) on delete cascade,
+    entry_date  date not null,
+    value       double precision not null,
+    created_at  timestamptz not null default now()
+);
+
+create index if not exists graph_entries_graph_id_entry_date_idx
+    on graph_entries (graph_id, entry_date);
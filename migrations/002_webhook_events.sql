@@ -0,0 +1,7 @@
+-- Persistent idempotency store for Vapi webhook events (IDEMPOTENCY_STORE=supabase).
+-- key is "<call id>:<event type>"; the primary key makes claiming a key atomic.
+create table if not exists webhook_events (
+    key         text primary key,
+    status      text not null default 'processing',
+    created_at  timestamptz not null default now()
+);
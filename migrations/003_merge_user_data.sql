@@ -0,0 +1,45 @@
+-- Partial profile updates. updateUserData sends a JSON merge patch
+-- (RFC 7396) and the database applies it, so only what changed goes
+-- over the wire: objects are merged recursively, null removes a key,
+-- anything else replaces the old value.
+create or replace function jsonb_merge_patch(target jsonb, patch jsonb)
+returns jsonb
+language plpgsql
+immutable
+as $$
+declare
+    patch_key   text;
+    patch_value jsonb;
+    result      jsonb;
+begin
+    if jsonb_typeof(patch) is distinct from 'object' then
+        return patch;
+    end if;
+
+    if target is null or jsonb_typeof(target) <> 'object' then
+        result := '{}'::jsonb;
+    else
+        result := target;
+    end if;
+
+    for patch_key, patch_value in select * from jsonb_each(patch) loop
+        if jsonb_typeof(patch_value) = 'null' then
+            result := result - patch_key;
+        else
+            result := jsonb_set(result, array[patch_key], jsonb_merge_patch(result -> patch_key, patch_value));
+        end if;
+    end loop;
+
+    return result;
+end;
+$$;
+
+create or replace function merge_user_data(p_phone_number text, p_patch jsonb)
+returns jsonb
+language sql
+as $$
+    update user_data
+       set userdata = jsonb_merge_patch(coalesce(userdata, '{}'::jsonb), p_patch)
+     where phone_number = p_phone_number
+    returning userdata;
+$$;
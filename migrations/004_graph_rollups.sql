@@ -0,0 +1,3 @@
+-- Weekly/monthly/yearly aggregates (sum, count, min, max, mean) per graph,
+-- maintained incrementally as entries are appended. See rollups.py.
+alter table graph_data add column if not exists rollups jsonb;
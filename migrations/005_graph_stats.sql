@@ -0,0 +1,3 @@
+-- Streaks, 7/30-day rolling means, best value and last entry day per graph,
+-- maintained incrementally as entries are appended. See graphStats.py.
+alter table graph_data add column if not exists stats jsonb;
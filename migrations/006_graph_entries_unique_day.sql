@@ -0,0 +1,14 @@
+-- One value per graph per day. Points are upserted on (graph_id, entry_date),
+-- so writing the same entries again (a retried end-of-call job) replaces
+-- them instead of adding rows. Existing duplicates keep their latest row.
+delete from graph_entries older
+ using graph_entries newer
+ where older.graph_id = newer.graph_id
+   and older.entry_date = newer.entry_date
+   and older.id < newer.id;
+
+alter table graph_entries
+    add constraint graph_entries_graph_id_entry_date_key unique (graph_id, entry_date);
+
+-- the unique constraint's index covers the same lookups
+drop index if exists graph_entries_graph_id_entry_date_idx;
@@ -0,0 +1,31 @@
+-- Saves an end-of-call's graph points and the aggregates built from them
+-- in one round trip and one transaction (helper.saveGraphEntries).
+--   p_entries:    [{"graph_id", "entry_date": "YYYY-MM-DD", "value"}, ...],
+--                 upserted on the one row per graph per day key
+--   p_graph_data: {"<graph_id>": {"rollups": {...}, "stats": {...}}, ...},
+--                 either key can be left out to keep the stored value
+-- Returns the number of graph_entries rows written.
+create or replace function save_graph_entries(p_entries jsonb, p_graph_data jsonb)
+returns integer
+language plpgsql
+as $$
+declare
+    written integer;
+begin
+    insert into graph_entries (graph_id, entry_date, value)
+    select (entry ->> 'graph_id')::uuid,
+           (entry ->> 'entry_date')::date,
+           (entry ->> 'value')::double precision
+      from jsonb_array_elements(coalesce(p_entries, '[]'::jsonb)) as entry
+        on conflict (graph_id, entry_date) do update set value = excluded.value;
+    get diagnostics written = row_count;
+
+    update graph_data
+       set rollups = coalesce(changed.value -> 'rollups', graph_data.rollups),
+           stats   = coalesce(changed.value -> 'stats', graph_data.stats)
+      from jsonb_each(coalesce(p_graph_data, '{}'::jsonb)) as changed
+     where graph_data.graph_id = changed.key::uuid;
+
+    return written;
+end;
+$$;
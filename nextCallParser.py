@@ -0,0 +1,207 @@
+import re
+import threading
+from datetime import datetime, timedelta
+
+# Rule-based fast path for working out when the next call is.
+# Only handles phrasings we can be sure about, anything else is left
+# for the LLM by returning an "ambiguous" result.
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+NO_CALL_PATTERNS = [
+    r"\bdon'?t (?:need to |have to )?call me\b",
+    r"\bdo not call me\b",
+    r"\bstop calling\b",
+    r"\bno more calls\b",
+    r"\bdon'?t (?:need|want) (?:a|another|any) calls?\b",
+]
+
+SAME_TIME_PATTERN = r"\bsame time\b"
+TOMORROW_PATTERN = r"\btomorrow\b"
+TODAY_PATTERN = r"\b(?:today|tonight|this (?:evening|afternoon|morning))\b"
+WEEKDAY_PATTERN = r"\b(" + "|".join(WEEKDAYS) + r")s?\b"
+# "7pm", "7 pm", "7:30pm", "7.30 p.m.", "at 19:00"
+CLOCK_PATTERN = r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(a\.?m\.?|p\.?m\.?)(?![a-z])|\bat (\d{1,2})[:.](\d{2})\b"
+NOON_PATTERN = r"\b(?:noon|midday)\b"
+
+# A question from George about the next call. It has to use a scheduling
+# phrasing and end in "?" in the same sentence, so confirmations like "talk
+# to you tomorrow then!" or "how was your time at the beach?" don't count
+SCHEDULING_QUESTION = (
+    r"\b(?:call you|calling you|what time|when should|when (?:would|do|can) you|when's good|"
+    r"same time|different (?:time|slot)|another (?:time|slot)|next call)\b[^?.!]*\?"
+)
+# Once the times and days we understand are taken out, the user's answer
+# may only have these words left. Anything else (a negation, "except",
+# "skip", "away", a number) means it says something we don't parse.
+ANSWER_WORDS = {
+    "yes", "yeah", "yep", "yup", "ya", "sure", "ok", "okay", "alright", "cool", "sounds", "good",
+    "great", "perfect", "fine", "works", "that", "that's", "is", "be", "would", "will", "please",
+    "thanks", "thank", "cheers", "you", "george", "at", "on", "for", "the", "then", "bye", "see",
+    "talk", "to", "soon",
+}
+ANSWER_TOKEN = r"[a-z']+|\d+"
+
+_statsLock = threading.Lock()
+fastPathStats = {"parsed": 0, "noCall": 0, "fallbacks": 0}
+
+
+class NextCallResult:
+    """
+    kind is "time" (with `when` as a naive GMT+10 datetime),
+    "none" (the user doesn't want a call) or "ambiguous" (ask the LLM).
+    """
+
+    def __init__(self, kind: str, when: datetime = None, reason: str = ""):
+        self.kind = kind
+        self.when = when
+        self.reason = reason
+
+    @property
+    def decided(self) -> bool:
+        return self.kind != "ambiguous"
+
+    def __repr__(self):
+        return f"NextCallResult({self.kind}, {self.when}, {self.reason!r})"
+
+
+def _split(transcription: str):
+    """
+    Returns the user's answers to the last time George asked about the next
+    call, George's lines from that question on, and the user's lines before
+    it. Returns (None, None, None) if George never asked.
+    """
+    lines = []
+    for line in transcription.splitlines():
+        role, _, text = line.partition(":")
+        lines.append((role.strip().lower(), text.strip().lower().replace("’", "'")))
+
+    questionIndex = None
+    for index, (role, text) in enumerate(lines):
+        if role != "user" and re.search(SCHEDULING_QUESTION, text):
+            questionIndex = index
+    if questionIndex is None:
+        return None, None, None
+
+    userLines = [text for role, text in lines[questionIndex:] if role == "user"]
+    botLines = [text for role, text in lines[questionIndex:] if role != "user"]
+    earlierUserLines = [text for role, text in lines[:questionIndex] if role == "user"]
+    return userLines, botLines, earlierUserLines
+
+
+def _clockTimes(text: str) -> list:
+    times = []
+    for match in re.finditer(CLOCK_PATTERN, text):
+        if match.group(3):
+            hour, minute = int(match.group(1)), int(match.group(2) or 0)
+            if not 1 <= hour <= 12 or minute > 59:
+                continue
+            hour = hour % 12 + (12 if match.group(3).startswith("p") else 0)
+        else:
+            hour, minute = int(match.group(4)), int(match.group(5))
+            if hour > 23 or minute > 59:
+                continue
+        times.append((hour, minute))
+    if re.search(NOON_PATTERN, text):
+        times.append((12, 0))
+    return times
+
+
+def _mentions(text: str) -> dict:
+    return {
+        "noCall": any(re.search(pattern, text) for pattern in NO_CALL_PATTERNS),
+        "sameTime": bool(re.search(SAME_TIME_PATTERN, text)),
+        "tomorrow": bool(re.search(TOMORROW_PATTERN, text)),
+        "today": bool(re.search(TODAY_PATTERN, text)),
+        "weekdays": set(match.group(1) for match in re.finditer(WEEKDAY_PATTERN, text)),
+        "times": set(_clockTimes(text)),
+    }
+
+
+def _hasTimeExpression(mentions: dict) -> bool:
+    return bool(mentions["sameTime"] or mentions["tomorrow"] or mentions["today"] or mentions["weekdays"] or mentions["times"])
+
+
+def parseNextCall(transcription: str, callTime: datetime) -> NextCallResult:
+    """
+    Works out the next call time from the user's side of the transcript.
+    `callTime` is when this call started, as a naive GMT+10 datetime.
+    """
+    if not any(line.lower().startswith("user:") for line in transcription.splitlines()):
+        return NextCallResult("ambiguous", reason="no user lines, maybe voicemail")
+
+    userLines, botLines, earlierUserLines = _split(transcription)
+    if userLines is None:
+        return NextCallResult("ambiguous", reason="next call never came up")
+    if not userLines:
+        return NextCallResult("ambiguous", reason="no answer about the next call")
+    # The user may have said when they want the call before George asked. Only clock
+    # times and "same time" count here, "today" or "this morning" is usually just news
+    earlier = _mentions("\n".join(earlierUserLines))
+    if earlier["times"] or earlier["sameTime"]:
+        return NextCallResult("ambiguous", reason="time mentioned before the question")
+
+    userText = "\n".join(userLines)
+    user = _mentions(userText)
+    bot = _mentions("\n".join(botLines))
+
+    if user["noCall"]:
+        if _hasTimeExpression(user):
+            return NextCallResult("ambiguous", reason="no call mixed with a time")
+        return NextCallResult("none", reason="user asked not to be called")
+
+    # If George suggested a specific slot the user may have just said "yeah"
+    if bot["times"] or bot["weekdays"] or bot["today"]:
+        return NextCallResult("ambiguous", reason="assistant proposed a specific time")
+
+    if len(user["times"]) > 1 or len(user["weekdays"]) > 1:
+        return NextCallResult("ambiguous", reason="several times mentioned")
+    if user["times"] and user["sameTime"]:
+        return NextCallResult("ambiguous", reason="same time and a new time mentioned")
+    if sum([user["tomorrow"], user["today"], bool(user["weekdays"])]) > 1:
+        return NextCallResult("ambiguous", reason="several days mentioned")
+
+    unparsedText = userText
+    for pattern in [SAME_TIME_PATTERN, CLOCK_PATTERN, NOON_PATTERN, TOMORROW_PATTERN, TODAY_PATTERN, WEEKDAY_PATTERN]:
+        unparsedText = re.sub(pattern, " ", unparsedText)
+    if any(word not in ANSWER_WORDS for word in re.findall(ANSWER_TOKEN, unparsedText)):
+        return NextCallResult("ambiguous", reason="answer has words we don't parse")
+
+    # Day: tomorrow unless they said otherwise
+    day = callTime.date() + timedelta(days=1)
+    if user["today"]:
+        day = callTime.date()
+    elif user["weekdays"]:
+        target = WEEKDAYS.index(next(iter(user["weekdays"])))
+        daysAhead = (target - callTime.weekday()) % 7 or 7
+        day = callTime.date() + timedelta(days=daysAhead)
+
+    # Time: same time unless they gave a clock time
+    hour, minute, second = callTime.hour, callTime.minute, callTime.second
+    if user["times"]:
+        hour, minute = next(iter(user["times"]))
+        second = 0
+
+    when = datetime(day.year, day.month, day.day, hour, minute, second)
+    if when <= callTime:
+        return NextCallResult("ambiguous", reason="parsed time is in the past")
+
+    return NextCallResult("time", when=when, reason="parsed")
+
+
+def recordResult(result: NextCallResult):
+    with _statsLock:
+        if result.kind == "time":
+            fastPathStats["parsed"] += 1
+        elif result.kind == "none":
+            fastPathStats["noCall"] += 1
+        else:
+            fastPathStats["fallbacks"] += 1
+
+
+def stats() -> dict:
+    with _statsLock:
+        counts = dict(fastPathStats)
+    total = sum(counts.values())
+    hits = counts["parsed"] + counts["noCall"]
+    return {**counts, "total": total, "hitRate": hits / total if total else None}
@@ -0,0 +1,147 @@
+import asyncio
+import inspect
+import time
+import metrics
+import profiling
+from logger import getLogger
+
+log = getLogger("pipeline")
+
+
+class Stage:
+    """
+    One step of a pipeline. `func` is called with the results of the
+    stages named in `deps` as keyword arguments. Sync functions are run
+    in a thread so blocking Supabase calls don't hold up the event loop.
+    """
+
+    def __init__(self, name: str, func, deps: tuple = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+def pickStage(name: str, dep: str, key: str = None) -> Stage:
+    """
+    A stage that just exposes `key` (defaults to `name`) of a dict returned
+    by the `dep` stage, so later stages don't care where a value came from.
+    """
+    key = key or name
+
+    async def pick(**kwargs):
+        return kwargs[dep][key]
+
+    return Stage(name, pick, deps=(dep,))
+
+
+class StageSkipped(RuntimeError):
+    pass
+
+
+class PipelineError(RuntimeError):
+    def __init__(self, name: str, errors: dict):
+        self.errors = errors
+        details = ", ".join(f"{stage}: {error!r}" for stage, error in errors.items())
+        super().__init__(f"Pipeline {name} had failing stages ({details})")
+
+
+class PipelineResult:
+    def __init__(self, name: str):
+        self.name = name
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+        self.totalSeconds = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def raiseForErrors(self):
+        if self.errors:
+            raise PipelineError(self.name, self.errors)
+
+    def report(self) -> str:
+        lines = [f"Pipeline {self.name} finished in {self.totalSeconds:.2f}s"]
+        for stageName, timing in self.timings.items():
+            status = "failed" if stageName in self.errors else "ok"
+            lines.append(
+                f"  {stageName:<16} start +{timing['start']:.2f}s  took {timing['seconds']:.2f}s  {status}"
+            )
+        for stageName, error in self.errors.items():
+            if isinstance(error, StageSkipped):
+                lines.append(f"  {stageName:<16} skipped ({error})")
+        return "\n".join(lines)
+
+
+async def runStages(name: str, stages: list, completed: dict = None) -> PipelineResult:
+    """
+    Run `stages` as a dependency graph. Every stage starts as soon as the
+    stages it depends on have finished, so independent stages run
+    concurrently. A failing stage only skips the stages that depend on it.
+    Stages must be listed after the stages they depend on.
+
+    `completed` maps stage names to results from an earlier run of the same
+    pipeline. Those stages aren't run again, and every stage that succeeds
+    is added to it, so passing the same dict to a retry only re-runs the
+    stages that failed or were skipped.
+    """
+    result = PipelineResult(name)
+    tasks = {}
+    pipelineStart = time.perf_counter()
+
+    async def run(stage: Stage):
+        if completed is not None and stage.name in completed:
+            result.results[stage.name] = completed[stage.name]
+            return True, completed[stage.name]
+
+        kwargs = {}
+        for dep in stage.deps:
+            ok, value = await tasks[dep]
+            if not ok:
+                result.errors[stage.name] = StageSkipped(f"dependency {dep} failed")
+                return False, None
+            kwargs[dep] = value
+
+        # each stage runs in its own task, so this only labels this stage's LLM/DB calls
+        metrics.currentStage.set(stage.name)
+        profiling.trackTask(f"stage:{stage.name}")
+        stageStart = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(stage.func):
+                value = await stage.func(**kwargs)
+            else:
+                value = await asyncio.to_thread(stage.func, **kwargs)
+        except Exception as e:
+            result.errors[stage.name] = e
+            return False, None
+        finally:
+            result.timings[stage.name] = {
+                "start": stageStart - pipelineStart,
+                "seconds": time.perf_counter() - stageStart,
+            }
+            metrics.recordStage(name, stage.name, result.timings[stage.name]["seconds"], stage.name not in result.errors)
+
+        result.results[stage.name] = value
+        if completed is not None:
+            completed[stage.name] = value
+        return True, value
+
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in tasks:
+                raise ValueError(f"Stage {stage.name} depends on unknown or later stage {dep}")
+        tasks[stage.name] = asyncio.create_task(run(stage))
+
+    await asyncio.gather(*tasks.values())
+    result.totalSeconds = time.perf_counter() - pipelineStart
+    metrics.recordPipeline(name, result.totalSeconds, result.ok)
+    log.info(
+        "pipeline.finished",
+        pipeline=name,
+        seconds=round(result.totalSeconds, 3),
+        timings={stageName: round(timing['seconds'], 3) for stageName, timing in result.timings.items()},
+        errors={stageName: repr(error) for stageName, error in result.errors.items()},
+    )
+    log.debug("pipeline.report", report=result.report())
+    return result
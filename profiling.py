@@ -0,0 +1,425 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# On-demand request profiling. A profiled request (X-Profile header matching
+# ADMIN_TOKEN, or picked by PROFILE_SAMPLE_RATE) gets:
+#   - a wall-clock profile: a sampler thread records, every PROFILE_INTERVAL
+#     seconds, the await chain of each of the request's tasks and the full
+#     stack of any thread running one of its spans (Supabase calls run in
+#     worker threads), as collapsed stacks for flamegraph.pl / speedscope
+#   - span timings for askLLM, makeCall and the helper.py Supabase calls
+# Background jobs started with `carry` stay part of the request's profile,
+# which only finishes once they have. Finished profiles are kept in a ring
+# buffer of PROFILE_MAX_RESULTS and served from /admin/profiles.
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_RESULTS = int(os.getenv("PROFILE_MAX_RESULTS", "50"))
+# Admin and scrape endpoints are never profiled
+SKIP_PREFIXES = ("/admin", "/metrics")
+
+currentProfile = contextvars.ContextVar("currentProfile", default=None)
+
+_lock = threading.Lock()
+_active = set()
+_finished = deque(maxlen=PROFILE_MAX_RESULTS)
+_wake = threading.Event()
+_sampler = None
+
+
+class Profile:
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.startedAt = time.time()
+        self._start = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        self.samples = Counter()
+        self.sampleCount = 0
+        self.tasks = {}       # task -> label
+        self.threads = {}     # thread id -> names of the spans open in it, innermost last
+        self.loopThread = None
+        self._holds = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.seconds is not None
+
+    def offset(self) -> float:
+        return time.perf_counter() - self._start
+
+    def hold(self):
+        with _lock:
+            self._holds += 1
+
+    def release(self):
+        with _lock:
+            self._holds -= 1
+            if self._holds > 0 or self.finished:
+                return
+            self.seconds = self.offset()
+            self.tasks.clear()
+            self.threads.clear()
+            _active.discard(self)
+            _finished.append(self)
+
+    def track(self, task: asyncio.Task, label: str):
+        with _lock:
+            if not self.finished:
+                self.tasks[task] = label
+                self.loopThread = threading.get_ident()
+
+    def untrack(self, task: asyncio.Task):
+        with _lock:
+            self.tasks.pop(task, None)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "startedAt": self.startedAt,
+            "seconds": self.seconds,
+            "samples": self.sampleCount,
+            "spans": len(self.spans),
+        }
+
+    def toDict(self) -> dict:
+        spans = sorted(self.spans, key=lambda span: span["start"])
+        totals = {}
+        for span in spans:
+            total = totals.setdefault(span["name"], {"count": 0, "seconds": 0.0})
+            total["count"] += 1
+            total["seconds"] += span["seconds"]
+        return {**self.summary(), "interval": PROFILE_INTERVAL, "spanTotals": totals, "spans": spans}
+
+    def collapsed(self) -> str:
+        """
+        One "frame;frame;frame count" line per distinct stack, the input
+        format for flamegraph.pl and speedscope.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+# ---------- Starting and carrying profiles ----------
+
+def shouldProfile(header: str = None) -> bool:
+    if header and ADMIN_TOKEN and header == ADMIN_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def start(name: str) -> Profile:
+    """
+    Starts a profile in the current context and tracks the current task.
+    Call release() on it when the request is done.
+    """
+    profile = Profile(name)
+    profile.hold()
+    with _lock:
+        _active.add(profile)
+    currentProfile.set(profile)
+    trackTask(name)
+    _ensureSampler()
+    return profile
+
+
+def trackTask(label: str):
+    """
+    Adds the current task to the current profile's samples, for work that
+    runs in its own task (pipeline stages, background jobs).
+    """
+    profile = currentProfile.get()
+    if profile is None:
+        return
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return
+    if task is not None:
+        profile.track(task, label)
+
+
+def carry(func, label: str = None):
+    """
+    Wraps an async function so it runs under the current profile even when
+    it's awaited later by something else (like a job queue worker). The
+    profile isn't finished until the wrapped function has run, or until
+    `cancel` is called on it if it never will be.
+    """
+    profile = currentProfile.get()
+    if profile is None:
+        return func
+    profile.hold()
+    label = label or getattr(func, "__name__", "job")
+    released = False
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        nonlocal released
+        if released:
+            # a retry after the profile finished
+            return await func(*args, **kwargs)
+        token = currentProfile.set(profile)
+        trackTask(label)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            # the task (e.g. a queue worker) outlives the job
+            profile.untrack(asyncio.current_task())
+            currentProfile.reset(token)
+            released = True
+            profile.release()
+
+    def cancelHold():
+        nonlocal released
+        if not released:
+            released = True
+            profile.release()
+
+    wrapper.cancel = cancelHold
+    return wrapper
+
+
+def cancel(carried):
+    """
+    Lets the profile finish without the function `carry` wrapped, e.g. when
+    the job couldn't be queued. A no-op for functions that weren't carried.
+    """
+    cancelHold = getattr(carried, "cancel", None)
+    if cancelHold:
+        cancelHold()
+
+
+# ---------- Spans ----------
+
+def _recordSpan(profile: Profile, name: str, start: float, error: bool, where: str):
+    profile.spans.append({
+        "name": name,
+        "start": round(start, 6),
+        "seconds": round(profile.offset() - start, 6),
+        "error": error,
+        "where": where,
+    })
+
+
+@contextmanager
+def span(name: str, blocking: bool = False):
+    """
+    Times the block under the current profile. Pass blocking=True for sync
+    code: its thread (worker or event loop) is sampled while the block runs.
+    """
+    profile = currentProfile.get()
+    if profile is None or profile.finished:
+        yield
+        return
+
+    threadId = threading.get_ident()
+    sampleThread = blocking or not _inEventLoop()
+    if sampleThread:
+        with _lock:
+            profile.threads.setdefault(threadId, []).append(name)
+    start = profile.offset()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        if sampleThread:
+            with _lock:
+                openSpans = profile.threads.get(threadId)
+                if openSpans:
+                    openSpans.pop()
+                    if not openSpans:
+                        del profile.threads[threadId]
+        _recordSpan(profile, name, start, error, "thread" if sampleThread else "task")
+
+
+def profiled(name: str = None):
+    """
+    Decorator form of span() for sync and async functions.
+    """
+    def decorator(func):
+        spanName = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def asyncWrapper(*args, **kwargs):
+                with span(spanName):
+                    return await func(*args, **kwargs)
+            return asyncWrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(spanName, blocking=True):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _inEventLoop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+# ---------- Sampling ----------
+
+def _frameName(frame) -> str:
+    fileName = os.path.basename(frame.f_code.co_filename)
+    return f"{frame.f_code.co_name} ({fileName}:{frame.f_lineno})"
+
+
+def _threadStack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(_frameName(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _awaitStack(task: asyncio.Task, loopFrame) -> list:
+    """
+    The chain of coroutines the task is suspended in, outermost first,
+    ending with what it's waiting on. If the task is the one running on
+    the loop right now, the loop thread's frames below it are added.
+    """
+    stack = []
+    awaitable = task.get_coro()
+    innermost = None
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) \
+            or getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            if not inspect.iscoroutine(awaitable):
+                stack.append(f"<{type(awaitable).__name__}>")
+            break
+        stack.append(_frameName(frame))
+        innermost = frame
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) \
+            or getattr(awaitable, "ag_await", None)
+
+    if awaitable is None and innermost is not None and loopFrame is not None:
+        running = []
+        frame = loopFrame
+        while frame is not None and frame is not innermost:
+            running.append(_frameName(frame))
+            frame = frame.f_back
+        if frame is innermost:
+            stack.extend(reversed(running))
+    return stack
+
+
+def _sample():
+    frames = sys._current_frames()
+    with _lock:
+        profiles = [
+            (profile, list(profile.tasks.items()), [(threadId, spans[0]) for threadId, spans in profile.threads.items()])
+            for profile in _active
+        ]
+
+    for profile, tasks, threads in profiles:
+        stacks = []
+        for task, label in tasks:
+            if task.done():
+                continue
+            try:
+                stacks.append([f"task:{label}"] + _awaitStack(task, frames.get(profile.loopThread)))
+            except Exception:
+                # the loop can move the task on mid-walk, skip this sample
+                continue
+        for threadId, spanName in threads:
+            frame = frames.get(threadId)
+            # blocking spans on the loop thread already show up under their task
+            if frame is not None and threadId != profile.loopThread:
+                stacks.append([f"thread:{spanName}"] + _threadStack(frame))
+
+        with _lock:
+            profile.sampleCount += 1
+            for stack in stacks:
+                profile.samples[";".join(stack)] += 1
+
+
+def _samplerLoop():
+    while True:
+        _wake.wait()
+        while True:
+            with _lock:
+                if not _active:
+                    _wake.clear()
+                    break
+            _sample()
+            time.sleep(PROFILE_INTERVAL)
+
+
+def _ensureSampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_samplerLoop, name="profiler", daemon=True)
+            _sampler.start()
+    _wake.set()
+
+
+# ---------- Results ----------
+
+def recent() -> list:
+    with _lock:
+        return [profile.summary() for profile in reversed(_finished)]
+
+
+def getProfile(profileId: str):
+    with _lock:
+        for profile in _finished:
+            if profile.id == profileId:
+                return profile
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles requests picked by shouldProfile() and
+    returns the profile id in an X-Profile-Id header. Written as plain ASGI
+    (not BaseHTTPMiddleware) so the route runs in the task being tracked.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        header = dict(scope["headers"]).get(b"x-profile")
+        if not shouldProfile(header.decode() if header else None):
+            return await self.app(scope, receive, send)
+
+        profile = start(f"{scope['method']} {scope['path']}")
+
+        async def sendWithProfileId(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendWithProfileId)
+        finally:
+            currentProfile.set(None)
+            profile.release()
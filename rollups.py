@@ -0,0 +1,172 @@
+import copy
+from datetime import datetime, timedelta
+
+# Weekly/monthly/yearly aggregates for a graph's points, kept up to date as
+# entries are appended so nothing has to re-aggregate the full history.
+#
+# Shape (stored in graph_data.rollups):
+# {
+#     "week":  {"2025-W20": {"sum": 12, "count": 3, "min": 2, "max": 6, "mean": 4}},
+#     "month": {"2025-05":  {...}},
+#     "year":  {"2025":     {...}},
+# }
+
+RESOLUTIONS = ("week", "month", "year")
+
+
+def parseDate(date: str) -> datetime:
+    return datetime.strptime(date, "%d/%m/%Y")
+
+
+def bucketKey(date: datetime, resolution: str) -> str:
+    if resolution == "day":
+        return date.strftime("%Y-%m-%d")
+    if resolution == "week":
+        year, week, _ = date.isocalendar()
+        return f"{year}-W{week:02d}"
+    if resolution == "month":
+        return date.strftime("%Y-%m")
+    if resolution == "year":
+        return date.strftime("%Y")
+    raise ValueError(f"Unknown resolution {resolution}")
+
+
+def periodRange(key: str, resolution: str):
+    """
+    The first and last day (datetimes) of the bucket `bucketKey` named
+    `key`. Raises ValueError for a key it can't read.
+    """
+    if resolution == "week":
+        year, week = key.split("-W")
+        first = datetime.fromisocalendar(int(year), int(week), 1)
+        return first, first + timedelta(days=6)
+    if resolution == "month":
+        first = datetime.strptime(key, "%Y-%m")
+        following = datetime(first.year + first.month // 12, first.month % 12 + 1, 1)
+        return first, following - timedelta(days=1)
+    if resolution == "year":
+        first = datetime.strptime(key, "%Y")
+        return first, datetime(first.year, 12, 31)
+    raise ValueError(f"Unknown resolution {resolution}")
+
+
+def emptyRollups() -> dict:
+    return {resolution: {} for resolution in RESOLUTIONS}
+
+
+def _point(entry: dict):
+    try:
+        return parseDate(entry['date']), float(entry['value'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _addToBucket(bucket: dict, value: float) -> dict:
+    if not bucket:
+        bucket = {"sum": 0, "count": 0, "min": value, "max": value}
+    bucket["sum"] += value
+    bucket["count"] += 1
+    bucket["min"] = min(bucket["min"], value)
+    bucket["max"] = max(bucket["max"], value)
+    bucket["mean"] = bucket["sum"] / bucket["count"]
+    return bucket
+
+
+def applyEntries(rollups: dict, entries: list) -> dict:
+    """
+    Returns a copy of `rollups` with `entries` ({"date": "dd/mm/yyyy",
+    "value": n}) added. O(1) per entry, invalid entries are skipped.
+    """
+    rollups = copy.deepcopy(rollups) if rollups else emptyRollups()
+    for resolution in RESOLUTIONS:
+        rollups.setdefault(resolution, {})
+
+    for entry in entries:
+        point = _point(entry)
+        if point is None:
+            continue
+        date, value = point
+        for resolution in RESOLUTIONS:
+            key = bucketKey(date, resolution)
+            rollups[resolution][key] = _addToBucket(rollups[resolution].get(key), value)
+    return rollups
+
+
+def _replaceInBucket(bucket: dict, old: float, new: float) -> dict:
+    # the bucket's other points aren't known, so min and max can only widen
+    bucket["sum"] += new - old
+    bucket["min"] = min(bucket["min"], new)
+    bucket["max"] = max(bucket["max"], new)
+    bucket["mean"] = bucket["sum"] / bucket["count"]
+    return bucket
+
+
+def replaceEntries(rollups: dict, series: list, changes: list) -> dict:
+    """
+    Returns a copy of `rollups` where the days in `changes` (entries for
+    days `series` already has a point for) count with their new value
+    instead of the old one. Buckets whose points are all still in `series`
+    are rebuilt from it. Buckets that also hold compacted points only have
+    their sum and mean moved, and their min and max can only widen.
+    """
+    rollups = copy.deepcopy(rollups) if rollups else buildRollups(series)
+    newValues = {}
+    for entry in changes:
+        point = _point(entry)
+        if point:
+            newValues[point[0]] = point[1]
+    points = [point for point in map(_point, series) if point]
+    oldValues = {date: value for date, value in points if date in newValues}
+    newValues = {date: value for date, value in newValues.items() if date in oldValues}
+
+    for resolution in RESOLUTIONS:
+        buckets = rollups.setdefault(resolution, {})
+        for key in {bucketKey(date, resolution) for date in newValues}:
+            inBucket = [(date, value) for date, value in points if bucketKey(date, resolution) == key]
+            bucket = buckets.get(key)
+            if bucket is None or bucket["count"] == len(inBucket):
+                rebuilt = None
+                for date, value in inBucket:
+                    rebuilt = _addToBucket(rebuilt, newValues.get(date, value))
+                buckets[key] = rebuilt
+                continue
+            for date, new in newValues.items():
+                if bucketKey(date, resolution) == key:
+                    buckets[key] = _replaceInBucket(bucket, oldValues[date], new)
+    return rollups
+
+
+def buildRollups(series: list) -> dict:
+    """
+    Builds rollups from scratch for a full series.
+    """
+    return applyEntries(emptyRollups(), series)
+
+
+def compactionCutoff(olderThanDays: int, today: datetime = None) -> datetime:
+    today = today or datetime.now()
+    return datetime(today.year, today.month, today.day) - timedelta(days=olderThanDays)
+
+
+def hasPointsBefore(series: list, cutoff: datetime) -> bool:
+    for entry in series:
+        point = _point(entry)
+        if point and point[0] < cutoff:
+            return True
+    return False
+
+
+def splitAtCutoff(series: list, cutoff: datetime):
+    """
+    Splits a series into (archived, hot) around `cutoff`. Points that
+    can't be parsed stay hot so they're never dropped silently.
+    """
+    archived, hot = [], []
+    for entry in series:
+        point = _point(entry)
+        if point and point[0] < cutoff:
+            archived.append(entry)
+        else:
+            hot.append(entry)
+    return archived, hot
+
@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+import metrics
+from helper import getPhoneNumberId
+from logger import getLogger
+from makeCall import makeTaskCall
+from sharedState import sharedState
+
+log = getLogger("scheduler")
+
+# Due-call scheduler. With SCHEDULER_ENABLED, next calls and /task calls
+# wait in a heap and are sent in batches, with at most
+# SCHEDULER_MAX_CONCURRENCY Vapi requests at once and a token bucket per
+# Vapi phone number id, so a burst (everyone's check-in ending around the
+# same time, all booking tomorrow at 7pm) is smoothed instead of hitting
+# Vapi all at once. The buckets live in the shared state, so the limits
+# hold across every worker process.
+#
+# Calls due later than SCHEDULER_LEAD_SECONDS are ready to send as soon as
+# a token allows, with a schedulePlan, so Vapi holds them until they're due
+# and the heap only ever has a short backlog for a crash to lose. Calls due
+# sooner are sent as soon as a token allows too, ringing now if their time
+# has passed. On shutdown everything still waiting is sent to Vapi straight
+# away so nothing is lost.
+#
+# A number can only have one near call waiting at a time: a second one
+# while the first is queued (e.g. /task submitted twice) gets the first's id.
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+# a hand-off Vapi rejected is tried again this many times, backing off
+HAND_OFF_ATTEMPTS = 3
+HAND_OFF_RETRY_SECONDS = 30
+
+
+class DueCall:
+
+    def __init__(self, phoneNumber: str, dueAt: float, scheduledTime: str, customerData: dict, dataToCollect):
+        self.id = str(uuid.uuid4())
+        self.phoneNumber = phoneNumber
+        self.phoneId = getPhoneNumberId(phoneNumber) or "unknown"
+        self.dueAt = dueAt
+        self.scheduledTime = scheduledTime
+        self.customerData = customerData
+        self.dataToCollect = dataToCollect
+        self.enqueuedAt = time.time()
+        # when it should go to Vapi, lag is measured from here
+        self.readyAt = None
+        self.throttled = False
+        # due after the lead window, so Vapi holds it (no dedupe)
+        self.handOff = False
+        self.attempts = 0
+
+
+def _queuedKey(phoneNumber: str) -> str:
+    return f"scheduled:{phoneNumber}"
+
+
+def _parseIso(isoTime: str) -> float:
+    return datetime.fromisoformat(isoTime.replace("Z", "+00:00")).astimezone(timezone.utc).timestamp()
+
+
+class CallScheduler:
+    """
+    Min-heap of (dispatchAt, seq, DueCall). One loop sleeps until the
+    earliest call is ready (or a new one is added), then takes up to
+    `batchSize` ready calls, sending those whose phone id has a token and
+    putting the rest back for when it will.
+    """
+
+    def __init__(self, leadSeconds: float = 300, batchSize: int = 20, maxConcurrency: int = 5,
+                 ratePerPhoneId: float = 1.0, burstPerPhoneId: int = 5, dedupeSeconds: float = 900, state=None):
+        self.leadSeconds = leadSeconds
+        self.batchSize = batchSize
+        self.maxConcurrency = maxConcurrency
+        self.ratePerPhoneId = ratePerPhoneId
+        self.burstPerPhoneId = burstPerPhoneId
+        # how long a queued call's marker outlives a worker that died holding it
+        self.dedupeSeconds = dedupeSeconds
+        self.state = state or sharedState
+        self._heap = []
+        self._seq = itertools.count()
+        self._inFlight = set()
+        self._slots = None
+        self._wake = None
+        self._task = None
+        self.counts = {"scheduled": 0, "handedOff": 0, "duplicate": 0, "dispatched": 0, "failed": 0, "throttled": 0, "flushed": 0}
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.maxConcurrency)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        log.info("scheduler.started", leadSeconds=self.leadSeconds, maxConcurrency=self.maxConcurrency)
+
+    async def stop(self, timeout: float = 30):
+        """
+        Stops the loop, lets calls being sent finish, then sends everything
+        still waiting (rate limits aside) so Vapi holds them instead.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._inFlight:
+            await asyncio.wait(self._inFlight, timeout=timeout)
+
+        waiting = [entry[2] for entry in sorted(self._heap)]
+        self._heap = []
+        if not waiting:
+            return
+        log.info("scheduler.flushing", calls=len(waiting))
+        self.counts["flushed"] += len(waiting)
+        # no start() means no semaphore, e.g. stop() without start()
+        slots = self._slots or asyncio.Semaphore(self.maxConcurrency)
+
+        async def flushOne(call: DueCall):
+            async with slots:
+                metrics.recordDispatch(await self._send(call), time.time() - call.readyAt)
+            await self._released(call)
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(flushOne(call) for call in waiting), return_exceptions=True), timeout)
+        except asyncio.TimeoutError:
+            log.warning("scheduler.flushTimedOut", calls=len(waiting))
+
+    async def schedule(self, phoneNumber: str, scheduledTime: str = None, customerData: dict = None, dataToCollect=None) -> str:
+        """
+        Adds a task call due at `scheduledTime` (ISO 8601, None for now) and
+        returns its id. Every call goes through the rate limit; calls due
+        after the lead window are handed to Vapi to hold. If the number
+        already has a near call waiting, nothing is added and that call's
+        id is returned instead (None if it was sent in the meantime).
+        """
+        dueAt = _parseIso(scheduledTime) if scheduledTime else time.time()
+        call = DueCall(phoneNumber, dueAt, scheduledTime, customerData or {}, dataToCollect or [])
+        call.readyAt = call.enqueuedAt
+        call.handOff = call.dueAt - self.leadSeconds > call.enqueuedAt
+
+        if not call.handOff and not await asyncio.to_thread(self.state.claim, _queuedKey(phoneNumber), self.dedupeSeconds, call.id):
+            existing = await asyncio.to_thread(self.state.get, _queuedKey(phoneNumber))
+            self.counts["duplicate"] += 1
+            log.info("scheduler.duplicate", callId=existing, phoneId=call.phoneId)
+            return existing
+
+        self._push(call.readyAt, call)
+        self.counts["scheduled"] += 1
+        log.info("scheduler.scheduled", callId=call.id, dueAt=call.dueAt, phoneId=call.phoneId, backlog=len(self._heap))
+        return call.id
+
+    def backlog(self) -> int:
+        return len(self._heap)
+
+    def lagSeconds(self) -> float:
+        """
+        How far behind its dispatch time the oldest ready call is (0 if none).
+        """
+        if not self._heap:
+            return 0.0
+        return max(0.0, time.time() - min(entry[2].readyAt for entry in self._heap))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": SCHEDULER_ENABLED,
+            "backlog": self.backlog(),
+            "inFlight": len(self._inFlight),
+            "lagSeconds": self.lagSeconds(),
+            "nextDispatchAt": self._heap[0][0] if self._heap else None,
+            "counts": dict(self.counts),
+        }
+
+    # ---------- Internals ----------
+
+    def _push(self, dispatchAt: float, call: DueCall):
+        heapq.heappush(self._heap, (dispatchAt, next(self._seq), call))
+        if self._wake:
+            self._wake.set()
+
+    def _takeToken(self, phoneId: str) -> float:
+        return self.state.takeToken(f"scheduler:{phoneId}", self.ratePerPhoneId, self.burstPerPhoneId)
+
+    def _retryLater(self, call: DueCall) -> bool:
+        # a failed hand-off has until its lead window to get through
+        retryAt = time.time() + HAND_OFF_RETRY_SECONDS * call.attempts
+        if not call.handOff or call.attempts >= HAND_OFF_ATTEMPTS or retryAt > call.dueAt - self.leadSeconds:
+            return False
+        log.warning("scheduler.handOffRetry", callId=call.id, attempts=call.attempts, retryAt=retryAt)
+        self._push(retryAt, call)
+        return True
+
+    async def _run(self):
+        while True:
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._dispatchBatch()
+            except Exception as e:
+                log.error("scheduler.batchFailed", error=e)
+
+    async def _dispatchBatch(self):
+        now = time.time()
+        held = []
+        heldPerPhoneId = {}
+        sent = 0
+        while self._heap and self._heap[0][0] <= now and sent < self.batchSize:
+            _, _, call = heapq.heappop(self._heap)
+            wait = await asyncio.to_thread(self._takeToken, call.phoneId)
+            if wait:
+                if not call.throttled:
+                    call.throttled = True
+                    self.counts["throttled"] += 1
+                    metrics.schedulerThrottled.inc(phone_id=call.phoneId)
+                # queue behind the calls already held for this phone id, one token each
+                queued = heldPerPhoneId.get(call.phoneId, 0)
+                heldPerPhoneId[call.phoneId] = queued + 1
+                held.append((now + wait + queued / self.ratePerPhoneId, call))
+                continue
+            # backpressure: the heap keeps the backlog while every slot is busy
+            await self._slots.acquire()
+            task = asyncio.create_task(self._dispatch(call))
+            self._inFlight.add(task)
+            task.add_done_callback(self._inFlight.discard)
+            sent += 1
+
+        for dispatchAt, call in held:
+            heapq.heappush(self._heap, (dispatchAt, next(self._seq), call))
+        if sent:
+            log.info("scheduler.batch", sent=sent, held=len(held), backlog=len(self._heap))
+
+    async def _dispatch(self, call: DueCall):
+        try:
+            status = await self._send(call)
+            metrics.recordDispatch(status, time.time() - call.readyAt)
+        finally:
+            self._slots.release()
+        if status != "ok" and self._retryLater(call):
+            return
+        await self._released(call)
+
+    async def _released(self, call: DueCall):
+        # the number can have another call queued now this one has gone
+        if call.handOff:
+            return
+        try:
+            await asyncio.to_thread(self.state.release, _queuedKey(call.phoneNumber), call.id)
+        except Exception as e:
+            log.error("scheduler.releaseFailed", callId=call.id, error=e)
+
+    async def _send(self, call: DueCall) -> str:
+        # too late for Vapi's schedulePlan, ring now instead
+        scheduledTime = call.scheduledTime if call.dueAt > time.time() else None
+        try:
+            sid = await makeTaskCall(call.phoneNumber, scheduledTime, call.customerData, call.dataToCollect)
+        except Exception as e:
+            log.error("scheduler.callFailed", callId=call.id, phoneId=call.phoneId, error=e)
+            sid = None
+        status = "ok" if sid else "error"
+        call.attempts += 1
+        self.counts["dispatched" if sid else "failed"] += 1
+        if sid and call.handOff:
+            self.counts["handedOff"] += 1
+        return status
+
+
+callScheduler = CallScheduler(
+    leadSeconds=float(os.getenv("SCHEDULER_LEAD_SECONDS", "300")),
+    batchSize=int(os.getenv("SCHEDULER_BATCH_SIZE", "20")),
+    maxConcurrency=int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "5")),
+    ratePerPhoneId=float(os.getenv("SCHEDULER_RATE_PER_PHONE_ID", "1")),
+    burstPerPhoneId=int(os.getenv("SCHEDULER_BURST_PER_PHONE_ID", "5")),
+    dedupeSeconds=float(os.getenv("SCHEDULER_DEDUPE_SECONDS", "900")),
+)
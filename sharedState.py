@@ -0,0 +1,260 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+import tempfile
+import threading
+import time
+from logger import getLogger
+
+log = getLogger("sharedState")
+
+# State that has to agree across uvicorn worker processes: counters (LLM
+# spend), markers with a TTL (handled webhook events, calls being dialled
+# or queued) and token buckets (the scheduler's Vapi rate limits).
+# SHARED_STATE=memory keeps it in this process, which is only right with a
+# single worker. SHARED_STATE=sqlite keeps it in one SQLite file
+# (SHARED_STATE_PATH) that every worker on the box opens.
+
+# expired markers are swept every this many writes
+PURGE_EVERY = 1000
+
+
+class SharedState(ABC):
+    """
+    `incr` adds to a counter and returns its new value, `incrMany` does
+    several counters in one step. `claim` sets a marker only if it isn't
+    already set (or has expired) and returns whether it did, so exactly
+    one worker gets True. `release` clears a marker, only if it still
+    holds `value` when one is given. `takeToken` spends one token from the
+    bucket `key` (refilled at `rate` a second up to `burst`) and returns 0,
+    or if it's empty, how many seconds until it won't be.
+    """
+
+    kind = None
+
+    def incr(self, key: str, amount: float = 1) -> float:
+        return self.incrMany({key: amount})[key]
+
+    @abstractmethod
+    def incrMany(self, amounts: dict) -> dict:
+        ...
+
+    @abstractmethod
+    def counters(self, prefix: str = "") -> dict:
+        ...
+
+    @abstractmethod
+    def claim(self, key: str, ttl: float, value: str = "1") -> bool:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, value: str, ttl: float):
+        ...
+
+    @abstractmethod
+    def get(self, key: str):
+        ...
+
+    @abstractmethod
+    def release(self, key: str, value: str = None):
+        ...
+
+    @abstractmethod
+    def takeToken(self, key: str, rate: float, burst: int) -> float:
+        ...
+
+
+class MemorySharedState(SharedState):
+    kind = "memory"
+
+    def __init__(self):
+        self._counters = {}
+        self._markers = {}    # key -> (expiresAt, value)
+        self._buckets = {}    # key -> (tokens, updatedAt)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def incrMany(self, amounts: dict) -> dict:
+        with self._lock:
+            for key, amount in amounts.items():
+                self._counters[key] = self._counters.get(key, 0) + amount
+            return {key: self._counters[key] for key in amounts}
+
+    def counters(self, prefix: str = "") -> dict:
+        with self._lock:
+            return {key: value for key, value in self._counters.items() if key.startswith(prefix)}
+
+    def claim(self, key: str, ttl: float, value: str = "1") -> bool:
+        now = time.time()
+        with self._lock:
+            entry = self._markers.get(key)
+            if entry and entry[0] > now:
+                return False
+            self._markers[key] = (now + ttl, value)
+            self._written(now)
+            return True
+
+    def put(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._markers[key] = (now + ttl, value)
+            self._written(now)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._markers.get(key)
+        if not entry or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def release(self, key: str, value: str = None):
+        with self._lock:
+            entry = self._markers.get(key)
+            if entry and (value is None or entry[1] == value):
+                del self._markers[key]
+
+    def takeToken(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updatedAt = self._buckets.get(key, (float(burst), now))
+            tokens, wait = _spendToken(tokens, now - updatedAt, rate, burst)
+            self._buckets[key] = (tokens, now)
+            return wait
+
+    def _written(self, now: float):
+        # caller holds the lock
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            self._markers = {key: entry for key, entry in self._markers.items() if entry[0] > now}
+
+
+class SqliteSharedState(SharedState):
+    """
+    One SQLite database in WAL mode shared by every worker process. Each
+    thread gets its own connection, and writes take the database lock up
+    front (BEGIN IMMEDIATE) so read-then-write steps like `claim` are atomic
+    across processes.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, path: str, busyTimeout: float = 10):
+        self.path = path
+        self.busyTimeout = busyTimeout
+        self._local = threading.local()
+        self._writes = 0
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS markers (key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)")
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        # connections can't be carried over into a forked worker
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.busyTimeout, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def incrMany(self, amounts: dict) -> dict:
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO counters (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                list(amounts.items()),
+            )
+            return {
+                key: db.execute("SELECT value FROM counters WHERE key = ?", (key,)).fetchone()[0]
+                for key in amounts
+            }
+
+    def counters(self, prefix: str = "") -> dict:
+        rows = self._connection().execute(
+            "SELECT key, value FROM counters WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()
+        return dict(rows)
+
+    def claim(self, key: str, ttl: float, value: str = "1") -> bool:
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("DELETE FROM markers WHERE key = ? AND expires_at <= ?", (key, now))
+            claimed = db.execute(
+                "INSERT OR IGNORE INTO markers (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl)
+            ).rowcount == 1
+            self._written(db, now)
+            return claimed
+
+    def put(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO markers (key, value, expires_at) VALUES (?, ?, ?)", (key, value, now + ttl))
+            self._written(db, now)
+
+    def get(self, key: str):
+        row = self._connection().execute(
+            "SELECT value FROM markers WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def release(self, key: str, value: str = None):
+        with self._transaction() as db:
+            if value is None:
+                db.execute("DELETE FROM markers WHERE key = ?", (key,))
+            else:
+                db.execute("DELETE FROM markers WHERE key = ? AND value = ?", (key, value))
+
+    def takeToken(self, key: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updatedAt = row if row else (float(burst), now)
+            tokens, wait = _spendToken(tokens, now - updatedAt, rate, burst)
+            db.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+            return wait
+
+    def _written(self, db: sqlite3.Connection, now: float):
+        # a per-process count is enough to sweep now and then
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            db.execute("DELETE FROM markers WHERE expires_at <= ?", (now,))
+
+
+def _spendToken(tokens: float, elapsed: float, rate: float, burst: int):
+    # returns (tokens left, seconds to wait), a token is only spent if there is one
+    tokens = min(burst, tokens + max(elapsed, 0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class _Transaction:
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, excType, exc, tb):
+        self.db.execute("ROLLBACK" if excType else "COMMIT")
+
+
+def createSharedState(kind: str = None) -> SharedState:
+    kind = (kind or os.getenv("SHARED_STATE", "memory")).lower()
+    if kind == "memory":
+        return MemorySharedState()
+    if kind == "sqlite":
+        path = os.getenv("SHARED_STATE_PATH") or os.path.join(tempfile.gettempdir(), "lifetrack-state.sqlite3")
+        log.info("sharedState.open", path=path)
+        return SqliteSharedState(path)
+    raise ValueError(f"Unknown SHARED_STATE {kind}")
+
+
+sharedState = createSharedState()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+from helper import updateStatuses, getSessionStatus
+from logger import getLogger
+
+log = getLogger("statusBuffer")
+
+
+class _Entry:
+    __slots__ = ("status", "attempts")
+
+    def __init__(self, status: str):
+        self.status = status
+        self.attempts = 0
+
+
+class StatusBuffer:
+    """
+    Write-behind buffer for onboarding_sessions statuses.
+
+    `set` only records the latest status per call_sid. A background task
+    flushes everything buffered every `flushInterval` seconds (or as soon
+    as `maxPending` sids are waiting) with one UPDATE per distinct status,
+    and once more on shutdown. `getStatus` sees buffered values before
+    they're written.
+
+    Sids that don't match a session yet (Vapi can send status updates
+    before /onboarding has inserted the row) are retried on the next
+    `maxAttempts` flushes, then dropped.
+    """
+
+    def __init__(self, flushInterval: float = 1.0, maxPending: int = 200, maxAttempts: int = 5):
+        self.flushInterval = flushInterval
+        self.maxPending = maxPending
+        self.maxAttempts = maxAttempts
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushLock = None
+        self._wake = None
+        self._loop = None
+        self._task = None
+        self.counts = {"buffered": 0, "written": 0, "coalesced": 0, "dropped": 0, "flushes": 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._flushLock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the flush loop and writes whatever is still buffered.
+        """
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.depth():
+            log.warning("status.unflushed", pending=self.depth())
+
+    def set(self, callSid: str, status: str):
+        """
+        Buffers the status for the call. Safe to call from any thread.
+        """
+        with self._lock:
+            if callSid in self._pending:
+                self.counts["coalesced"] += 1
+            self._pending[callSid] = _Entry(status)
+            self.counts["buffered"] += 1
+            full = len(self._pending) >= self.maxPending
+        if full and self._loop:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def get(self, callSid: str):
+        with self._lock:
+            entry = self._pending.get(callSid)
+            return entry.status if entry else None
+
+    def getStatus(self, callSid: str):
+        """
+        The session's status, buffered value first, otherwise from the database.
+        """
+        return self.get(callSid) or getSessionStatus(callSid)
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": len(self._pending), **self.counts}
+
+    async def flush(self):
+        if self._flushLock is None:
+            self._flushLock = asyncio.Lock()
+        async with self._flushLock:
+            with self._lock:
+                batch = dict(self._pending)
+            if not batch:
+                return
+
+            try:
+                written = await asyncio.to_thread(updateStatuses, {sid: entry.status for sid, entry in batch.items()})
+            except Exception as e:
+                log.warning("status.flushFailed", sids=len(batch), error=e)
+                written = set()
+
+            with self._lock:
+                self.counts["flushes"] += 1
+                for sid, entry in batch.items():
+                    # a newer status came in while this one was being written, keep it for the next flush
+                    if self._pending.get(sid) is not entry:
+                        continue
+                    if sid in written:
+                        del self._pending[sid]
+                        self.counts["written"] += 1
+                        continue
+                    entry.attempts += 1
+                    if entry.attempts >= self.maxAttempts:
+                        del self._pending[sid]
+                        self.counts["dropped"] += 1
+                        log.debug("status.dropped", sid=sid, status=entry.status)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flushInterval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("status.flushError", error=e)
+
+
+statusBuffer = StatusBuffer(
+    flushInterval=float(os.getenv("STATUS_FLUSH_INTERVAL", "1")),
+    maxPending=int(os.getenv("STATUS_BUFFER_MAX", "200")),
+)
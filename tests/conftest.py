@@ -0,0 +1,35 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+# The app modules import `supabase` from supabaseClient at import time, so
+# the tests swap in the in-memory fake from bench/ the same way the
+# benchmark does, with no simulated latency.
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.fakeSupabase import FakeSupabase
+from metrics import instrumentClient
+
+fakeDb = FakeSupabase(latency=0)
+fakeClient = types.ModuleType("supabaseClient")
+fakeClient.supabase = instrumentClient(fakeDb)
+sys.modules["supabaseClient"] = fakeClient
+
+
+@pytest.fixture
+def db():
+    """
+    The fake Supabase client with empty tables and empty read caches.
+    """
+    import helper
+    fakeDb.tables.clear()
+    fakeDb.requests = 0
+    helper.userCache.clear()
+    helper.graphCache.clear()
+    helper.graphOwnerCache.clear()
+    yield fakeDb
+    fakeDb.tables.clear()
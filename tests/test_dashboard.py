@@ -0,0 +1,62 @@
+from datetime import datetime
+
+from dashboard import graphPoints
+from rollups import buildRollups, periodRange, splitAtCutoff
+
+
+def points(*pairs):
+    return [{"date": day, "value": value} for day, value in pairs]
+
+
+HISTORY = points(
+    ("10/01/2025", 1), ("20/01/2025", 2), ("03/02/2025", 4),
+    ("28/02/2025", 8), ("02/03/2025", 16), ("05/03/2025", 32),
+)
+
+
+def compacted(cutoff):
+    """
+    A graph whose points before `cutoff` were archived into its rollups.
+    """
+    _, hot = splitAtCutoff(HISTORY, cutoff)
+    return {"type": "bar", "data": hot, "rollups": buildRollups(HISTORY)}
+
+
+def test_period_range_covers_the_whole_bucket():
+    assert periodRange("2025-W01", "week") == (datetime(2024, 12, 30), datetime(2025, 1, 5))
+    assert periodRange("2024-02", "month") == (datetime(2024, 2, 1), datetime(2024, 2, 29))
+    assert periodRange("2024-12", "month") == (datetime(2024, 12, 1), datetime(2024, 12, 31))
+    assert periodRange("2025", "year") == (datetime(2025, 1, 1), datetime(2025, 12, 31))
+
+
+def test_compacted_months_are_served_from_the_rollups():
+    full = graphPoints({"type": "bar", "data": HISTORY, "rollups": buildRollups(HISTORY)}, resolution="month")
+    graph = compacted(datetime(2025, 3, 1))
+
+    assert graph["data"] == points(("02/03/2025", 16), ("05/03/2025", 32))
+    assert [(p["period"], p["value"], p["count"]) for p in graphPoints(graph, resolution="month")] == \
+        [(p["period"], p["value"], p["count"]) for p in full]
+
+
+def test_a_partly_compacted_bucket_uses_the_rollup_total():
+    graph = compacted(datetime(2025, 2, 15))
+
+    february = [p for p in graphPoints(graph, resolution="month") if p["period"] == "2025-02"]
+    year = graphPoints(graph, resolution="year")
+
+    assert february == [{"period": "2025-02", "date": "01/02/2025", "value": 12.0, "count": 2}]
+    assert year == [{"period": "2025", "date": "01/01/2025", "value": 63.0, "count": 6}]
+
+
+def test_archived_buckets_outside_the_range_are_left_out():
+    graph = compacted(datetime(2025, 3, 1))
+
+    inRange = graphPoints(graph, start=datetime(2025, 2, 10), end=datetime(2025, 3, 31), resolution="month")
+
+    assert [p["period"] for p in inRange] == ["2025-02", "2025-03"]
+
+
+def test_graphs_without_compacted_points_are_downsampled_from_raw_points():
+    graph = {"type": "line", "data": HISTORY, "rollups": buildRollups(HISTORY)}
+
+    assert graphPoints(graph, resolution="week") == graphPoints({"type": "line", "data": HISTORY}, resolution="week")
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+
+from graphSeries import GraphSeries, fillMode, fromEpochDay, toEpochDay
+
+
+def points(*pairs):
+    return [{"date": day, "value": value} for day, value in pairs]
+
+
+def test_epoch_days_round_trip():
+    assert toEpochDay("01/01/1970") == 0
+    assert toEpochDay(date(2025, 5, 12)) == toEpochDay("12/05/2025")
+    assert fromEpochDay(toEpochDay("29/02/2024")) == "29/02/2024"
+    with pytest.raises(ValueError):
+        toEpochDay("2025-05-12")
+
+
+def test_points_round_trip_and_invalid_points_are_skipped():
+    raw = points(("02/05/2025", 3), ("01/05/2025", 2.5), ("bad", 1), ("03/05/2025", None))
+    series = GraphSeries.fromPoints(raw)
+
+    assert len(series) == 2
+    assert series.toPoints() == raw[:2]
+    with pytest.raises(ValueError):
+        GraphSeries.fromPoints(raw, skipInvalid=False)
+
+
+def test_slice_is_inclusive_and_in_date_order():
+    series = GraphSeries.fromPoints(points(("03/05/2025", 3), ("01/05/2025", 1), ("02/05/2025", 2), ("05/05/2025", 5)))
+
+    assert series.slice(date(2025, 5, 2), date(2025, 5, 3)).toPoints() == points(("02/05/2025", 2), ("03/05/2025", 3))
+    assert series.slice(None, "01/05/2025").toPoints() == points(("01/05/2025", 1))
+
+
+def test_downsample_by_week_and_month():
+    # 05/05/2025 is a Monday
+    series = GraphSeries.fromPoints(points(
+        ("04/05/2025", 1), ("05/05/2025", 2), ("11/05/2025", 4), ("12/05/2025", 8), ("01/06/2025", 16),
+    ))
+
+    assert series.downsample("week", "sum") == [
+        {"period": "2025-W18", "date": "04/05/2025", "value": 1.0, "count": 1},
+        {"period": "2025-W19", "date": "05/05/2025", "value": 6.0, "count": 2},
+        {"period": "2025-W20", "date": "12/05/2025", "value": 8.0, "count": 1},
+        {"period": "2025-W22", "date": "01/06/2025", "value": 16.0, "count": 1},
+    ]
+    months = series.downsample("month", "mean")
+    assert [(point["period"], point["value"], point["count"]) for point in months] == [("2025-05", 3.75, 4), ("2025-06", 16.0, 1)]
+    assert [point["value"] for point in series.downsample("year", "count")] == [5]
+    with pytest.raises(ValueError):
+        series.downsample("fortnight")
+
+
+def test_rolling_mean_ignores_gaps():
+    series = GraphSeries.fromPoints(points(("01/05/2025", 2), ("02/05/2025", 4), ("05/05/2025", 6)))
+
+    assert series.rolling(2).values.tolist() == [2.0, 3.0, 6.0]
+    assert series.rolling(7, "sum").values.tolist() == [2.0, 6.0, 12.0]
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("zero", [0, 3, 0, 0, 7, 0]),
+    ("carry", [1, 3, 3, 3, 7, 7]),
+    ("null", [None, 3, None, None, 7, None]),
+])
+def test_fill_gaps(mode, expected):
+    series = GraphSeries.fromPoints(points(("30/04/2025", 1), ("02/05/2025", 3), ("05/05/2025", 7)))
+    filled = series.fillGaps(date(2025, 5, 1), date(2025, 5, 6), mode)
+
+    assert [point["date"] for point in filled] == [f"0{day}/05/2025" for day in range(1, 7)]
+    assert [point["value"] for point in filled] == expected
+    assert [bool(point.get("filled")) for point in filled] == [True, False, True, True, False, True]
+
+
+def test_fill_gaps_defaults_to_the_first_point():
+    series = GraphSeries.fromPoints(points(("02/05/2025", 3)))
+
+    assert series.fillGaps(end=date(2025, 5, 3)) == [
+        {"date": "02/05/2025", "value": 3},
+        {"date": "03/05/2025", "value": 0, "filled": True},
+    ]
+
+
+def test_fill_mode_comes_from_settings_then_type():
+    assert fillMode({"type": "contribution"}) == "zero"
+    assert fillMode({"type": "line"}) == "carry"
+    assert fillMode({"type": "line", "settings": {"fill": "null"}}) == "null"
+    assert fillMode({"type": "bar", "settings": {"fill": "bogus"}}) == "zero"
@@ -0,0 +1,38 @@
+from datetime import date
+
+from graphStats import buildStats, correctStats, summariseStats, updateStats
+
+
+def points(*pairs):
+    return [{"date": day, "value": value} for day, value in pairs]
+
+
+def test_updating_matches_building_from_scratch():
+    history = points(("01/05/2025", 1), ("02/05/2025", 0), ("03/05/2025", 2), ("04/05/2025", 3))
+    new = points(("05/05/2025", 4), ("06/05/2025", 5))
+
+    assert updateStats(buildStats(history), new) == buildStats(history + new)
+
+
+def test_summary_streaks_means_and_best():
+    stats = buildStats(points(("01/05/2025", 1), ("02/05/2025", 0), ("03/05/2025", 2), ("04/05/2025", 6)))
+    summary = summariseStats(stats, "zero", today=date(2025, 5, 5))
+
+    assert summary["currentStreak"] == 2
+    assert summary["longestStreak"] == 2
+    assert summary["best"] == {"value": 6, "date": "04/05/2025"}
+    assert summary["mean7"] == round(9 / 7, 2)
+    assert summary["daysSinceLastEntry"] == 1
+    # a whole day without activity breaks the streak
+    assert summariseStats(stats, "zero", today=date(2025, 5, 6))["currentStreak"] == 0
+
+
+def test_correcting_keeps_what_only_the_stored_stats_know():
+    stored = buildStats(points(("01/04/2025", 50), ("02/04/2025", 1), ("03/04/2025", 1), ("04/04/2025", 1), ("05/05/2025", 2)))
+    # the April points were compacted away and 05/05 was changed
+    corrected = correctStats(stored, points(("05/05/2025", 3)))
+
+    assert corrected["entries"] == 5
+    assert corrected["longestStreak"] == 4
+    assert corrected["best"]["value"] == 50
+    assert corrected["recent"] == {str(stored["lastDay"]): [3.0, 1]}
@@ -0,0 +1,88 @@
+import helper
+from helper import apply_merge_patch, buildGraphSeries, migrateGraphData
+
+
+def test_merge_patch_merges_nested_objects_and_removes_nulls():
+    target = {"UserInfo": {"Name": "Will", "Age": "21"}, "Pets": ["Rex"], "Job": "Dev"}
+    patch = {"UserInfo": {"Age": "22", "City": "Melbourne"}, "Job": None, "Pets": ["Rex", "Tom"]}
+
+    assert apply_merge_patch(target, patch) == {
+        "UserInfo": {"Name": "Will", "Age": "22", "City": "Melbourne"},
+        "Pets": ["Rex", "Tom"],
+    }
+
+
+def test_merge_patch_does_not_modify_its_arguments():
+    target = {"UserInfo": {"Name": "Will"}}
+    patch = {"UserInfo": {"Name": "Bill"}}
+
+    apply_merge_patch(target, patch)
+
+    assert target == {"UserInfo": {"Name": "Will"}}
+    assert patch == {"UserInfo": {"Name": "Bill"}}
+
+
+def test_merge_patch_replaces_non_objects():
+    assert apply_merge_patch({"a": 1}, ["x"]) == ["x"]
+    assert apply_merge_patch("old", {"a": {"b": None, "c": 1}}) == {"a": {"c": 1}}
+    assert apply_merge_patch({"a": 1}, {}) == {"a": 1}
+
+
+def test_graph_series_puts_legacy_points_first_then_entries_in_date_order():
+    legacy = [{"date": "01/05/2025", "value": 1}]
+    rows = [
+        {"entry_date": "2025-05-03", "value": 3.0, "created_at": "2025-05-03T10:00:00"},
+        {"entry_date": "2025-05-02", "value": 2.5, "created_at": "2025-05-02T10:00:00"},
+    ]
+
+    assert buildGraphSeries(legacy, rows) == [
+        {"date": "01/05/2025", "value": 1},
+        {"date": "02/05/2025", "value": 2.5},
+        {"date": "03/05/2025", "value": 3},
+    ]
+
+
+def test_migrating_graph_data_again_after_a_crash_adds_no_rows(db):
+    legacy = [{"date": "01/05/2025", "value": 1}, {"date": "02/05/2025", "value": 2}, {"date": "02/05/2025", "value": 3}]
+    db.rows("graph_data").append({"graph_id": "graph-1", "data": legacy})
+    # a run that crashed after writing the entries but before emptying the array
+    db.rows("graph_entries").append({"id": "e1", "graph_id": "graph-1", "entry_date": "2025-05-01", "value": 1.0})
+
+    assert migrateGraphData() == 1
+    assert migrateGraphData() == 0
+
+    assert sorted((row["entry_date"], row["value"]) for row in db.rows("graph_entries")) == [
+        ("2025-05-01", 1.0), ("2025-05-02", 3.0),
+    ]
+    assert db.rows("graph_data")[0]["data"] == []
+
+
+def seedGraphs(db, userId, phone, graphIds):
+    db.rows("user_data").append({"id": userId, "phone_number": phone, "user_id": None, "userdata": {}})
+    for graphId in graphIds:
+        db.rows("graphs").append({"id": graphId, "user_data_id": userId, "title": graphId, "description": "", "type": "bar", "settings": {}})
+
+
+def test_graph_owners_are_bounded_and_invalidation_still_works_after_eviction(db, monkeypatch):
+    monkeypatch.setattr(helper.graphOwnerCache, "maxSize", 2)
+    seedGraphs(db, "user-1", "+61400000001", ["a", "b", "c"])
+
+    helper.getCurrentGraphData("+61400000001")
+    assert helper.graphOwnerCache.stats()["size"] == 2
+    assert helper.graphCache.get("user-1") is not None
+
+    # "a" was evicted from the owner cache, the user's list must still be dropped
+    helper.invalidateGraphs(graphId="a")
+    assert helper.graphCache.get("user-1") is None
+
+
+def test_invalidating_a_graph_drops_only_its_owners_list(db):
+    seedGraphs(db, "user-1", "+61400000001", ["a"])
+    seedGraphs(db, "user-2", "+61400000002", ["b"])
+    helper.getCurrentGraphData("+61400000001")
+    helper.getCurrentGraphData("+61400000002")
+
+    helper.invalidateGraphs(graphId="a")
+
+    assert helper.graphCache.get("user-1") is None
+    assert helper.graphCache.get("user-2") is not None
@@ -0,0 +1,40 @@
+import asyncio
+
+import transcriptionAnalysis
+from httpClient import SharedSession
+
+
+def test_a_per_request_timeout_keeps_the_connect_timeout():
+    session = SharedSession("test", timeout=120, connectTimeout=10)
+
+    assert (session.clientTimeout().total, session.clientTimeout().connect) == (120, 10)
+    assert (session.clientTimeout(5).total, session.clientTimeout(5).connect) == (5, 10)
+
+
+def test_llm_requests_use_the_connect_timeout(monkeypatch):
+    timeouts = []
+
+    class FakeResponse:
+        async def __aenter__(self):
+            return self
+        async def __aexit__(self, *exc):
+            return False
+        async def json(self):
+            return {"choices": [{"message": {"content": "hi"}}], "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+
+    class FakeSession:
+        def post(self, url, headers=None, json=None, timeout=None):
+            timeouts.append(timeout)
+            return FakeResponse()
+
+    async def fakeGet():
+        return FakeSession()
+    monkeypatch.setattr(transcriptionAnalysis.llmSession, "get", fakeGet)
+
+    asyncio.run(transcriptionAnalysis.askLLM("hello"))
+    asyncio.run(transcriptionAnalysis.askLLM("hello", timeout=5))
+
+    assert [(timeout.total, timeout.connect) for timeout in timeouts] == [
+        (transcriptionAnalysis.llmSession.timeout, transcriptionAnalysis.llmSession.connectTimeout),
+        (5, transcriptionAnalysis.llmSession.connectTimeout),
+    ]
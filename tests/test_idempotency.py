@@ -0,0 +1,40 @@
+import pytest
+
+from idempotency import IdempotencyStore, MemoryIdempotencyStore, SharedIdempotencyStore, eventKey
+from sharedState import MemorySharedState
+
+
+@pytest.mark.parametrize("store", [MemoryIdempotencyStore(), SharedIdempotencyStore(MemorySharedState())])
+def test_claim_complete_and_release(store):
+    assert store.claim("call-1:end-of-call-report")
+    assert not store.claim("call-1:end-of-call-report")
+    assert store.status("call-1:end-of-call-report") == "processing"
+
+    store.complete("call-1:end-of-call-report")
+    assert store.status("call-1:end-of-call-report") == "completed"
+    assert not store.claim("call-1:end-of-call-report")
+
+    assert store.claim("call-2:end-of-call-report")
+    store.release("call-2:end-of-call-report")
+    assert store.status("call-2:end-of-call-report") is None
+    assert store.claim("call-2:end-of-call-report")
+
+
+def test_memory_store_keys_expire():
+    store = MemoryIdempotencyStore(ttl=-1)
+
+    assert store.claim("key")
+    assert store.claim("key")
+
+
+def test_incomplete_stores_cannot_be_created():
+    class Partial(IdempotencyStore):
+        def claim(self, key):
+            return True
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_event_key():
+    assert eventKey({"message": {"type": "end-of-call-report", "call": {"id": "abc"}}}) == "abc:end-of-call-report"
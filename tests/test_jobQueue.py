@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from jobQueue import JobQueue, QueueFullError
+
+
+def test_failed_jobs_are_retried_until_they_succeed():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("try again")
+        return "done"
+
+    async def main():
+        queue = JobQueue(workers=1, maxRetries=2, retryDelay=0.01)
+        await queue.start()
+        job = queue.enqueue("flaky", flaky)
+        await job.wait(5)
+        await queue.drain()
+        return queue, job
+
+    queue, job = asyncio.run(main())
+    assert job.status == "succeeded"
+    assert job.attempts == 3
+    assert job.result == "done"
+    assert queue.counts == {"enqueued": 1, "succeeded": 1, "failed": 0, "retried": 2}
+
+
+def test_job_fails_once_retries_are_used_up():
+    async def broken():
+        raise RuntimeError("always")
+
+    async def main():
+        queue = JobQueue(workers=1, maxRetries=1, retryDelay=0.01)
+        await queue.start()
+        job = queue.enqueue("broken", broken)
+        await job.wait(5)
+        await queue.drain()
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == "failed"
+    assert job.attempts == 2
+    assert "always" in job.error
+
+
+def test_drain_waits_for_queued_jobs_and_then_refuses_new_ones():
+    finished = []
+
+    async def work(n):
+        await asyncio.sleep(0.02)
+        finished.append(n)
+
+    async def main():
+        queue = JobQueue(workers=2)
+        await queue.start()
+        for n in range(5):
+            queue.enqueue("work", work, n)
+        await queue.drain()
+        with pytest.raises(QueueFullError):
+            queue.enqueue("late", work, 99)
+
+    asyncio.run(main())
+    assert sorted(finished) == [0, 1, 2, 3, 4]
+
+
+def test_enqueue_fails_when_the_queue_is_full():
+    async def main():
+        queue = JobQueue(workers=0, maxSize=1)
+        await queue.start()
+        queue.enqueue("first", asyncio.sleep, 0)
+        with pytest.raises(QueueFullError):
+            queue.enqueue("second", asyncio.sleep, 0)
+
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from jsonStream import IncrementalJsonParser
+
+
+def feedInChunks(parser, text, size):
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_list_items_are_emitted_as_they_complete(size):
+    graphs = [
+        {"title": "Steps", "settings": {"totalCells": 30}},
+        {"title": "Mood [1-10]", "description": "has \"quotes\", commas and {braces}"},
+        [1, 2, [3]],
+        "plain",
+        4.5,
+    ]
+    seen = []
+    parser = IncrementalJsonParser(lambda key, value: seen.append((key, value)))
+    feedInChunks(parser, json.dumps(graphs), size)
+
+    assert seen == list(enumerate(graphs))
+    assert parser.result() == graphs
+
+
+def test_object_members_are_emitted_with_their_keys():
+    document = {"graph-1": [{"date": "01/05/2025", "value": 3}], "graph-2": [], "note": "a,b"}
+    seen = []
+    parser = IncrementalJsonParser(lambda key, value: seen.append((key, value)))
+    feedInChunks(parser, json.dumps(document), 5)
+
+    assert seen == list(document.items())
+
+
+def test_item_is_emitted_before_the_document_ends():
+    seen = []
+    parser = IncrementalJsonParser(lambda key, value: seen.append(value))
+    parser.feed('[{"title": "Steps"}, {"title": "Sle')
+
+    assert seen == [{"title": "Steps"}]
+
+
+def test_code_fence_is_ignored():
+    parser = IncrementalJsonParser()
+    parser.feed('```json\n[1, 2]\n```')
+
+    assert [value for _, value in parser.items] == [1, 2]
+    assert parser.result() == [1, 2]
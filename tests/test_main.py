@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+import pytest
+
+import main
+import transcriptionAnalysis
+from helper import getCurrentGraphData
+
+PHONE = "+61400000001"
+
+
+@pytest.fixture
+def user(db):
+    db.rows("user_data").append({"id": "user-1", "phone_number": PHONE, "user_id": "auth-1", "userdata": {"UserInfo": {"Name": "Will"}}})
+    db.rows("graphs").append({"id": "graph-1", "user_data_id": "user-1", "title": "Steps", "description": "", "type": "bar", "settings": {}})
+    db.rows("graph_data").append({"id": "gd-1", "graph_id": "graph-1", "data": [{"date": "05/05/2025", "value": 8000}], "rollups": None, "stats": None})
+    db.rows("calls").append({"id": "call-1", "call_type": "task"})
+    return PHONE
+
+
+@pytest.fixture
+def booked(user, monkeypatch):
+    """
+    The dataToCollect of every next call booked, with the task analysis
+    stages stubbed out.
+    """
+    booked = []
+    async def fakeMakeTaskCall(customerNumber, scheduledTime=None, customerData={}, dataToCollect={}):
+        booked.append(dataToCollect)
+        return "vapi-1"
+    async def graphs(transcript, phoneNumber):
+        return await transcriptionAnalysis.applyGraphEntries(getCurrentGraphData(phoneNumber), {"graph-1": [{"date": "06/05/2025", "value": 9000}]})
+    async def customerData(transcript, phoneNumber):
+        return {"UserInfo": {"Name": "Will"}}
+    async def nextCallTime(transcript, startedAt):
+        return "2025-05-07T09:00:00Z"
+    monkeypatch.setattr(main, "ANALYSIS_MODE", "multi")
+    monkeypatch.setattr(main, "UpdateGraphs", graphs)
+    monkeypatch.setattr(main, "updateUserData", customerData)
+    monkeypatch.setattr(main, "getNextCallTime", nextCallTime)
+    monkeypatch.setattr(transcriptionAnalysis, "SCHEDULER_ENABLED", False)
+    monkeypatch.setattr(transcriptionAnalysis, "makeTaskCall", fakeMakeTaskCall)
+    return booked
+
+
+PAYLOAD = {"message": {"startedAt": "2025-05-06T09:00:00Z", "call": {"id": "call-1"}, "artifact": {"messages": [{}, {"role": "user", "message": "hi"}]}}}
+
+
+def test_the_next_call_after_a_check_in_gets_graph_summaries_not_full_graphs(booked):
+    asyncio.run(main.handleTaskEnd(PHONE, PAYLOAD, "User: hi"))
+
+    [dataToCollect] = booked
+    assert [graph["title"] for graph in dataToCollect] == ["Steps"]
+    assert all(not {"data", "rollups"} & graph.keys() for graph in dataToCollect)
+    assert dataToCollect[0]["lastEntry"] == {"date": "06/05/2025", "value": 9000}
+    assert "currentStreak" in dataToCollect[0]["stats"]
+
+
+def test_call_lookups_and_deletes_run_off_the_event_loop(db, booked, monkeypatch):
+    threads = {}
+    def recordThread(name, func):
+        def wrapper(*args):
+            threads[name] = threading.current_thread()
+            return func(*args)
+        return wrapper
+    monkeypatch.setattr(main, "getCallType", recordThread("getCallType", main.getCallType))
+    monkeypatch.setattr(main, "deleteCall", recordThread("deleteCall", main.deleteCall))
+
+    asyncio.run(main.handleEndOfCall("sid-1", PHONE, PAYLOAD))
+
+    assert set(threads) == {"getCallType", "deleteCall"}
+    assert all(thread is not threading.main_thread() for thread in threads.values())
+    assert db.rows("calls") == []
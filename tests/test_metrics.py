@@ -0,0 +1,46 @@
+import pytest
+
+import metrics
+from helper import getCurrentGraphData
+from metrics import callBreakdown, callContext, instrumentClient
+
+PHONE = "+61400000001"
+
+
+def requestCounts():
+    return {key: value for _, key, value in metrics.supabaseRequests.samples()}
+
+
+def test_every_supabase_request_a_helper_makes_is_counted(db):
+    db.rows("user_data").append({"id": "user-1", "phone_number": PHONE, "user_id": "auth-1", "userdata": {}})
+    before = db.requests
+
+    with callContext("call-metrics-1"):
+        getCurrentGraphData(PHONE)
+
+    made = db.requests - before
+    assert made > 1
+    assert callBreakdown("call-metrics-1")["total"]["supabaseRequests"] == made
+
+
+def test_requests_are_labelled_by_table_and_action_or_rpc(db):
+    client = instrumentClient(db)
+    before = requestCounts()
+
+    client.table("graphs").insert({"id": "graph-1"}).execute()
+    client.table("graphs").select("*").eq("id", "graph-1").execute()
+    client.rpc("save_graph_entries", {"p_entries": [], "p_graph_data": {}}).execute()
+
+    after = requestCounts()
+    for operation in ("graphs.insert", "graphs.select", "rpc.save_graph_entries"):
+        assert after[(operation, "ok")] - before.get((operation, "ok"), 0) == 1
+
+
+def test_failed_requests_are_counted_as_errors(db):
+    client = instrumentClient(db)
+    before = requestCounts().get(("rpc.missing", "error"), 0)
+
+    with pytest.raises(Exception):
+        client.rpc("missing", {}).execute()
+
+    assert requestCounts()[("rpc.missing", "error")] - before == 1
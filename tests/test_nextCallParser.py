@@ -0,0 +1,136 @@
+from datetime import datetime
+
+import pytest
+
+from nextCallParser import parseNextCall
+
+# Monday 12 May 2025, 3:17:19 PM (GMT+10)
+CALL_TIME = datetime(2025, 5, 12, 15, 17, 19)
+
+
+def parse(*lines):
+    return parseNextCall("\n".join(lines), CALL_TIME)
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Same time tomorrow works.", datetime(2025, 5, 13, 15, 17, 19)),
+    ("Tomorrow at 7pm please", datetime(2025, 5, 13, 19, 0)),
+    ("7:30 pm", datetime(2025, 5, 13, 19, 30)),
+    ("Friday is good", datetime(2025, 5, 16, 15, 17, 19)),
+    ("Tonight at 9pm", datetime(2025, 5, 12, 21, 0)),
+])
+def test_common_answers_are_parsed(answer, expected):
+    result = parse("Bot: How did today go?", "User: Good, walked 8000 steps.", "Bot: When should I call you next?", f"User: {answer}")
+
+    assert result.kind == "time"
+    assert result.when == expected
+
+
+def test_do_not_call_me():
+    result = parse("Bot: What time should I call you tomorrow?", "User: Please don't call me anymore")
+
+    assert result.kind == "none"
+
+
+def test_answer_before_a_sign_off_is_not_lost():
+    result = parse(
+        "Bot: When should I call you next?",
+        "User: 7pm please",
+        "Bot: Perfect, talk to you tomorrow then!",
+        "User: bye",
+    )
+
+    assert result.kind == "time"
+    assert result.when == datetime(2025, 5, 13, 19, 0)
+
+
+def test_a_confirmation_line_is_not_taken_as_the_question():
+    result = parse(
+        "Bot: How are you going?",
+        "User: Good. Call me at 7pm next time.",
+        "Bot: Great, talk to you tomorrow then!",
+        "User: bye",
+    )
+
+    assert result.kind == "ambiguous"
+    assert result.reason == "next call never came up"
+
+
+def test_news_about_earlier_today_does_not_count_as_a_time():
+    result = parse(
+        "Bot: Did you make it to the gym?",
+        "User: Yeah I went this morning before my shift.",
+        "Bot: Same time tomorrow for our next call?",
+        "User: Yep, same time tomorrow.",
+    )
+
+    assert result.kind == "time"
+    assert result.when == datetime(2025, 5, 13, 15, 17, 19)
+
+
+def test_a_time_before_the_question_is_ambiguous():
+    result = parse(
+        "Bot: Anything else?",
+        "User: Yeah, I'd like the call at 7pm from now on",
+        "Bot: Got it. So what time should I call you tomorrow?",
+        "User: like I said",
+    )
+
+    assert result.kind == "ambiguous"
+    assert result.reason == "time mentioned before the question"
+
+
+@pytest.mark.parametrize("lines, reason", [
+    (["Bot: Hi, this is George."], "no user lines, maybe voicemail"),
+    (["Bot: When should I call you next?", "User: 7pm or maybe 8pm"], "several times mentioned"),
+    (["Bot: Same time tomorrow, 3pm?", "User: yeah"], "assistant proposed a specific time"),
+    (["Bot: When should I call you next?", "User: in a couple of hours"], "answer has words we don't parse"),
+])
+def test_unclear_answers_fall_back_to_the_llm(lines, reason):
+    result = parse(*lines)
+
+    assert result.kind == "ambiguous"
+    assert result.reason == reason
+
+
+# Monday 12 May 2025, 7:00:05 PM (GMT+10)
+EVENING_CALL = datetime(2025, 5, 12, 19, 0, 5)
+
+
+@pytest.mark.parametrize("lines", [
+    ["Bot: Same time tomorrow?", "User: I can't do tomorrow"],
+    ["Bot: Same time tomorrow?", "User: Skip tomorrow please"],
+    ["Bot: Same time tomorrow?", "User: I'm away tomorrow, so don't bother"],
+    ["Bot: When should I call you next?", "User: Any time except 7pm"],
+    ["Bot: What time should I call you?", "User: Tomorrow, but not before 9am"],
+    ["Bot: When should I call you next?", "User: 7pm, actually make it 8"],
+])
+def test_answers_that_say_more_than_a_time_fall_back_to_the_llm(lines):
+    result = parseNextCall("\n".join(lines), EVENING_CALL)
+
+    assert result.kind == "ambiguous"
+    assert result.reason == "answer has words we don't parse"
+
+
+def test_a_question_that_only_mentions_time_is_not_about_the_next_call():
+    result = parseNextCall("\n".join([
+        "Bot: How was your time at the beach?",
+        "User: Great, we got there at 9am",
+        "Bot: When did you leave?",
+        "User: at 4pm",
+    ]), EVENING_CALL)
+
+    assert result.kind == "ambiguous"
+    assert result.reason == "next call never came up"
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("Yeah same time tomorrow works, thanks George", datetime(2025, 5, 13, 19, 0, 5)),
+    ("Sure, 8pm on Wednesday please", datetime(2025, 5, 14, 20, 0)),
+    ("ok that's fine", datetime(2025, 5, 13, 19, 0, 5)),
+])
+def test_plain_answers_with_filler_words_are_still_parsed(answer, expected):
+    result = parseNextCall(f"Bot: I'll call again tomorrow, same time? Or would you prefer a different slot?\nUser: {answer}", EVENING_CALL)
+
+    assert result.kind == "time"
+    assert result.when == expected
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline import PipelineError, Stage, StageSkipped, pickStage, runStages
+
+
+def run(stages):
+    return asyncio.run(runStages("test", stages))
+
+
+def test_independent_stages_run_concurrently():
+    async def slowOne():
+        await asyncio.sleep(0.1)
+        return 1
+
+    def slowTwo():
+        # sync stages run in a thread
+        time.sleep(0.1)
+        return 2
+
+    started = time.perf_counter()
+    result = run([
+        Stage("a", slowOne),
+        Stage("b", slowTwo),
+        Stage("sum", lambda a, b: a + b, deps=("a", "b")),
+    ])
+
+    assert result.ok
+    assert result.results["sum"] == 3
+    assert time.perf_counter() - started < 0.19
+
+
+def test_a_failing_stage_only_skips_its_dependents():
+    def fail():
+        raise RuntimeError("boom")
+
+    result = run([
+        Stage("bad", fail),
+        Stage("good", lambda: "fine"),
+        Stage("needsBad", lambda bad: bad, deps=("bad",)),
+        Stage("needsGood", lambda good: good.upper(), deps=("good",)),
+    ])
+
+    assert isinstance(result.errors["bad"], RuntimeError)
+    assert isinstance(result.errors["needsBad"], StageSkipped)
+    assert result.results["needsGood"] == "FINE"
+    with pytest.raises(PipelineError):
+        result.raiseForErrors()
+
+
+def test_pick_stage_exposes_a_key_of_another_stage():
+    async def analysis():
+        return {"graphs": [1], "nextCallTime": None}
+
+    result = run([Stage("analysis", analysis), pickStage("graphs", "analysis")])
+
+    assert result.results["graphs"] == [1]
+
+
+def test_stages_must_come_after_their_dependencies():
+    with pytest.raises(ValueError):
+        run([Stage("late", lambda early: early, deps=("early",)), Stage("early", lambda: 1)])
+
+
+def test_a_retry_with_the_completed_results_only_reruns_failed_stages():
+    calls = {"write": 0, "flaky": 0}
+
+    def write():
+        calls["write"] += 1
+        return "written"
+
+    def flaky():
+        calls["flaky"] += 1
+        if calls["flaky"] == 1:
+            raise RuntimeError("first attempt fails")
+        return "ok"
+
+    def stages():
+        return [
+            Stage("write", write),
+            Stage("flaky", flaky),
+            Stage("after", lambda write, flaky: f"{write}+{flaky}", deps=("write", "flaky")),
+        ]
+
+    completed = {}
+    first = asyncio.run(runStages("test", stages(), completed))
+    assert not first.ok
+    assert completed == {"write": "written"}
+
+    second = asyncio.run(runStages("test", stages(), completed))
+    assert second.ok
+    assert second.results["after"] == "written+ok"
+    assert calls == {"write": 1, "flaky": 2}
@@ -0,0 +1,48 @@
+import asyncio
+
+import profiling
+
+
+def test_a_carried_job_keeps_the_profile_open_until_it_runs():
+    async def job():
+        return "done"
+
+    async def scenario():
+        profile = profiling.start("POST /webhook")
+        carried = profiling.carry(job)
+        profile.release()
+        assert not profile.finished
+        assert await carried() == "done"
+        return profile
+
+    profile = asyncio.run(scenario())
+
+    assert profile.finished
+    assert profile not in profiling._active
+
+
+def test_cancelling_a_carried_job_that_never_runs_finishes_the_profile():
+    async def job():
+        return "done"
+
+    async def scenario():
+        profile = profiling.start("POST /webhook")
+        carried = profiling.carry(job)
+        profiling.cancel(carried)
+        profiling.cancel(carried)
+        profile.release()
+        return profile
+
+    profile = asyncio.run(scenario())
+
+    assert profile.finished
+    assert profile not in profiling._active
+    assert profile in profiling._finished
+
+
+def test_cancel_is_a_no_op_without_a_profile():
+    async def job():
+        return "done"
+
+    assert profiling.carry(job) is job
+    profiling.cancel(job)
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from rollups import applyEntries, buildRollups, compactionCutoff, hasPointsBefore, replaceEntries, splitAtCutoff
+
+
+def points(*pairs):
+    return [{"date": day, "value": value} for day, value in pairs]
+
+
+def test_applying_entries_matches_building_from_scratch():
+    history = points(("04/05/2025", 1), ("05/05/2025", 2), ("31/05/2025", 4))
+    new = points(("01/06/2025", 8), ("not a date", 1))
+
+    assert applyEntries(buildRollups(history), new) == buildRollups(history + new)
+
+
+def test_buckets_hold_sum_count_min_max_and_mean():
+    rollups = buildRollups(points(("05/05/2025", 2), ("06/05/2025", 6), ("01/06/2025", 1)))
+
+    assert rollups["week"]["2025-W19"] == {"sum": 8, "count": 2, "min": 2, "max": 6, "mean": 4}
+    assert rollups["month"]["2025-05"]["count"] == 2
+    assert rollups["year"]["2025"] == {"sum": 9, "count": 3, "min": 1, "max": 6, "mean": 3}
+
+
+def test_apply_entries_does_not_modify_its_input():
+    rollups = buildRollups(points(("05/05/2025", 2)))
+    applyEntries(rollups, points(("06/05/2025", 6)))
+
+    assert rollups["week"]["2025-W19"]["count"] == 1
+
+
+def test_compaction_split():
+    cutoff = compactionCutoff(30, today=datetime(2025, 6, 30, 15, 0))
+    series = points(("30/05/2025", 1), ("31/05/2025", 2), ("bad", 3))
+
+    assert cutoff == datetime(2025, 5, 31)
+    assert hasPointsBefore(series, cutoff)
+    assert splitAtCutoff(series, cutoff) == (series[:1], series[1:])
+    assert not hasPointsBefore(series[1:], cutoff)
+
+
+def test_replacing_a_value_rebuilds_buckets_that_are_all_still_raw():
+    series = points(("05/05/2025", 2), ("06/05/2025", 6))
+    rollups = replaceEntries(buildRollups(series), series, points(("06/05/2025", 1)))
+
+    assert rollups == buildRollups(points(("05/05/2025", 2), ("06/05/2025", 1)))
+
+
+def test_replacing_a_value_in_a_partly_compacted_bucket_moves_its_sum():
+    archived = points(("01/05/2025", 10))
+    hot = points(("20/05/2025", 4))
+    rollups = replaceEntries(buildRollups(archived + hot), hot, points(("20/05/2025", 5), ("21/05/2025", 99)))
+
+    assert rollups["month"]["2025-05"] == {"sum": 15, "count": 2, "min": 4, "max": 10, "mean": 7.5}
+    assert rollups["week"]["2025-W21"] == {"sum": 5, "count": 1, "min": 5, "max": 5, "mean": 5}
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import scheduler
+from scheduler import CallScheduler
+from sharedState import MemorySharedState
+
+PHONE = "+61400000001"
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """
+    The (phone number, scheduled time) of every call sent to Vapi.
+    """
+    sent = []
+    async def fakeMakeTaskCall(customerNumber, scheduledTime=None, customerData={}, dataToCollect={}):
+        sent.append((customerNumber, scheduledTime))
+        return f"vapi-{len(sent)}"
+    monkeypatch.setattr(scheduler, "makeTaskCall", fakeMakeTaskCall)
+    return sent
+
+
+def isoIn(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def settle(callScheduler: CallScheduler, seconds: float = 0.2):
+    # lets the loop dispatch whatever is ready
+    await asyncio.sleep(seconds)
+    if callScheduler._inFlight:
+        await asyncio.wait(callScheduler._inFlight)
+
+
+def test_many_calls_for_the_same_time_are_smoothed_by_the_rate_limit(monkeypatch):
+    sentAt = []
+    async def fakeMakeTaskCall(customerNumber, scheduledTime=None, customerData={}, dataToCollect={}):
+        sentAt.append((time.monotonic(), scheduledTime))
+        return "vapi"
+    monkeypatch.setattr(scheduler, "makeTaskCall", fakeMakeTaskCall)
+    callScheduler = CallScheduler(ratePerPhoneId=20, burstPerPhoneId=2, state=MemorySharedState())
+    sevenTomorrow = isoIn(86400)
+
+    async def scenario():
+        await callScheduler.start()
+        try:
+            for number in range(10):
+                await callScheduler.schedule(f"+614000000{number:02d}", sevenTomorrow)
+            assert sentAt == []
+            while callScheduler.backlog() or callScheduler._inFlight:
+                await settle(callScheduler, 0.05)
+        finally:
+            await callScheduler.stop()
+
+    asyncio.run(scenario())
+
+    times = sorted(at for at, _ in sentAt)
+    assert len(times) == 10
+    assert all(scheduledTime == sevenTomorrow for _, scheduledTime in sentAt)
+    # two go straight away on the burst, the other eight one token (1/20s) apart
+    assert times[-1] - times[0] >= 8 / 20 * 0.8
+    assert callScheduler.counts["throttled"] == 8
+    assert callScheduler.counts["handedOff"] == 10
+
+
+def test_a_failed_hand_off_is_retried(monkeypatch):
+    attempts = []
+    async def flakyMakeTaskCall(customerNumber, scheduledTime=None, customerData={}, dataToCollect={}):
+        attempts.append(scheduledTime)
+        if len(attempts) == 1:
+            raise RuntimeError("Vapi is down")
+        return "vapi"
+    monkeypatch.setattr(scheduler, "makeTaskCall", flakyMakeTaskCall)
+    monkeypatch.setattr(scheduler, "HAND_OFF_RETRY_SECONDS", 0.05)
+    callScheduler = CallScheduler(state=MemorySharedState())
+
+    async def scenario():
+        await callScheduler.start()
+        try:
+            await callScheduler.schedule(PHONE, isoIn(86400))
+            await settle(callScheduler, 0.3)
+        finally:
+            await callScheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert len(attempts) == 2
+    assert callScheduler.counts == {**callScheduler.counts, "failed": 1, "dispatched": 1, "handedOff": 1}
+
+
+def test_a_second_call_to_a_waiting_number_gets_the_first_ones_id(calls):
+    callScheduler = CallScheduler(state=MemorySharedState())
+
+    async def scenario():
+        first = await callScheduler.schedule(PHONE)
+        second = await callScheduler.schedule(PHONE)
+        other = await callScheduler.schedule("+61400000002")
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+
+    assert second == first
+    assert other != first
+    assert callScheduler.backlog() == 2
+    assert callScheduler.counts["duplicate"] == 1
+
+
+def test_a_number_can_be_queued_again_once_its_call_has_gone(calls):
+    callScheduler = CallScheduler(state=MemorySharedState())
+
+    async def scenario():
+        await callScheduler.start()
+        try:
+            first = await callScheduler.schedule(PHONE)
+            await settle(callScheduler)
+            second = await callScheduler.schedule(PHONE)
+            await settle(callScheduler)
+        finally:
+            await callScheduler.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first != second
+    assert calls == [(PHONE, None), (PHONE, None)]
+
+
+def test_schedulers_sharing_state_share_the_rate_limit(calls):
+    state = MemorySharedState()
+    workers = [CallScheduler(ratePerPhoneId=0.5, burstPerPhoneId=1, state=state) for _ in range(2)]
+
+    async def scenario():
+        for worker in workers:
+            await worker.start()
+        try:
+            await workers[0].schedule(PHONE)
+            await workers[1].schedule("+61400000002")
+            await settle(workers[0])
+            await settle(workers[1])
+        finally:
+            for worker in workers:
+                worker._heap.clear()
+                await worker.stop()
+
+    asyncio.run(scenario())
+
+    # both numbers dial out through the same Vapi phone number id
+    assert len(calls) == 1
+    assert workers[1].counts["throttled"] == 1
+
+
+def test_shutdown_sends_waiting_calls_and_releases_their_numbers(calls):
+    state = MemorySharedState()
+    callScheduler = CallScheduler(ratePerPhoneId=0.01, burstPerPhoneId=0, state=state)
+
+    async def scenario():
+        await callScheduler.start()
+        await callScheduler.schedule(PHONE, isoIn(60))
+        await settle(callScheduler)
+        await callScheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert len(calls) == 1 and calls[0][1] is not None
+    assert callScheduler.counts["flushed"] == 1
+    assert state.get(f"scheduled:{PHONE}") is None
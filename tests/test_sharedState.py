@@ -0,0 +1,71 @@
+import pytest
+
+from sharedState import MemorySharedState, SharedState, SqliteSharedState
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state(request, tmp_path):
+    if request.param == "memory":
+        return MemorySharedState()
+    return SqliteSharedState(str(tmp_path / "state.sqlite3"))
+
+
+def test_counters_add_up(state):
+    assert state.incr("llm:requests") == 1
+    assert state.incrMany({"llm:requests": 2, "llm:costUsd": 0.5}) == {"llm:requests": 3, "llm:costUsd": 0.5}
+    state.incr("other")
+
+    assert state.counters("llm:") == {"llm:requests": 3, "llm:costUsd": 0.5}
+
+
+def test_only_one_claim_wins_until_the_marker_is_released(state):
+    assert state.claim("dial:+61400000001", ttl=60, value="a")
+    assert not state.claim("dial:+61400000001", ttl=60, value="b")
+
+    state.release("dial:+61400000001", "b")
+    assert state.get("dial:+61400000001") == "a"
+
+    state.release("dial:+61400000001", "a")
+    assert state.get("dial:+61400000001") is None
+    assert state.claim("dial:+61400000001", ttl=60, value="b")
+
+
+def test_expired_markers_can_be_claimed_again(state):
+    state.put("key", "old", ttl=-1)
+
+    assert state.get("key") is None
+    assert state.claim("key", ttl=60)
+
+
+def test_sqlite_state_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SqliteSharedState(path), SqliteSharedState(path)
+
+    assert first.claim("key", ttl=60)
+    assert not second.claim("key", ttl=60)
+    first.incr("count", 2)
+    assert second.incr("count") == 3
+
+
+def test_incomplete_states_cannot_be_created():
+    class Partial(SharedState):
+        def incrMany(self, amounts):
+            return amounts
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_token_buckets_run_out_after_their_burst(state):
+    assert state.takeToken("bucket", rate=1000, burst=2) == 0
+    assert state.takeToken("bucket", rate=1000, burst=2) == 0
+    wait = state.takeToken("bucket", rate=0.001, burst=2)
+    assert 0 < wait <= 1000
+
+
+def test_sqlite_token_buckets_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = SqliteSharedState(path), SqliteSharedState(path)
+
+    assert first.takeToken("bucket", rate=0.01, burst=1) == 0
+    assert second.takeToken("bucket", rate=0.01, burst=1) > 0
@@ -0,0 +1,219 @@
+import asyncio
+import threading
+
+import pytest
+
+import transcriptionAnalysis
+from helper import getCurrentGraphData
+from transcriptionAnalysis import applyGraphEntries, diffEntries
+
+PHONE = "+61400000001"
+
+
+@pytest.fixture
+def graph(db):
+    db.rows("user_data").append({"id": "user-1", "phone_number": PHONE, "user_id": "auth-1", "userdata": {"UserInfo": {"Name": "Will"}}})
+    db.rows("graphs").append({"id": "graph-1", "user_data_id": "user-1", "title": "Steps", "description": "", "type": "bar", "settings": {}})
+    db.rows("graph_data").append({"id": "gd-1", "graph_id": "graph-1", "data": [], "rollups": None, "stats": None})
+    return "graph-1"
+
+
+def apply(entries):
+    return asyncio.run(applyGraphEntries(getCurrentGraphData(PHONE), {"graph-1": entries}))
+
+
+def entries(*pairs):
+    return [{"date": day, "value": value} for day, value in pairs]
+
+
+def test_diff_entries_splits_new_days_from_changed_ones():
+    series = entries(("01/05/2025", 5), ("02/05/2025", 6))
+    new = entries(("02/05/2025", 6), ("01/05/2025", 7), ("03/05/2025", 1), ("03/05/2025", 2), ("bad", 1))
+
+    assert diffEntries(series, new) == (entries(("03/05/2025", 2)), entries(("01/05/2025", 7)))
+
+
+def test_applying_the_same_entries_twice_writes_them_once(db, graph):
+    apply(entries(("05/05/2025", 8000), ("06/05/2025", 8000)))
+    apply(entries(("05/05/2025", 8000), ("06/05/2025", 8000)))
+    apply(entries(("05/05/2025", 8000), ("06/05/2025", 8000)))
+
+    assert len(db.rows("graph_entries")) == 2
+    graphData = db.rows("graph_data")[0]
+    assert graphData["rollups"]["week"]["2025-W19"] == {"sum": 16000, "count": 2, "min": 8000, "max": 8000, "mean": 8000}
+    assert graphData["stats"]["entries"] == 2
+
+
+def test_a_new_value_for_a_stored_day_replaces_it(db, graph):
+    apply(entries(("05/05/2025", 8000), ("06/05/2025", 2000)))
+    graphs = apply(entries(("06/05/2025", 9000), ("07/05/2025", 1000)))
+
+    assert sorted((row["entry_date"], row["value"]) for row in db.rows("graph_entries")) == [
+        ("2025-05-05", 8000.0), ("2025-05-06", 9000.0), ("2025-05-07", 1000.0),
+    ]
+    week = db.rows("graph_data")[0]["rollups"]["week"]["2025-W19"]
+    assert week == {"sum": 18000, "count": 3, "min": 1000, "max": 9000, "mean": 6000}
+    stats = db.rows("graph_data")[0]["stats"]
+    assert stats["entries"] == 3
+    assert stats["best"] == {"value": 9000, "day": graphs[0]["stats"]["best"]["day"]}
+    assert [point["value"] for point in graphs[0]["data"]] == [8000, 9000, 1000]
+
+
+def test_graphs_without_new_entries_are_not_written(db, graph):
+    apply(entries(("05/05/2025", 1)))
+    before = db.requests
+    apply(entries(("05/05/2025", 1)))
+
+    # just the graph list being read again
+    assert db.requests - before == 1
+
+
+def test_combined_analysis_rejects_a_bad_next_call_before_writing(db, graph, monkeypatch):
+    async def fakeLLM(prompt, isJson=False, timeout=None):
+        return {
+            "graphEntries": {"graph-1": [{"date": "05/05/2025", "value": 1}]},
+            "profilePatch": {"Job": "Dev"},
+            "nextCall": "tomorrow-ish",
+        }
+    monkeypatch.setattr(transcriptionAnalysis, "askLLM", fakeLLM)
+
+    with pytest.raises(ValueError, match="TaskAnalysis"):
+        asyncio.run(transcriptionAnalysis.analyseTaskCall("User: hi", PHONE, "2025-05-12T05:17:19.039Z"))
+
+    assert db.rows("graph_entries") == []
+    assert db.rows("user_data")[0]["userdata"] == {"UserInfo": {"Name": "Will"}}
+
+
+@pytest.mark.parametrize("nextCall, expected", [
+    ("Tuesday, May 13, 2025 3:17:19 PM", "2025-05-13T05:17:19Z"),
+    ("null", None),
+    (None, None),
+])
+def test_valid_next_calls(nextCall, expected):
+    analysis = transcriptionAnalysis._validateAnalysis(transcriptionAnalysis.TaskAnalysis, {"nextCall": nextCall})
+
+    assert transcriptionAnalysis._nextCallToIso(analysis.nextCall) == expected
+
+
+@pytest.mark.parametrize("patch", [{"result": "Sure! Here is the updated profile..."}, ["not", "an", "object"], None])
+def test_a_bad_profile_patch_keeps_the_current_profile(db, graph, patch):
+    current = {"UserInfo": {"Name": "Will"}}
+
+    assert asyncio.run(transcriptionAnalysis.applyProfilePatch(PHONE, current, patch)) == current
+    assert db.rows("user_data")[0]["userdata"] == current
+
+
+def test_a_profile_patch_is_merged_and_saved(db, graph):
+    current = {"UserInfo": {"Name": "Will"}}
+    updated = asyncio.run(transcriptionAnalysis.applyProfilePatch(PHONE, current, {"UserInfo": {"Age": "22"}}))
+
+    assert updated == {"UserInfo": {"Name": "Will", "Age": "22"}}
+    assert db.rows("user_data")[0]["userdata"] == updated
+
+
+def test_points_rollups_and_stats_for_every_graph_are_saved_in_one_request(db, graph):
+    db.rows("graphs").append({"id": "graph-2", "user_data_id": "user-1", "title": "Sleep", "description": "", "type": "line", "settings": {}})
+    db.rows("graph_data").append({"id": "gd-2", "graph_id": "graph-2", "data": [], "rollups": None, "stats": None})
+    currentGraphData = getCurrentGraphData(PHONE)
+    before = db.requests
+
+    asyncio.run(applyGraphEntries(currentGraphData, {
+        "graph-1": entries(("05/05/2025", 8000)),
+        "graph-2": entries(("05/05/2025", 7.5)),
+    }))
+
+    assert db.requests - before == 1
+    assert all(row["rollups"] and row["stats"] for row in db.rows("graph_data"))
+
+
+def fakeGraphLLM(monkeypatch, response):
+    async def fakeLLM(prompt, isJson=False, timeout=None):
+        return response
+    async def fakeStream(prompt, onItem=None, timeout=None):
+        if onItem and isinstance(response, list):
+            for index, item in enumerate(response):
+                onItem(index, item)
+        return response
+    monkeypatch.setattr(transcriptionAnalysis, "askLLM", fakeLLM)
+    monkeypatch.setattr(transcriptionAnalysis, "askLLMStream", fakeStream)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_invalid_generated_graphs_are_dropped(monkeypatch, streaming):
+    monkeypatch.setattr(transcriptionAnalysis, "LLM_STREAMING", streaming)
+    fakeGraphLLM(monkeypatch, [
+        {"title": "Steps", "description": "Daily steps", "type": "bar", "settings": {"timeFrame": "week"}},
+        {"title": "Mood", "description": "How I feel", "type": "pie"},
+        "not a graph",
+        {"title": "Sleep", "description": "Hours slept", "type": "line"},
+    ])
+
+    graphs = asyncio.run(transcriptionAnalysis.generateGraphObjects("User: hi"))
+
+    assert graphs == [
+        {"title": "Steps", "description": "Daily steps", "type": "bar", "settings": {"timeFrame": "week"}},
+        {"title": "Sleep", "description": "Hours slept", "type": "line", "settings": {}},
+    ]
+
+
+@pytest.mark.parametrize("response", [None, {"graphs": []}, [{"title": "Steps"}]])
+def test_a_failed_or_unusable_graph_response_raises(monkeypatch, response):
+    monkeypatch.setattr(transcriptionAnalysis, "LLM_STREAMING", True)
+    fakeGraphLLM(monkeypatch, response)
+
+    with pytest.raises(ValueError):
+        asyncio.run(transcriptionAnalysis.generateGraphObjects("User: hi"))
+
+
+STEPS = {"title": "Steps", "description": "Daily steps", "type": "bar", "settings": {"timeFrame": "week"}}
+SLEEP = {"title": "Sleep", "description": "Hours slept", "type": "line", "settings": {}}
+
+
+def test_streamed_graphs_are_validated_as_they_arrive(monkeypatch):
+    monkeypatch.setattr(transcriptionAnalysis, "LLM_STREAMING", True)
+    checked = []
+    validateGraph = transcriptionAnalysis._validateGraph
+    monkeypatch.setattr(transcriptionAnalysis, "_validateGraph", lambda graph: checked.append(graph) or validateGraph(graph))
+    seenBeforeEnd = []
+
+    async def fakeStream(prompt, onItem=None, timeout=None):
+        for index, graph in enumerate([STEPS, SLEEP]):
+            onItem(index, graph)
+            seenBeforeEnd.append(len(checked))
+        return [STEPS, SLEEP]
+    monkeypatch.setattr(transcriptionAnalysis, "askLLMStream", fakeStream)
+
+    assert asyncio.run(transcriptionAnalysis.generateGraphObjects("User: hi")) == [STEPS, SLEEP]
+    assert seenBeforeEnd == [1, 2]
+    assert len(checked) == 2
+
+
+def test_a_retried_stream_does_not_keep_graphs_from_the_failed_attempt(monkeypatch):
+    monkeypatch.setattr(transcriptionAnalysis, "LLM_STREAMING", True)
+    attempts = []
+
+    async def fakeStream(prompt, onItem=None, timeout=None):
+        attempts.append(prompt)
+        if len(attempts) == 1:
+            onItem(0, STEPS)
+            onItem(1, STEPS)
+            raise ConnectionResetError("stream dropped")
+        onItem(0, SLEEP)
+        return [SLEEP]
+    monkeypatch.setattr(transcriptionAnalysis, "askLLMStream", fakeStream)
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(transcriptionAnalysis.generateGraphObjects("User: hi"))
+    assert asyncio.run(transcriptionAnalysis.generateGraphObjects("User: hi")) == [SLEEP]
+
+
+def test_llm_cost_totals_are_written_off_the_event_loop(monkeypatch):
+    writers = []
+    def incrMany(amounts):
+        writers.append(threading.current_thread())
+        return {key: amount for key, amount in amounts.items()}
+    monkeypatch.setattr(transcriptionAnalysis.sharedState, "incrMany", incrMany)
+
+    asyncio.run(transcriptionAnalysis._recordCost({"prompt_tokens": 1000, "completion_tokens": 100}, 0.1))
+
+    assert writers and writers[0] is not threading.main_thread()
@@ -1,70 +1,249 @@
 import openai
+import asyncio
 import os
 import json
-import aiohttp
 import datetime
+import time
 from dotenv import load_dotenv
+from pydantic import BaseModel, ValidationError, field_validator
+from typing import Dict, List, Literal, Optional, Union
+from httpClient import SharedSession
+import metrics
+import profiling
+from jsonStream import IncrementalJsonParser
+from logger import getLogger
+from sharedState import sharedState
+from nextCallParser import parseNextCall, recordResult
+from rollups import applyEntries, buildRollups, compactionCutoff, hasPointsBefore, replaceEntries
+from graphStats import buildStats, correctStats, updateStats
+from graphSeries import toEpochDay
 from makeCall import makeTaskCall
-from helper import convert_iso_to_gmt_plus10, convert_local_to_iso, getCurrentUserData, getCurrentGraphData, updateGraphData, getLastEntries
-# Global cost counter:
-total_cost = 0
-
+from scheduler import SCHEDULER_ENABLED, callScheduler
+from helper import convert_iso_to_gmt_plus10, convert_local_to_iso, getCurrentUserData, getCurrentGraphData, saveGraphEntries, getLastEntries, apply_merge_patch, patch_user_data, compactGraphData
 load_dotenv()
 openai.api_key = os.getenv("MY_OPENAI_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+log = getLogger("transcriptionAnalysis")
+
+# "multi" sends the transcript to a separate prompt per stage,
+# "combined" gets graphs, profile and next call time from a single prompt
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "multi").lower()
+
+# Stream LLM responses so large JSON outputs can be used item by item
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# Raw points older than this many days are archived into the graph's rollups (0 keeps everything)
+GRAPH_COMPACT_AFTER_DAYS = int(os.getenv("GRAPH_COMPACT_AFTER_DAYS", "0"))
+
+# One pooled session for every OpenAI request so we keep the connection alive
+# instead of doing a fresh TCP + TLS handshake per call
+llmSession = SharedSession(
+    "openai",
+    limit=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+    limitPerHost=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+    timeout=float(os.getenv("LLM_TIMEOUT", "120")),
+    connectTimeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+    dnsCacheSeconds=int(os.getenv("LLM_DNS_CACHE_SECONDS", "300")),
+)
+
+
+JSON_INSTRUCTIONS = "\nYour output should not include anything except the json valid object/list. You should not start or end with ``` or json or anything other than { or }"
 
+def _llmRequest(prompt: str, stream: bool = False) -> dict:
+    body = {
+        "model": "gpt-4.1-2025-04-14",
+        "messages": [{"role": "system", "content": prompt}],
+        "temperature": 0.2
+    }
+    if stream:
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True}
+    return body
 
-async def askLLM(prompt: str, isJson: bool = False) -> str:
+async def _recordCost(usage: dict, seconds: float):
+    prompt_tokens = usage['prompt_tokens']
+    completion_tokens = usage['completion_tokens']
+    
+    priceOfCall = prompt_tokens * (2 / 1000000) + completion_tokens * (8 / 1000000)
+    # Tokens, cost and latency go to the metrics registry against the current call and stage
+    metrics.recordLLM(seconds, usage, priceOfCall)
+    # Running totals live in the shared state so every worker adds to the same ones.
+    # With SHARED_STATE=sqlite that's a blocking write, so it runs off the event loop
+    totals = await asyncio.to_thread(sharedState.incrMany, {
+        "llm:requests": 1,
+        "llm:promptTokens": prompt_tokens,
+        "llm:completionTokens": completion_tokens,
+        "llm:costUsd": priceOfCall,
+    })
+    log.info("llm.cost", cost=priceOfCall, promptTokens=prompt_tokens, completionTokens=completion_tokens,
+             totalCost=totals["llm:costUsd"], seconds=round(seconds, 3))
+
+def _parseJson(extractedResponse: str, result):
+    try:
+        # If the response has ```json at the start take that off the start and ``` off the end
+        if (extractedResponse.startswith("```json") or extractedResponse.startswith("``` json")) and extractedResponse.endswith("```"):
+            extractedResponse = extractedResponse[7:-3]
+        return json.loads(extractedResponse)
+    except:
+        log.warning("llm.invalidJson", response=extractedResponse)
+        return {"result": extractedResponse}
+
+@profiling.profiled("askLLM")
+async def askLLM(prompt: str, isJson: bool = False, timeout: float = None) -> str:
     if isJson:
-        prompt = prompt + "\nYour output should not include anything except the json valid object/list. You should not start or end with ``` or json or anything other than { or }"
+        prompt = prompt + JSON_INSTRUCTIONS
     
-    print("Asking AI:", prompt)
-    # input("Click enter to confirm")
+    log.verbose("llm.prompt", prompt=prompt)
     
-    async with aiohttp.ClientSession() as session:
+    startedAt = time.perf_counter()
+    session = await llmSession.get()
+    try:
         async with session.post(
-            "https://api.openai.com/v1/chat/completions",
+            OPENAI_BASE_URL + "/chat/completions",
             headers={
                 "Authorization": f"Bearer {openai.api_key}",
                 "Content-Type": "application/json"
             },
-            json={
-                "model": "gpt-4.1-2025-04-14",
-                "messages": [{"role": "system", "content": prompt}],
-                "temperature": 0.2
-            }
+            json=_llmRequest(prompt),
+            timeout=llmSession.clientTimeout(timeout)
         ) as response:
             result = await response.json()
+    except Exception:
+        metrics.recordLLM(time.perf_counter() - startedAt, status="error")
+        raise
             
     try:
         extractedResponse = result['choices'][0]['message']['content'].strip()
-        print(f"Successfully processed AI response: {extractedResponse}")
-        usage = result['usage']
-        
-        prompt_tokens = usage['prompt_tokens']
-        completion_tokens = usage['completion_tokens']
-        
-        priceOfCall = prompt_tokens * (2 / 1000000) + completion_tokens * (8 / 1000000)
-        global total_cost
-        total_cost += priceOfCall
-        print("Cost of call: $" + str(priceOfCall))
-        print("running total of cost: $" + str(total_cost))
+        log.verbose("llm.response", response=extractedResponse)
+        await _recordCost(result['usage'], time.perf_counter() - startedAt)
         
         if not isJson:
             return extractedResponse
         else:
-            try:
-                # If the response has ```json at the start take that off the start and ``` off the end
-                if (extractedResponse.startswith("```json") or extractedResponse.startswith("``` json")) and extractedResponse.endswith("```"):
-                    extractedResponse = extractedResponse[7:-3]
-                return json.loads(extractedResponse)
-            except:
-                print("Failed to parse into json", result)
-                return {"result": extractedResponse}
+            return _parseJson(extractedResponse, result)
     except:
-        print(f"Failed to parse AI response:", result)
+        log.exception("llm.failed", response=result)
+        metrics.recordLLM(time.perf_counter() - startedAt, status="error")
+        return None
+
+@profiling.profiled("askLLMStream")
+async def askLLMStream(prompt: str, onItem=None, timeout: float = None):
+    """
+    Streaming version of askLLM(prompt, isJson=True). Consumes the SSE
+    token stream and parses the JSON as it arrives, calling
+    onItem(key, value) for every completed top-level list element
+    (key is its index) or object member, before the rest has generated.
+    Returns the whole parsed response like askLLM does.
+    """
+    prompt = prompt + JSON_INSTRUCTIONS
+    log.verbose("llm.prompt", prompt=prompt, stream=True)
+    
+    parser = IncrementalJsonParser(onItem)
+    usage = None
+    startedAt = time.perf_counter()
+    firstTokenAt = None
+    firstItemAt = None
+    
+    session = await llmSession.get()
+    try:
+        async with session.post(
+            OPENAI_BASE_URL + "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {openai.api_key}",
+                "Content-Type": "application/json"
+            },
+            json=_llmRequest(prompt, stream=True),
+            timeout=llmSession.clientTimeout(timeout)
+        ) as response:
+            if response.status != 200:
+                log.error("llm.streamFailed", status=response.status, response=await response.text())
+                metrics.recordLLM(time.perf_counter() - startedAt, status="error")
+                return None
+        
+            async for rawLine in response.content:
+                line = rawLine.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+            
+                chunk = json.loads(data)
+                if chunk.get('usage'):
+                    usage = chunk['usage']
+                for choice in chunk.get('choices', []):
+                    delta = choice.get('delta', {}).get('content')
+                    if not delta:
+                        continue
+                    if firstTokenAt is None:
+                        firstTokenAt = time.perf_counter()
+                    itemsBefore = len(parser.items)
+                    try:
+                        parser.feed(delta)
+                    except ValueError as e:
+                        log.warning("llm.invalidStreamItem", error=e)
+                    if firstItemAt is None and len(parser.items) > itemsBefore:
+                        firstItemAt = time.perf_counter()
+    except Exception:
+        metrics.recordLLM(time.perf_counter() - startedAt, status="error")
+        raise
+    
+    totalSeconds = time.perf_counter() - startedAt
+    log.info(
+        "llm.streamed",
+        seconds=round(totalSeconds, 3),
+        firstTokenSeconds=round(firstTokenAt - startedAt, 3) if firstTokenAt else None,
+        firstItemSeconds=round(firstItemAt - startedAt, 3) if firstItemAt else None,
+        items=len(parser.items),
+    )
+    log.verbose("llm.response", response=parser.buffer)
+    if firstItemAt:
+        metrics.recordFirstItem(firstItemAt - startedAt)
+    if usage:
+        await _recordCost(usage, totalSeconds)
+    else:
+        metrics.recordLLM(totalSeconds)
+    
+    try:
+        return parser.result()
+    except ValueError:
+        return _parseJson(parser.buffer.strip(), parser.buffer)
+
+def _validateGraph(graph) -> Optional[dict]:
+    """The graph config if it matches GraphConfig, otherwise None."""
+    try:
+        return GraphConfig(**graph).model_dump()
+    except (TypeError, ValidationError) as e:
+        log.warning("graphs.invalidConfig", graph=graph, error=str(e))
         return None
 
+def _validateGraphs(graphs, validated: dict = None) -> list:
+    """
+    Graph configs that match GraphConfig. Invalid items are dropped with a
+    warning. validated maps list indexes to results already worked out by
+    _validateGraph while the response streamed. Raises ValueError if the
+    response isn't a list (e.g. the LLM request or stream failed) or none
+    of its items were valid.
+    """
+    if not isinstance(graphs, list):
+        raise ValueError(f"Graph generation didn't return a list: {graphs}")
+    validated = validated or {}
+    valid = []
+    for index, graph in enumerate(graphs):
+        config = validated[index] if index in validated else _validateGraph(graph)
+        if config is not None:
+            valid.append(config)
+    if graphs and not valid:
+        raise ValueError(f"None of the generated graphs were valid: {graphs}")
+    return valid
+
 async def generateGraphObjects(transcription: str) -> list:
+    """
+    Graph configs for the goals in an onboarding transcript, validated
+    against GraphConfig. With LLM_STREAMING on, graphs are validated as
+    they stream in.
+    """
     prompt = f"""
 {transcription}
 -----------------------
@@ -85,9 +264,17 @@ Each object should be structured in the following format:
 }}
 """
     
-    graphs = await askLLM(prompt, isJson=True)
+    if not LLM_STREAMING:
+        return _validateGraphs(await askLLM(prompt, isJson=True))
     
-    return graphs
+    # Each graph is validated as soon as it has generated. The results are
+    # local to this call, so a retried stage starts again from nothing.
+    validated = {}
+    def onGraph(index, graph):
+        if isinstance(index, int):
+            validated[index] = _validateGraph(graph)
+    graphs = await askLLMStream(prompt, onItem=onGraph)
+    return _validateGraphs(graphs, validated)
 
 async def getInitialUserObject(transcription: str) -> dict:
 
@@ -131,7 +318,7 @@ You can have as many keys and use lists etc. as you need to describe the user.
 
 async def UpdateGraphs(transcription: str, phone_number: str) -> list:
     
-    currentGraphData = getCurrentGraphData(phone_number)
+    currentGraphData = await asyncio.to_thread(getCurrentGraphData, phone_number)
     
     lastEntryGraphData = getLastEntries(currentGraphData)
     
@@ -149,46 +336,175 @@ Your output should be in an object.
 """
     newGraphEntries = await askLLM(prompt, isJson=True)
     
-    # Add the new entries to the graph and then send the data to supabase with the updateGraphData helper function
+    return await applyGraphEntries(currentGraphData, newGraphEntries)
+
+def diffEntries(series: list, entries: list):
+    """
+    Splits new entries into (added, changed): points for days the graph
+    has no value for yet, and points that change the value of a day it
+    already has. Entries that repeat a stored value (e.g. a retried job)
+    are dropped, as are invalid ones, and the last entry wins when the
+    same day comes up more than once.
+    """
+    existing = {}
+    for point in series:
+        try:
+            existing[toEpochDay(point['date'])] = float(point['value'])
+        except (KeyError, TypeError, ValueError):
+            continue
+
+    if not isinstance(entries, list):
+        log.warning("graph.invalidEntries", entries=entries)
+        entries = []
+    latest = {}
+    for entry in entries:
+        try:
+            day, value = toEpochDay(entry['date']), float(entry['value'])
+        except (KeyError, TypeError, ValueError):
+            log.warning("graph.invalidEntry", entry=entry)
+            continue
+        latest[day] = (entry, value)
+
+    added, changed = [], []
+    for day, (entry, value) in latest.items():
+        if day not in existing:
+            added.append(entry)
+        elif existing[day] != value:
+            changed.append(entry)
+    return added, changed
+
+def _replacePoints(series: list, changes: list) -> list:
+    newValues = {toEpochDay(entry['date']): entry['value'] for entry in changes}
+    replaced = []
+    for point in series:
+        try:
+            day = toEpochDay(point['date'])
+        except (KeyError, TypeError, ValueError):
+            day = None
+        replaced.append({**point, "value": newValues[day]} if day in newValues else point)
+    return replaced
+
+async def applyGraphEntries(currentGraphData: list, newGraphEntries: dict) -> list:
+    # Add the new entries to the graph and then send just the new entries to supabase with saveGraphEntries.
+    # A graph has one value per day, so running this again with the same entries (a retried job) writes nothing new
     
     graphs = []
+    entriesToAppend = {}
+    rollupsToSave = {}
+    statsToSave = {}
     for graph in currentGraphData:
         if graph['id'] in newGraphEntries:
-            graph['data'].extend(newGraphEntries[graph['id']])
+            added, changed = diffEntries(graph['data'], newGraphEntries[graph['id']])
             graphs.append(graph)
-            updateGraphData(graph['data'], graph['id'])
+            if not added and not changed:
+                log.info("graphs.unchanged", graphId=graph['id'])
+                continue
+            # Graphs from before rollups existed get theirs built from the full history once
+            rollups = graph.get('rollups') or buildRollups(graph['data'])
+            stats = graph.get('stats') or buildStats(graph['data'])
+            if changed:
+                # corrections to days already counted, e.g. a second call on the same day
+                rollups = replaceEntries(rollups, graph['data'], changed)
+                graph['data'] = _replacePoints(graph['data'], changed)
+                stats = correctStats(stats, graph['data'])
+            graph['rollups'] = applyEntries(rollups, added)
+            graph['stats'] = updateStats(stats, added)
+            graph['data'].extend(added)
+            entriesToAppend[graph['id']] = changed + added
+            rollupsToSave[graph['id']] = graph['rollups']
+            statsToSave[graph['id']] = graph['stats']
         else:
-            print("uh oh... forgot graph", graph['title'])
+            log.warning("graphs.noEntries", title=graph['title'])
             # Could potentially loop back and ask to fix but I don't want to waste credits for now
     
+    # Only new and changed points get sent, all graphs with their rollups and stats in one call
+    await asyncio.to_thread(saveGraphEntries, entriesToAppend, rollupsToSave, statsToSave)
+    
+    if GRAPH_COMPACT_AFTER_DAYS > 0:
+        cutoff = compactionCutoff(GRAPH_COMPACT_AFTER_DAYS)
+        toCompact = [graph['id'] for graph in graphs if hasPointsBefore(graph['data'], cutoff)]
+        await asyncio.to_thread(compactGraphData, toCompact, cutoff)
+    
     return graphs
 
+MERGE_PATCH_INSTRUCTIONS = """Don't return the whole representation. Return a JSON merge patch (RFC 7396) against it:
+- only include keys that are new or changed
+- nested objects are merged, so only include the nested keys that changed
+- set a key to null to remove it
+- lists are replaced as a whole, so return the full new list if a list changes
+- return {} if nothing about the user changed"""
+
 async def updateUserData(transcription: str, phone_number: str) -> dict:
-    currentData = getCurrentUserData(phone_number)
+    """
+    Asks for a merge patch against the current profile instead of the
+    whole profile, so the completion only grows with what changed.
+    The patch is applied locally and persisted as a partial update.
+    Returns the updated profile.
+    """
+    currentData = await asyncio.to_thread(getCurrentUserData, phone_number)
     
     prompt = f"""
 {transcription}
 -----------------------
 Based on the above transcription of a phone call,
 Update the following representation of the user:
-{currentData}
+{json.dumps(currentData)}
 You can give it any new keys you want and update information if they mention it's outdated
 only base it off the transcription
 This should only be an object that represents them as a person. Don't add things like the goals they want to set every day, that will be handled by another function.
 You should be logging longer term things like their friends, family, projects, how they want to be talked to, their job, etc.
 Calendar items will be logged by another function too. Though things like "plays basketball every Tuesday" is still important to note that they play basketball.
 You can have as many keys and use lists etc. as you need to describe the user.
+{MERGE_PATCH_INSTRUCTIONS}
 """
 
-    newUserObject = await askLLM(prompt, isJson=True)
+    patch = await askLLM(prompt, isJson=True)
+    
+    return await applyProfilePatch(phone_number, currentData, patch)
+
+async def applyProfilePatch(phone_number: str, currentData: dict, patch) -> dict:
+    """
+    Applies and saves a merge patch. A patch that isn't an object is logged
+    and the profile is left as it was, so the call still gets its next call
+    booked with the profile from before it.
+    """
+    if not isinstance(patch, dict) or set(patch) == {"result"}:
+        log.warning("profile.invalidPatch", patch=patch)
+        return currentData
+    
+    if not patch:
+        log.info("profile.unchanged")
+        return currentData
+    
+    log.info("profile.patch", keys=list(patch))
+    log.debug("profile.patchBody", patch=patch)
+    newUserObject = apply_merge_patch(currentData, patch)
+    await asyncio.to_thread(patch_user_data, phone_number, patch)
     
     return newUserObject
 
-async def setNextCall(customerNumber: str, customerData: dict, transcription: str, createdAt: str, dataToCollect: dict={}):
+async def getNextCallTime(transcription: str, createdAt: str):
+    """
+    Works out when the user wants their next call from the transcript.
+    Only needs the transcript and the call start time, so it can run
+    alongside the other analysis stages. Common phrasings are handled by
+    nextCallParser, only ambiguous transcripts go to the LLM.
+    Returns an ISO8601 UTC timestamp or None if the user doesn't want
+    another call.
+    """
+    # Most answers are "same time tomorrow" style, try the rule-based parser first
+    callTime = datetime.datetime.fromisoformat(createdAt.replace("Z", "+00:00")) + datetime.timedelta(hours=10)
+    fastResult = parseNextCall(transcription, callTime.replace(tzinfo=None))
+    recordResult(fastResult)
+    log.info("nextCall.fastPath", kind=fastResult.kind, when=fastResult.when, reason=fastResult.reason)
+    if fastResult.kind == "none":
+        return None
+    if fastResult.kind == "time":
+        return convert_local_to_iso(fastResult.when.strftime("%A, %B %d, %Y %I:%M:%S %p"))
+    
     # Format time from 2025-05-12T05:17:19.039Z into May 12, 2025 at 3:17:19 PM
     formattedTime = convert_iso_to_gmt_plus10(createdAt)
     
-    print(formattedTime)
     prompt = f"""
     {transcription}
     -----------------------
@@ -206,9 +522,174 @@ async def setNextCall(customerNumber: str, customerData: dict, transcription: st
     """
     
     nextCall = await askLLM(prompt)
+    if not nextCall or nextCall.strip().lower() == "null":
+        log.info("nextCall.none")
+        return None
     
-    iso_time = convert_local_to_iso(nextCall)
+    return convert_local_to_iso(nextCall)
+
+async def scheduleNextCall(customerNumber: str, iso_time: str, customerData: dict, dataToCollect: dict={}):
+    if not iso_time:
+        return None
     
-    makeTaskCall(customerNumber, iso_time, customerData, dataToCollect)
+    if SCHEDULER_ENABLED:
+        # handed to Vapi now if it's far off, otherwise queued and rate limited per phone number id
+        await callScheduler.schedule(customerNumber, iso_time, customerData, dataToCollect)
+    else:
+        await makeTaskCall(customerNumber, iso_time, customerData, dataToCollect)
     
-    return iso_time
\ No newline at end of file
+    return iso_time
+
+
+# ---------- Combined analysis (ANALYSIS_MODE=combined) ----------
+
+class GraphEntry(BaseModel):
+    date: str
+    value: Union[int, float]
+
+class GraphConfig(BaseModel):
+    title: str
+    description: str
+    type: Literal['contribution', 'line', 'bar']
+    settings: dict = {}
+
+class NextCallAnalysis(BaseModel):
+    nextCall: Optional[str] = None
+
+    @field_validator("nextCall")
+    @classmethod
+    def nextCallIsParseable(cls, nextCall):
+        # checked with the rest of the schema so a bad time fails before anything is written
+        if nextCall and nextCall.strip().lower() != "null":
+            convert_local_to_iso(nextCall.strip())
+        return nextCall
+
+class TaskAnalysis(NextCallAnalysis):
+    graphEntries: Dict[str, List[GraphEntry]] = {}
+    profilePatch: dict = {}
+
+class OnboardingAnalysis(NextCallAnalysis):
+    graphs: List[GraphConfig]
+    profile: dict
+
+
+def _validateAnalysis(schema, result):
+    if not isinstance(result, dict):
+        raise ValueError(f"Combined analysis didn't return an object: {result}")
+    try:
+        return schema(**result)
+    except ValidationError as e:
+        raise ValueError(f"Combined analysis didn't match {schema.__name__}: {e}")
+
+def _nextCallToIso(nextCall: Optional[str]):
+    if not nextCall or nextCall.strip().lower() == "null":
+        log.info("nextCall.none")
+        return None
+    return convert_local_to_iso(nextCall.strip())
+
+async def analyseTaskCall(transcription: str, phone_number: str, createdAt: str) -> dict:
+    """
+    One LLM pass that does the work of UpdateGraphs, updateUserData and
+    getNextCallTime together, so the transcript is only sent once.
+    Returns {"graphs", "customerData", "nextCallTime"}.
+    """
+    currentGraphData, currentData = await asyncio.gather(
+        asyncio.to_thread(getCurrentGraphData, phone_number),
+        asyncio.to_thread(getCurrentUserData, phone_number),
+    )
+    lastEntryGraphData = getLastEntries(currentGraphData)
+    formattedTime = convert_iso_to_gmt_plus10(createdAt)
+
+    prompt = f"""
+{transcription}
+-----------------------
+Current Date and time: {datetime.datetime.now().strftime("%A")}, {datetime.datetime.now().strftime("%B")} {datetime.datetime.now().strftime("%d")}, {datetime.datetime.now().strftime("%Y")} at {datetime.datetime.now().strftime("%H:%M")}
+Based on the above transcription of a phone call, return one object with exactly these keys:
+{{
+    "graphEntries": {{"graphId": [{{"date": "the date this data is for in dd/mm/yyyy format", "value": n}}]}},
+    "profilePatch": {{ a JSON merge patch against the representation of the user }},
+    "nextCall": "the time the user wants their next call" or null
+}}
+
+graphEntries: the next entry into each of the graphs, where n is the value that the transcription suggests. Don't add units.
+Here is the current graph data:
+{lastEntryGraphData}
+
+profilePatch: update the following representation of the user:
+{json.dumps(currentData)}
+You can give it any new keys you want and update information if they mention it's outdated, only base it off the transcription.
+It should only represent them as a person (friends, family, projects, how they want to be talked to, their job, etc.), not their daily goals or calendar items.
+{MERGE_PATCH_INSTRUCTIONS}
+
+nextCall: the call happened at {formattedTime}.
+If they never mentioned a new time or the time they set was invalid (yesterday etc.) set it to tomorrow, same time.
+Use the exact same format as: {formattedTime}
+If the call went to voicemail or the user doesn't want a call, use null.
+"""
+    analysis = _validateAnalysis(TaskAnalysis, await askLLM(prompt, isJson=True))
+    nextCallTime = _nextCallToIso(analysis.nextCall)
+
+    newGraphEntries = {
+        graphId: [{"date": entry.date, "value": entry.value} for entry in entries]
+        for graphId, entries in analysis.graphEntries.items()
+    }
+    graphs, customerData = await asyncio.gather(
+        applyGraphEntries(currentGraphData, newGraphEntries),
+        applyProfilePatch(phone_number, currentData, analysis.profilePatch),
+    )
+
+    return {
+        "graphs": graphs,
+        "customerData": customerData,
+        "nextCallTime": nextCallTime,
+    }
+
+async def analyseOnboardingCall(transcription: str, createdAt: str) -> dict:
+    """
+    One LLM pass that does the work of generateGraphObjects,
+    getInitialUserObject and getNextCallTime together.
+    Returns {"graphs", "userObj", "nextCallTime"}.
+    """
+    formattedTime = convert_iso_to_gmt_plus10(createdAt)
+
+    prompt = f"""
+{transcription}
+-----------------------
+Date and time: {datetime.datetime.now().strftime("%A")}, {datetime.datetime.now().strftime("%B")} {datetime.datetime.now().strftime("%d")}, {datetime.datetime.now().strftime("%Y")} at {datetime.datetime.now().strftime("%H:%M")}
+Based on the above transcription of an onboarding phone call, return one object with exactly these keys:
+{{
+    "graphs": [ graph objects ],
+    "profile": {{ an object that represents the user }},
+    "nextCall": "the time the user wants their next call" or null
+}}
+
+graphs: graphs to achieve what the user wanted, each structured as:
+{{
+    "title": "The title of the graph from the user's perspective (e.g My daily steps)",
+    "description": "A description (less than 100 characters) of the data recorded from the user's perspective",
+    "type": "one of ['contribution', 'line', 'bar']. Contribution is a heatmap style graph that shows how frequently someone does something. Line is a line chart. Bar is a bar chart.",
+    "settings": {{
+        // if it's a contribution graph → {{ "totalCells": number }}
+        // if it's a line graph         → {{  }}  // no settings
+        // if it's a bar graph          → {{ "timeFrame": 'week' | 'month' | 'year' }}
+    }}
+}}
+
+profile: any keys you want, starting with "UserInfo" (name, age, birthday...). Log longer term things like their friends, family,
+projects, how they want to be talked to, their job, etc. Not their daily goals or calendar items. Only base it off the transcription.
+
+nextCall: the call happened at {formattedTime}.
+If they never mentioned a new time or the time they set was invalid (yesterday etc.) set it to tomorrow, same time.
+Use the exact same format as: {formattedTime}
+If the call went to voicemail or the user doesn't want a call, use null.
+"""
+    analysis = _validateAnalysis(OnboardingAnalysis, await askLLM(prompt, isJson=True))
+
+    return {
+        "graphs": [
+            {"title": graph.title, "description": graph.description, "type": graph.type, "settings": graph.settings}
+            for graph in analysis.graphs
+        ],
+        "userObj": analysis.profile,
+        "nextCallTime": _nextCallToIso(analysis.nextCall),
+    }
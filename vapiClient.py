@@ -0,0 +1,103 @@
+import aiohttp
+import asyncio
+import os
+import random
+import time
+import metrics
+from httpClient import SharedSession
+from logger import getLogger
+
+VAPI_BASE_URL = os.getenv("VAPI_BASE_URL", "https://api.vapi.ai")
+
+# One pooled session for every Vapi request, opened and closed with the app
+vapiSession = SharedSession(
+    "vapi",
+    limit=int(os.getenv("VAPI_MAX_CONNECTIONS", "10")),
+    limitPerHost=int(os.getenv("VAPI_MAX_CONNECTIONS", "10")),
+    timeout=float(os.getenv("VAPI_TIMEOUT", "15")),
+    connectTimeout=float(os.getenv("VAPI_CONNECT_TIMEOUT", "5")),
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+log = getLogger("vapiClient")
+
+
+class VapiClient:
+    """
+    Async client for the Vapi REST API.
+
+    At most `maxConcurrency` requests are in flight at once. 429 and 5xx
+    responses and connection errors are retried with jittered exponential
+    backoff (honouring Retry-After on 429s). Read timeouts are not retried
+    since the call may already have been created.
+    """
+
+    def __init__(self, session: SharedSession, maxConcurrency: int = 5, maxRetries: int = 3,
+                 backoffBase: float = 0.5, backoffMax: float = 8):
+        self.session = session
+        self.maxRetries = maxRetries
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+        self._semaphore = asyncio.Semaphore(maxConcurrency)
+
+    def _backoff(self, attempt: int, retryAfter: str = None) -> float:
+        if retryAfter:
+            try:
+                return min(float(retryAfter), self.backoffMax)
+            except ValueError:
+                pass
+        # "full jitter" so a burst of retries doesn't hit Vapi in lockstep
+        return random.uniform(0, min(self.backoffMax, self.backoffBase * 2 ** attempt))
+
+    async def request(self, method: str, path: str, json: dict = None):
+        """
+        Returns (status, body) where body is the parsed JSON response,
+        or the raw text if it isn't JSON.
+        """
+        headers = {
+            'Authorization': f'Bearer {os.getenv("VAPI_API_KEY")}',
+            'Content-Type': 'application/json',
+        }
+        session = await self.session.get()
+
+        attempt = 0
+        while True:
+            startedAt = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    async with session.request(method, VAPI_BASE_URL + path, headers=headers, json=json) as response:
+                        status = response.status
+                        retryAfter = response.headers.get("Retry-After")
+                        try:
+                            body = await response.json(content_type=None)
+                        except ValueError:
+                            body = await response.text()
+            except aiohttp.ServerTimeoutError:
+                metrics.recordVapi(method, path, "timeout", time.perf_counter() - startedAt)
+                raise
+            except aiohttp.ClientConnectionError as e:
+                metrics.recordVapi(method, path, "error", time.perf_counter() - startedAt)
+                if attempt >= self.maxRetries:
+                    raise
+                delay = self._backoff(attempt)
+                log.warning("vapi.retry", method=method, path=path, error=e, delay=round(delay, 2))
+            else:
+                metrics.recordVapi(method, path, status, time.perf_counter() - startedAt)
+                if status not in RETRY_STATUSES or attempt >= self.maxRetries:
+                    return status, body
+                delay = self._backoff(attempt, retryAfter if status == 429 else None)
+                log.warning("vapi.retry", method=method, path=path, status=status, delay=round(delay, 2))
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def createCall(self, body: dict):
+        return await self.request("POST", "/call/phone", json=body)
+
+
+vapiClient = VapiClient(
+    vapiSession,
+    maxConcurrency=int(os.getenv("VAPI_MAX_CONCURRENCY", "5")),
+    maxRetries=int(os.getenv("VAPI_MAX_RETRIES", "3")),
+)